@@ -1,3 +1,18 @@
-from create_idiom_dataset import create_idiom_dataset
+import sys
 
-create_idiom_dataset()
+if len(sys.argv) > 1 and sys.argv[1] == "serve":
+    from create_idiom_dataset.completion_index import serve
+
+    serve(sys.argv[2:])
+elif len(sys.argv) > 1 and sys.argv[1] == "apy-stand-in":
+    from create_idiom_dataset.apy_stand_in import serve
+
+    serve(sys.argv[2:])
+elif len(sys.argv) > 1 and sys.argv[1] == "worker":
+    from create_idiom_dataset.cli import worker
+
+    worker(sys.argv[2:])
+else:
+    from create_idiom_dataset import create_idiom_dataset
+
+    create_idiom_dataset()
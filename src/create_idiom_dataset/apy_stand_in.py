@@ -0,0 +1,171 @@
+import json
+import logging
+import threading
+import time
+from argparse import ArgumentParser
+from collections.abc import Callable
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Self
+from urllib.parse import parse_qs, urlparse
+
+logger = logging.getLogger(__name__)
+
+
+def echo_segment(segment: str, langpair: str) -> str:
+    return segment
+
+
+class ApyStandInHandler(BaseHTTPRequestHandler):
+    """The part of the Apertium APy HTTP interface that translation.ApertiumBackend uses
+
+    GET or POST /translate with form parameters q and langpair
+    GET /listPairs
+    """
+
+    server: "ApyStandIn"
+
+    def send_json(self, obj, status: int = 200):
+        body = json.dumps(obj, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_request(self, path: str, params: dict[str, list[str]]):
+        if path == "/listPairs":
+            self.send_json(
+                {
+                    "responseData": [
+                        {"sourceLanguage": source, "targetLanguage": target}
+                        for source, target in self.server.language_pairs
+                    ],
+                    "responseDetails": None,
+                    "responseStatus": 200,
+                }
+            )
+            return
+        if path != "/translate":
+            self.send_json({"responseDetails": "Not found", "responseStatus": 404}, 404)
+            return
+        if "q" not in params or "langpair" not in params:
+            self.send_json(
+                {"responseDetails": "Missing q or langpair", "responseStatus": 400}, 400
+            )
+            return
+
+        status, translation = self.server.translate(
+            params["q"][0], params["langpair"][0]
+        )
+        if status != 200:
+            self.send_json(
+                {"responseDetails": "Unavailable", "responseStatus": status}, status
+            )
+            return
+        self.send_json(
+            {
+                "responseData": {"translatedText": translation},
+                "responseDetails": None,
+                "responseStatus": 200,
+            }
+        )
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        self.handle_request(url.path.removeprefix("/apy"), parse_qs(url.query))
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        params = parse_qs(self.rfile.read(length).decode())
+        self.handle_request(urlparse(self.path).path.removeprefix("/apy"), params)
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+
+class ApyStandIn(ThreadingHTTPServer):
+    """Local stand-in for an Apertium APy server, for tests and throughput measurements
+
+    Each newline separated segment of a query is translated with
+    translate_segment(segment, langpair), by default returned unchanged, and trailing
+    whitespace is stripped from the translated text like APy does. Every request
+    waits latency seconds before it is answered, and the next num_failures requests
+    are answered with status 503.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        translate_segment: Callable[[str, str], str] = echo_segment,
+        latency: float = 0.0,
+        language_pairs: tuple[tuple[str, str], ...] = (("nob", "nno"), ("nno", "nob")),
+    ):
+        super().__init__((host, port), ApyStandInHandler)
+        self.translate_segment = translate_segment
+        self.latency = latency
+        self.language_pairs = language_pairs
+        self.queries: list[str] = []
+        self.num_failures = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        """URL of the translate endpoint"""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/translate"
+
+    def translate(self, query: str, langpair: str) -> tuple[int, str]:
+        """Status and translated text of a query"""
+        if self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            self.queries.append(query)
+            if self.num_failures:
+                self.num_failures -= 1
+                return 503, ""
+        segments = query.split("\n")
+        return 200, "\n".join(
+            self.translate_segment(segment, langpair) for segment in segments
+        ).rstrip()
+
+    def __enter__(self) -> Self:
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
+
+
+def get_parser() -> ArgumentParser:
+    parser = ArgumentParser(
+        prog="create_idiom_dataset apy-stand-in",
+        description="Serve a local stand-in for an Apertium APy server, which returns each idiom untranslated",
+    )
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Host to bind")
+    parser.add_argument("--port", type=int, default=2737, help="Port to bind")
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.0,
+        help="Seconds to wait before answering each request, to simulate a remote server",
+    )
+    return parser
+
+
+def serve(argv: list[str] | None = None):
+    args = get_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(message)s")
+
+    server = ApyStandIn(host=args.host, port=args.port, latency=args.latency)
+    logger.info("Serving APy stand-in at %s", server.url)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        logger.info("Answered %s translation requests", len(server.queries))
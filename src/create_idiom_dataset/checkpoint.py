@@ -0,0 +1,115 @@
+import json
+import logging
+import os
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Self
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+def ends_with_newline(path: Path) -> bool:
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+class CheckpointJournal:
+    """Append-only JSONL journal of completed lookups for a checkpoint csv file
+
+    Each completed lookup is appended once as a line [key, value], where key holds the
+    values of key_columns for the row and value is the result for value_column. The
+    journal is flushed and synced every flush_every lookups, and lookups can only be
+    appended within an appending block, which closes the journal file also when an
+    error interrupts the lookups. On resume, the journal is replayed into the
+    dataframe, and compact atomically replaces the csv file with the dataframe and
+    removes the journal.
+    """
+
+    def __init__(
+        self,
+        csv_file: Path,
+        key_columns: list[str],
+        value_column: str,
+        flush_every: int = 100,
+    ):
+        self.csv_file = Path(csv_file)
+        self.path = self.csv_file.with_name(self.csv_file.name + ".journal.jsonl")
+        self.key_columns = key_columns
+        self.value_column = value_column
+        self.flush_every = flush_every
+        self._file = None
+        self._unflushed = 0
+
+    def read(self) -> dict[tuple, object]:
+        """Read the journal into a dict from key to the last value recorded for it"""
+        entries = {}
+        if not self.path.exists():
+            return entries
+        with open(self.path) as f:
+            for line_number, line in enumerate(f, start=1):
+                try:
+                    key, value = json.loads(line)
+                except ValueError:
+                    # A crash can leave a partially written last line
+                    logger.warning(
+                        "Skipping unreadable line %s in %s", line_number, self.path
+                    )
+                    continue
+                entries[tuple(key)] = value
+        return entries
+
+    def replay(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Fill missing values in df with the values recorded in the journal"""
+        entries = self.read()
+        if not entries:
+            return df
+        missing = df[df[self.value_column].isnull()]
+        keys = zip(*[missing[column] for column in self.key_columns])
+        values = pd.Series([entries.get(key) for key in keys], index=missing.index)
+        values = values.dropna()
+        df.loc[values.index, self.value_column] = values
+        logger.debug("Replayed %s lookups from %s", len(values), self.path)
+        return df
+
+    @contextmanager
+    def appending(self) -> Iterator[Self]:
+        """Open the journal for appending lookups while the block runs"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a") as f:
+            if f.tell() and not ends_with_newline(self.path):
+                # Start on a new line after a partially written last line, which
+                # would otherwise make the first appended line unreadable as well
+                f.write("\n")
+            self._file = f
+            try:
+                yield self
+            finally:
+                self.flush()
+                self._file = None
+
+    def append(self, key: tuple, value):
+        if self._file is None:
+            raise ValueError(f"{self.path} is only appended to in an appending block")
+        self._file.write(json.dumps([list(key), value], ensure_ascii=False) + "\n")
+        self._unflushed += 1
+        if self._unflushed >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        if self._file is not None and self._unflushed:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._unflushed = 0
+
+    def clear(self):
+        self.path.unlink(missing_ok=True)
+
+    def compact(self, df: pd.DataFrame):
+        """Atomically write df to the csv file and remove the journal"""
+        tmp_file = self.csv_file.with_name(self.csv_file.name + ".tmp")
+        df.to_csv(tmp_file, index=False)
+        os.replace(tmp_file, self.csv_file)
+        self.path.unlink(missing_ok=True)
@@ -0,0 +1,381 @@
+from argparse import ArgumentParser
+from pathlib import Path
+import logging
+
+# Only light modules are imported at module level, so that --help and argument
+# errors return without loading pandas and the other pipeline dependencies
+from create_idiom_dataset.frequency_curation import NB_CATALOG_URL
+from create_idiom_dataset.ocr_rules import DEFAULT_OCR_RULES_FILE
+from create_idiom_dataset.dataset_export import OUTPUT_FORMATS
+
+logger = logging.getLogger(__name__)
+
+
+def get_parser() -> ArgumentParser:
+    parser = ArgumentParser()
+    parser.add_argument(
+        "idiom_collection_dir",
+        type=Path,
+        help="Path to directory where idiom collection is stored",
+    )
+    parser.add_argument(
+        "dataset_output_dir", type=Path, help="Path to output directory"
+    )
+    parser.add_argument(
+        "--languages",
+        nargs="+",
+        default=["nob", "nno"],
+        help="Languages to create dataset for (assuming idiom_collection_dir contains subdirectories for each language)",
+    )
+
+    parser.add_argument(
+        "--special_chars",
+        nargs="+",
+        default=["(", "/", "*"],
+        help="Filter out idioms that contain these characters",
+    )
+    parser.add_argument(
+        "--ocr_rules_file",
+        type=Path,
+        default=DEFAULT_OCR_RULES_FILE,
+        help="Path to json file with OCR corrections applied to idiom tokens",
+    )
+    parser.add_argument(
+        "--min_num_words", type=int, default=3, help="Minimum number of words in idiom"
+    )
+    parser.add_argument(
+        "--min_frequency", type=int, default=100, help="Minimum frequency"
+    )
+    parser.add_argument(
+        "--save_every",
+        type=int,
+        default=100,
+        metavar="N",
+        help="How often to sync the checkpoint journal while fetching idiom frequencies and translations (every N idioms) (it takes a while)",
+    )
+    parser.add_argument(
+        "--max_concurrent_requests",
+        type=int,
+        default=4,
+        metavar="N",
+        help="Maximum number of concurrent requests when fetching idiom frequencies (lowered automatically while an API throttles or fails)",
+    )
+    parser.add_argument(
+        "--frequency_backend",
+        choices=["nb_catalog", "local_corpus"],
+        default="nb_catalog",
+        help="Where to get idiom frequencies: hits in the NB catalog API, or exact phrase counts in the text files in --corpus_dir. Frequencies from earlier runs are only reused with nb_catalog, so use --overwrite after switching to it",
+    )
+    parser.add_argument(
+        "--corpus_dir",
+        type=Path,
+        help="Directory of plain text corpus files to count idioms in with --frequency_backend local_corpus",
+    )
+    parser.add_argument(
+        "--nb_catalog_url",
+        type=str,
+        default=NB_CATALOG_URL,
+        help="URL of the NB catalog API items endpoint used to look up idiom frequencies",
+    )
+    parser.add_argument(
+        "--apertium_url",
+        type=str,
+        help="URL of the translate endpoint of the Apertium APy server to translate idioms with, e.g. a self-hosted instance (default: https://apertium.org/apy/translate)",
+    )
+    parser.add_argument(
+        "--translation_batch_size",
+        type=int,
+        default=50,
+        metavar="N",
+        help="Number of idioms to translate per request to the translation API (1 sends one request per idiom)",
+    )
+    parser.add_argument(
+        "--work_queue",
+        type=Path,
+        help="Path to a sqlite work queue on shared storage. Idiom frequencies and translations are then looked up in batches claimed from the queue, also by the processes started with `create_idiom_dataset worker <work_queue>` on this or other hosts",
+    )
+    parser.add_argument(
+        "--cluster_idioms",
+        action="store_true",
+        help="If set, cluster near-duplicate idioms of each language (differing by e.g. an OCR slip, punctuation, an article or word order), record the cluster_id of each idiom in the dataset and write a near-duplicate report",
+    )
+    parser.add_argument(
+        "--cluster_queries",
+        action="store_true",
+        help="If set, only look up the frequency of and translate the canonical idiom of each near-duplicate cluster, and give every idiom in a cluster the frequency of its canonical idiom (implies --cluster_idioms)",
+    )
+    parser.add_argument(
+        "--cluster_threshold",
+        type=float,
+        default=0.7,
+        help="Minimum Jaccard similarity of the character trigrams of two idioms for them to be near-duplicates",
+    )
+    parser.add_argument(
+        "--num_processes",
+        type=int,
+        default=1,
+        metavar="N",
+        help="Number of processes to use when reading and normalizing idiom books, and when building the sequence graphs and completion tasks of each language",
+    )
+    parser.add_argument(
+        "--collection_idioms_csv",
+        type=Path,
+        help="Path to csv file to store all idioms from idiom collection",
+        default="data/collection_idioms.csv",
+    )
+    parser.add_argument(
+        "--book_cache_dir",
+        type=Path,
+        help="Path to directory caching the normalized and filtered idioms of each book, in a subdirectory per language",
+        default="data/book_cache",
+    )
+    parser.add_argument(
+        "--no_book_cache",
+        action="store_true",
+        help="If set, re-read every book instead of using the per-book cache",
+    )
+    parser.add_argument(
+        "--idiom_freq_file",
+        type=Path,
+        help="Path to idiom frequency file",
+        default="data/idiom_frequencies.csv",
+    )
+    parser.add_argument(
+        "--filtered_idioms_file",
+        type=Path,
+        help="Path to final filtered idioms file",
+        default="data/filtered_idioms.csv",
+    )
+    parser.add_argument(
+        "--idiom_clusters_file",
+        type=Path,
+        help="Path to csv file with the near-duplicate cluster of each idiom, with --cluster_idioms",
+        default="data/idiom_clusters.csv",
+    )
+    parser.add_argument(
+        "--dedup_report",
+        type=Path,
+        help="Path to json file with a report of the near-duplicate clusters, with --cluster_idioms",
+        default="data/dedup_report.json",
+    )
+    parser.add_argument(
+        "--translated_idioms_file",
+        type=Path,
+        help="Path to translated idioms file (csv with idiom, language, source_idiom, source_language)",
+        default="data/translated_idioms.csv",
+    )
+    parser.add_argument(
+        "--translated_idiom_freq_file",
+        type=Path,
+        help="Path to translated idiom frequency file",
+        default="data/translated_idiom_frequencies.csv",
+    )
+    parser.add_argument(
+        "--filtered_translated_idioms_file",
+        type=Path,
+        help="Path to final filtered translated idioms file",
+        default="data/filtered_translated_idioms.csv",
+    )
+    parser.add_argument(
+        "--cache_file",
+        type=Path,
+        help="Path to sqlite file caching responses from the frequency and translation APIs",
+        default="data/response_cache.sqlite",
+    )
+    parser.add_argument(
+        "--cache_ttl_days",
+        type=float,
+        help="Consider cached API responses older than this many days missing (default: never expire)",
+    )
+    parser.add_argument(
+        "--cache_max_entries",
+        type=int,
+        help="Keep at most this many (most recently used) API responses in the cache",
+    )
+    parser.add_argument(
+        "--no_cache",
+        action="store_true",
+        help="If set, do not read or write the API response cache",
+    )
+    parser.add_argument(
+        "--completion_length",
+        type=int,
+        default=1,
+        metavar="K",
+        help="Number of tokens at the end of each idiom to complete in the idiom completion task",
+    )
+    parser.add_argument(
+        "--output_formats",
+        nargs="+",
+        choices=OUTPUT_FORMATS,
+        default=["jsonl"],
+        help="Formats to write the idiom completion tasks and frequency tables in. With parquet, the dataset README points to the parquet files",
+    )
+    parser.add_argument(
+        "--full_validation",
+        action="store_true",
+        help="If set, also check the created dataset by loading every config with datasets.load_dataset",
+    )
+    parser.add_argument(
+        "--binary_graphs",
+        action="store_true",
+        help="If set, also write each sequence graph as a memory mappable binary .trie file",
+    )
+    parser.add_argument(
+        "--stage_manifest",
+        type=Path,
+        help="Path to json file recording the input and parameter fingerprint of each pipeline stage",
+        default="data/stages.json",
+    )
+    parser.add_argument(
+        "--overwrite",
+        action="store_true",
+        help="If set, rerun every stage and overwrite existing files (else only rerun stages whose inputs or parameters changed)",
+    )
+    parser.add_argument(
+        "-ll",
+        "--log_level",
+        type=str,
+        choices=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"],
+        default="INFO",
+        help="Set log level",
+    )
+    return parser
+
+
+def create_idiom_dataset():
+    parser = get_parser()
+    args = parser.parse_args()
+    if args.frequency_backend == "local_corpus" and args.corpus_dir is None:
+        parser.error("--frequency_backend local_corpus requires --corpus_dir")
+    if args.cluster_queries:
+        args.cluster_idioms = True
+
+    from create_idiom_dataset.utils import setup_logging
+    from create_idiom_dataset.http_client import HttpClient
+    from create_idiom_dataset.stages import run_stages
+    from create_idiom_dataset.pipeline import (
+        get_stages,
+        open_response_cache,
+        open_work_queue,
+    )
+
+    setup_logging(args.log_level, "create_idiom_dataset")
+    logger.info("Arguments: %s", args)
+
+    cache = open_response_cache(args)
+    client = HttpClient(max_concurrency=args.max_concurrent_requests)
+    queue = open_work_queue(args)
+    try:
+        run_stages(
+            get_stages(args, cache=cache, client=client, queue=queue),
+            manifest_file=args.stage_manifest,
+            force=args.overwrite,
+        )
+    finally:
+        # Workers that joined the run exit, also if it failed
+        if queue is not None:
+            queue.finish()
+            queue.close()
+    client.close()
+    if cache is not None:
+        cache.close()
+
+    logger.info("Done! Created dataset at %s", args.dataset_output_dir)
+
+
+def get_worker_parser() -> ArgumentParser:
+    parser = ArgumentParser(
+        prog="create_idiom_dataset worker",
+        description="Join a run started with --work_queue, and look up idiom frequencies and translations from its queue until the run finishes",
+    )
+    parser.add_argument(
+        "work_queue", type=Path, help="Path to the work queue of the run to join"
+    )
+    parser.add_argument(
+        "--max_concurrent_requests",
+        type=int,
+        default=4,
+        metavar="N",
+        help="Maximum number of concurrent requests when fetching idiom frequencies",
+    )
+    parser.add_argument(
+        "--cache_file",
+        type=Path,
+        help="Path to sqlite file caching responses from the frequency and translation APIs (default: no cache)",
+    )
+    parser.add_argument(
+        "--poll_interval",
+        type=float,
+        default=5.0,
+        help="Seconds to wait before checking the queue again when it has no work",
+    )
+    parser.add_argument(
+        "-ll",
+        "--log_level",
+        type=str,
+        choices=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"],
+        default="INFO",
+        help="Set log level",
+    )
+    return parser
+
+
+def worker(argv: list[str] | None = None):
+    parser = get_worker_parser()
+    args = parser.parse_args(argv)
+    if not args.work_queue.exists():
+        parser.error(f"Work queue {args.work_queue} does not exist")
+
+    from create_idiom_dataset.utils import setup_logging
+    from create_idiom_dataset.http_client import HttpClient
+    from create_idiom_dataset.response_cache import ResponseCache
+    from create_idiom_dataset.frequency_curation import (
+        NbCatalogBackend,
+        QueuedFrequencyBackend,
+    )
+    from create_idiom_dataset.translation import (
+        ApertiumBackend,
+        QueuedTranslationBackend,
+    )
+    from create_idiom_dataset.work_queue import WorkQueue, new_worker_id, run_worker
+
+    setup_logging(args.log_level, "create_idiom_dataset_worker")
+    queue = WorkQueue(args.work_queue)
+    settings = queue.settings()
+    if "nb_catalog_url" not in settings:
+        parser.error(f"Work queue {args.work_queue} has no run to join")
+
+    worker_id = new_worker_id()
+    logger.info("Worker %s joining the run of %s", worker_id, args.work_queue)
+    cache = ResponseCache(args.cache_file) if args.cache_file else None
+    client = HttpClient(max_concurrency=args.max_concurrent_requests)
+    frequency_backend = QueuedFrequencyBackend(
+        queue,
+        NbCatalogBackend(
+            url=settings["nb_catalog_url"],
+            client=client,
+            cache=cache,
+            max_concurrent_requests=args.max_concurrent_requests,
+        ),
+        worker_id=worker_id,
+    )
+    translation_backend = QueuedTranslationBackend(
+        queue,
+        ApertiumBackend(
+            url=settings["apertium_url"],
+            client=client,
+            cache=cache,
+            batch_size=settings["translation_batch_size"],
+        ),
+        worker_id=worker_id,
+    )
+    run_worker(
+        queue,
+        [frequency_backend.queued_lookup, translation_backend.queued_lookup],
+        poll_interval=args.poll_interval,
+    )
+    queue.close()
+    client.close()
+    if cache is not None:
+        cache.close()
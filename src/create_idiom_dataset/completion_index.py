@@ -0,0 +1,237 @@
+from __future__ import annotations
+
+import json
+import logging
+from argparse import ArgumentParser
+from bisect import bisect_left
+from collections.abc import Iterable, Iterator
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import TYPE_CHECKING
+from urllib.parse import parse_qs, urlparse
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+class CompletionIndex:
+    """In-memory index from idiom start to accepted completions, per language
+
+    Idiom starts are the space separated tokens of an idiom except the last, as in the
+    idiom_start column of the idiom completion task. Exact lookups are a dict lookup,
+    and prefix lookups a binary search in the sorted idiom starts of the language.
+    """
+
+    def __init__(self, completions: dict[str, dict[str, list[str]]]):
+        self.completions = completions
+        self.sorted_starts = {
+            language: sorted(starts) for language, starts in completions.items()
+        }
+
+    @classmethod
+    def from_records(cls, records: Iterable[dict]) -> CompletionIndex:
+        """Build from records with idiom_start, accepted_completions and language"""
+        completions = {}
+        for record in records:
+            language_completions = completions.setdefault(record["language"], {})
+            language_completions.setdefault(record["idiom_start"], []).extend(
+                record["accepted_completions"]
+            )
+        return cls(completions)
+
+    @classmethod
+    def from_completion_task(cls, completion_task_df: pd.DataFrame) -> CompletionIndex:
+        """Build from the output of idiom_df_to_idiom_completion_task"""
+        return cls.from_records(
+            completion_task_df[
+                ["idiom_start", "accepted_completions", "language"]
+            ].to_dict("records")
+        )
+
+    @classmethod
+    def from_jsonl(cls, path: Path) -> CompletionIndex:
+        """Build from an idiom completion task jsonl file (e.g. data.jsonl)"""
+        with open(path) as f:
+            return cls.from_records(json.loads(line) for line in f if line.strip())
+
+    @classmethod
+    def from_sequence_graphs(cls, sequence_graphs: dict[str, dict]) -> CompletionIndex:
+        """Build from create_sequence_graph output per language
+
+        Every path from the root to a leaf is taken as an idiom. Idioms that end in
+        inner nodes are not marked in sequence graphs, so they are not included.
+        """
+        return cls.from_records(
+            {
+                "idiom_start": " ".join(tokens[:-1]),
+                "accepted_completions": [tokens[-1]],
+                "language": language,
+            }
+            for language, sequence_graph in sequence_graphs.items()
+            for tokens in iter_graph_paths(sequence_graph)
+        )
+
+    @property
+    def languages(self) -> list[str]:
+        return list(self.completions)
+
+    def complete(self, idiom_start: str, language: str) -> list[str]:
+        """Accepted completions of idiom_start (empty if it is not an idiom start)"""
+        return self.completions.get(language, {}).get(idiom_start, [])
+
+    def complete_many(self, queries: Iterable[tuple[str, str]]) -> list[list[str]]:
+        """Accepted completions for each (idiom_start, language) in queries"""
+        return [
+            self.complete(idiom_start, language) for idiom_start, language in queries
+        ]
+
+    def prefix(
+        self, prefix: str, language: str, limit: int | None = None
+    ) -> list[tuple[str, list[str]]]:
+        """(idiom start, accepted completions) for idiom starts beginning with prefix, in sorted order"""
+        starts = self.sorted_starts.get(language, [])
+        completions = self.completions.get(language, {})
+        matches = []
+        for i in range(bisect_left(starts, prefix), len(starts)):
+            if not starts[i].startswith(prefix) or len(matches) == limit:
+                break
+            matches.append((starts[i], completions[starts[i]]))
+        return matches
+
+
+def iter_graph_paths(sequence_graph: dict) -> Iterator[list[str]]:
+    """Yield the token lists of all root to leaf paths in a sequence graph, in order"""
+    stack = [([], iter(sequence_graph.items()))]
+    while stack:
+        path, children = stack[-1]
+        child = next(children, None)
+        if child is None:
+            stack.pop()
+            continue
+        token, subgraph = child
+        if subgraph:
+            stack.append((path + [token], iter(subgraph.items())))
+        else:
+            yield path + [token]
+
+
+class CompletionIndexHandler(BaseHTTPRequestHandler):
+    """HTTP interface to a CompletionIndex
+
+    GET /complete?idiom_start=...&language=...
+    GET /prefix?prefix=...&language=...[&limit=N]
+    POST /complete with json {"queries": [{"idiom_start": ..., "language": ...}, ...]}
+    """
+
+    index: CompletionIndex
+
+    def send_json(self, obj, status: int = 200):
+        body = json.dumps(obj, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        try:
+            if url.path == "/complete":
+                self.send_json(
+                    {
+                        "idiom_start": params["idiom_start"],
+                        "language": params["language"],
+                        "accepted_completions": self.index.complete(
+                            params["idiom_start"], params["language"]
+                        ),
+                    }
+                )
+            elif url.path == "/prefix":
+                limit = int(params["limit"]) if "limit" in params else None
+                matches = self.index.prefix(params["prefix"], params["language"], limit)
+                self.send_json(
+                    {
+                        "matches": [
+                            {"idiom_start": start, "accepted_completions": completions}
+                            for start, completions in matches
+                        ]
+                    }
+                )
+            elif url.path == "/languages":
+                self.send_json({"languages": self.index.languages})
+            else:
+                self.send_json({"error": f"Unknown path {url.path}"}, status=404)
+        except (KeyError, ValueError) as e:
+            self.send_json({"error": f"Bad request: {e!r}"}, status=400)
+
+    def do_POST(self):
+        if urlparse(self.path).path != "/complete":
+            self.send_json({"error": f"Unknown path {self.path}"}, status=404)
+            return
+        try:
+            length = int(self.headers["Content-Length"])
+            queries = json.loads(self.rfile.read(length))["queries"]
+            results = self.index.complete_many(
+                (query["idiom_start"], query["language"]) for query in queries
+            )
+        except (KeyError, TypeError, ValueError) as e:
+            self.send_json({"error": f"Bad request: {e!r}"}, status=400)
+            return
+        self.send_json({"results": results})
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+
+def create_completion_server(
+    index: CompletionIndex, host: str = "127.0.0.1", port: int = 8000
+) -> ThreadingHTTPServer:
+    handler = type("Handler", (CompletionIndexHandler,), {"index": index})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def get_parser() -> ArgumentParser:
+    parser = ArgumentParser(
+        prog="create_idiom_dataset serve",
+        description="Serve idiom completion lookups over HTTP",
+    )
+    parser.add_argument(
+        "dataset_dir", type=Path, help="Path to dataset created by create_idiom_dataset"
+    )
+    parser.add_argument(
+        "--include_translated_idioms",
+        action="store_true",
+        help="If set, serve original_and_translated_data.jsonl instead of data.jsonl",
+    )
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Host to bind")
+    parser.add_argument("--port", type=int, default=8000, help="Port to bind")
+    return parser
+
+
+def serve(argv: list[str] | None = None):
+    args = get_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(message)s")
+
+    data_file = args.dataset_dir / (
+        "original_and_translated_data.jsonl"
+        if args.include_translated_idioms
+        else "data.jsonl"
+    )
+    index = CompletionIndex.from_jsonl(data_file)
+    logger.info(
+        "Loaded %s idiom starts from %s",
+        sum(len(starts) for starts in index.completions.values()),
+        data_file,
+    )
+
+    server = create_completion_server(index, host=args.host, port=args.port)
+    logger.info("Serving idiom completions at http://%s:%s", args.host, args.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
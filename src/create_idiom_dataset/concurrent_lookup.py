@@ -0,0 +1,53 @@
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from typing import TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def run_concurrently(
+    items: Iterable[T], lookup: Callable[[T], R], max_workers: int
+) -> Iterator[tuple[T, R]]:
+    """Run lookup on items in a pool of max_workers threads, yielding (item, result) as each lookup completes
+
+    At most 2 * max_workers lookups are in flight at a time, so items can be a lazy iterable.
+    """
+    items = iter(items)
+    max_in_flight = 2 * max_workers
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        in_flight = {}
+        for item in items:
+            in_flight[executor.submit(lookup, item)] = item
+            if len(in_flight) >= max_in_flight:
+                break
+
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = in_flight.pop(future)
+                yield item, future.result()
+
+            for item in items:
+                in_flight[executor.submit(lookup, item)] = item
+                if len(in_flight) >= max_in_flight:
+                    break
+
+
+def map_in_processes(
+    function: Callable[..., R], *iterables: Iterable, num_processes: int
+) -> list[R]:
+    """Call function on the items of iterables in a pool of num_processes processes
+
+    Results are returned in the order of the items, whichever process finishes first.
+    With num_processes <= 1, function is called in this process.
+    """
+    if num_processes > 1:
+        with ProcessPoolExecutor(max_workers=num_processes) as executor:
+            return list(executor.map(function, *iterables))
+    return list(map(function, *iterables))
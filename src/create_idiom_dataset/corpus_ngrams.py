@@ -0,0 +1,101 @@
+import logging
+import re
+from collections import Counter
+from collections.abc import Iterable, Iterator
+from functools import partial
+from pathlib import Path
+from create_idiom_dataset.concurrent_lookup import map_in_processes
+
+logger = logging.getLogger(__name__)
+
+# Words are runs of letters and digits, so punctuation and case are ignored when matching
+WORD_PATTERN = re.compile(r"\w+")
+
+# Number of words counted at a time when scanning a corpus file
+CHUNK_SIZE = 1 << 16
+
+
+def phrase_words(phrase: str) -> tuple[str, ...]:
+    """Lowercased words of phrase, without punctuation"""
+    return tuple(WORD_PATTERN.findall(phrase.lower()))
+
+
+def iter_corpus_files(corpus_dir: Path) -> Iterator[Path]:
+    """Yield the plain text files under corpus_dir, in a stable order"""
+    for path in sorted(corpus_dir.rglob("*")):
+        if path.is_file() and not path.name.startswith("."):
+            yield path
+
+
+class NgramIndex:
+    """Hashed index of the word n-grams to count in a corpus
+
+    Holds the n-grams of the phrases and every prefix of them, so that a scan of the
+    corpus only looks at the n-grams starting at a position while they are prefixes
+    of some phrase.
+    """
+
+    def __init__(self, phrases: Iterable[tuple[str, ...]]):
+        self.phrases = {phrase for phrase in phrases if phrase}
+        self.prefixes = {
+            phrase[:n] for phrase in self.phrases for n in range(1, len(phrase))
+        }
+        self.max_length = max(map(len, self.phrases), default=0)
+
+    def count_words(self, words: list[str], num_starts: int, counts: Counter):
+        """Count the phrases starting at the first num_starts positions of words"""
+        phrases = self.phrases
+        prefixes = self.prefixes
+        for start in range(num_starts):
+            for end in range(start + 1, min(start + self.max_length, len(words)) + 1):
+                ngram = tuple(words[start:end])
+                if ngram in phrases:
+                    counts[ngram] += 1
+                if ngram not in prefixes:
+                    break
+
+    def count_file(self, path: Path) -> Counter:
+        """Count the phrases in one corpus file, including phrases spanning lines"""
+        counts = Counter()
+        if not self.phrases:
+            return counts
+        words = []
+        with open(path, errors="replace") as f:
+            for line in f:
+                words.extend(WORD_PATTERN.findall(line.lower()))
+                if len(words) >= CHUNK_SIZE + self.max_length:
+                    # Keep the words that phrases starting in the next chunk may need
+                    num_starts = len(words) - self.max_length + 1
+                    self.count_words(words, num_starts, counts)
+                    words = words[num_starts:]
+        self.count_words(words, len(words), counts)
+        return counts
+
+
+def count_phrases(
+    corpus_dir: Path, phrases: Iterable[str], num_processes: int = 1
+) -> dict[str, int]:
+    """Count the exact occurrences of each phrase in the text files under corpus_dir
+
+    Phrases and corpus are compared as lowercased words, ignoring punctuation. All
+    phrases are counted in one pass over the corpus, with the files split between
+    num_processes processes.
+    """
+    phrases = list(phrases)
+    index = NgramIndex(map(phrase_words, phrases))
+    corpus_files = list(iter_corpus_files(corpus_dir))
+    logger.info(
+        "Counting %s phrases in %s corpus files in %s",
+        len(index.phrases),
+        len(corpus_files),
+        corpus_dir,
+    )
+
+    counts = Counter()
+    for file_counts in map_in_processes(
+        partial(NgramIndex.count_file, index),
+        corpus_files,
+        num_processes=num_processes,
+    ):
+        counts.update(file_counts)
+    return {phrase: counts[phrase_words(phrase)] for phrase in phrases}
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING
+import logging
+
+if TYPE_CHECKING:
+    import pandas as pd
+    import pyarrow as pa
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_FORMATS = ["jsonl", "parquet"]
+
+# Name of each completion task config in the dataset README and the file stem it is written to
+COMPLETION_TASK_CONFIGS = {
+    "default": "data",
+    "include_translated_idioms": "original_and_translated_data",
+}
+
+COMPLETION_TASK_COLUMNS = ["idiom_start", "accepted_completions", "language"]
+
+
+@lru_cache
+def completion_task_schema() -> pa.Schema:
+    """Arrow schema of the completion task, with accepted_completions as a list column"""
+    import pyarrow as pa
+
+    return pa.schema(
+        [
+            ("idiom_start", pa.string()),
+            ("accepted_completions", pa.list_(pa.string())),
+            ("language", pa.string()),
+        ]
+    )
+
+
+def completion_task_files(dataset_output_dir: Path, formats: list[str]) -> list[Path]:
+    """Paths of all completion task files written in formats"""
+    return [
+        dataset_output_dir / f"{stem}.{output_format}"
+        for output_format in formats
+        for stem in COMPLETION_TASK_CONFIGS.values()
+    ]
+
+
+def readme_format(formats: list[str]) -> str:
+    """Format the dataset README configs point to, preferring memory mappable parquet"""
+    return "parquet" if "parquet" in formats else "jsonl"
+
+
+def datasets_readme_info(formats: list[str]) -> str:
+    """Dataset card header with one config per completion task"""
+    output_format = readme_format(formats)
+    lines = ["", "---", "configs:"]
+    for config_name, stem in COMPLETION_TASK_CONFIGS.items():
+        lines += [
+            f"- config_name: {config_name}",
+            "  data_files:",
+            "  - split: test",
+            f'    path: "{stem}.{output_format}"',
+        ]
+    lines += ["---", ""]
+    return "\n".join(lines)
+
+
+def write_completion_task(
+    completion_task_df: pd.DataFrame,
+    dataset_output_dir: Path,
+    stem: str,
+    formats: list[str],
+):
+    """Write completion_task_df to <stem>.<format> in dataset_output_dir for each format"""
+    if "jsonl" in formats:
+        completion_task_df.to_json(
+            dataset_output_dir / f"{stem}.jsonl", lines=True, orient="records"
+        )
+    if "parquet" in formats:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.Table.from_pandas(
+            completion_task_df[COMPLETION_TASK_COLUMNS],
+            schema=completion_task_schema(),
+            preserve_index=False,
+        )
+        pq.write_table(table, dataset_output_dir / f"{stem}.parquet")
+
+
+def write_table(df: pd.DataFrame, csv_file: Path, formats: list[str]):
+    """Write df to csv_file, and next to it as a parquet file if parquet is in formats"""
+    df.to_csv(csv_file, index=False)
+    if "parquet" in formats:
+        df.to_parquet(csv_file.with_suffix(".parquet"), index=False)
+
+
+def parquet_num_rows(path: Path) -> int:
+    """Number of rows in a parquet file, read from its footer only"""
+    import pyarrow.parquet as pq
+
+    return pq.read_metadata(path).num_rows
@@ -1,41 +1,281 @@
+from __future__ import annotations
+
 import logging
-import requests
-import pandas as pd
+from abc import ABC, abstractmethod
+from contextlib import nullcontext
+from collections.abc import Iterator
 from pathlib import Path
-from tqdm import tqdm
+from typing import TYPE_CHECKING
+from create_idiom_dataset.concurrent_lookup import run_concurrently
+from create_idiom_dataset.response_cache import ResponseCache
+
+if TYPE_CHECKING:
+    import pandas as pd
+    from create_idiom_dataset.http_client import HttpClient
+    from create_idiom_dataset.work_queue import WorkQueue
 
 logger = logging.getLogger(__name__)
 
+NB_CATALOG_URL = "https://api.nb.no/catalog/v1/items"
+
+
+def get_frequency(
+    idiom: str,
+    client: HttpClient | None = None,
+    url: str = NB_CATALOG_URL,
+    cache: ResponseCache | None = None,
+) -> int | None:
+    """Number of hits for idiom as a quoted phrase in the catalog at url
+
+    Returns None if the catalog answers with a non-retriable error, and raises
+    RequestFailed if it could not be reached.
+    """
+    if cache is not None:
+        frequency = cache.get(url, idiom)
+        if frequency is not None:
+            return frequency
+
+    if client is None:
+        from create_idiom_dataset.http_client import HttpClient
+
+        # A client for this lookup only, closed when it is done
+        with HttpClient(max_concurrency=1) as own_client:
+            return get_frequency(idiom, client=own_client, url=url, cache=cache)
 
-def get_frequency(idiom: str):
     payload = {"q": f'"{idiom}"'}
-    url = "https://api.nb.no/catalog/v1/items"
 
-    response = requests.get(url, params=payload)
+    response = client.get(url, params=payload)
     if response.ok:
-        return response.json()["page"]["totalElements"]
+        frequency = response.json()["page"]["totalElements"]
+        if cache is not None:
+            cache.set(url, idiom, frequency)
+        return frequency
     else:
         logger.warning(response)
         return None
 
 
+class FrequencyBackend(ABC):
+    """Source of idiom frequencies for get_idiom_frequencies"""
+
+    name = ""
+
+    @abstractmethod
+    def get_frequencies(self, idioms: list[str]) -> Iterator[tuple[int, int | None]]:
+        """Yield (position in idioms, frequency) for the idioms, in any order
+
+        The frequency is None for idioms the backend has no frequency for. If the
+        frequency of some idioms could not be looked up, RequestFailed is raised after
+        all other frequencies are yielded.
+        """
+
+
+class NbCatalogBackend(FrequencyBackend):
+    """Frequencies as the number of hits for the quoted idiom in the NB catalog API
+
+    Lookups run in up to max_concurrent_requests threads. Idioms whose lookup failed
+    are re-queued, up to max_passes passes over the idioms.
+    """
+
+    name = "nb_catalog"
+
+    def __init__(
+        self,
+        url: str = NB_CATALOG_URL,
+        client: HttpClient | None = None,
+        cache: ResponseCache | None = None,
+        max_concurrent_requests: int = 1,
+        max_passes: int = 3,
+    ):
+        self.url = url
+        self.client = client
+        self.cache = cache
+        self.max_concurrent_requests = max_concurrent_requests
+        self.max_passes = max_passes
+
+    def get_frequencies(self, idioms: list[str]) -> Iterator[tuple[int, int | None]]:
+        from create_idiom_dataset.http_client import HttpClient, RequestFailed
+
+        def lookup(item):
+            try:
+                return get_frequency(
+                    item[1], client=client, url=self.url, cache=self.cache
+                )
+            except RequestFailed as e:
+                logger.debug("Re-queueing idiom %s: %s", item[1], e)
+                return e
+
+        pending = list(enumerate(idioms))
+        # A client passed in is left open for its owner
+        with (
+            nullcontext(self.client)
+            if self.client is not None
+            else HttpClient(max_concurrency=self.max_concurrent_requests)
+        ) as client:
+            for num_pass in range(1, self.max_passes + 1):
+                failed = []
+                for (position, idiom), frequency in run_concurrently(
+                    pending, lookup, max_workers=self.max_concurrent_requests
+                ):
+                    if isinstance(frequency, RequestFailed):
+                        failed.append((position, idiom))
+                    else:
+                        yield position, frequency
+
+                pending = failed
+                if not pending or num_pass == self.max_passes:
+                    break
+                logger.warning(
+                    "Re-queueing %s idioms whose frequency lookup failed", len(pending)
+                )
+                client.wait_for_host(self.url)
+
+        if pending:
+            raise RequestFailed(
+                f"Could not get the frequency of {len(pending)} idioms from {self.url}, rerun to retry them"
+            )
+
+
+class LocalCorpusBackend(FrequencyBackend):
+    """Frequencies as exact phrase counts in the plain text files under corpus_dir
+
+    All idioms are counted in one pass over the corpus (see corpus_ngrams.count_phrases).
+    """
+
+    name = "local_corpus"
+
+    def __init__(self, corpus_dir: Path, num_processes: int = 1):
+        self.corpus_dir = corpus_dir
+        self.num_processes = num_processes
+
+    def get_frequencies(self, idioms: list[str]) -> Iterator[tuple[int, int | None]]:
+        from create_idiom_dataset.corpus_ngrams import count_phrases
+
+        counts = count_phrases(
+            self.corpus_dir, idioms, num_processes=self.num_processes
+        )
+        for position, idiom in enumerate(idioms):
+            yield position, counts[idiom]
+
+
+class QueuedFrequencyBackend(FrequencyBackend):
+    """Frequencies from backend, looked up by all workers sharing queue
+
+    The idioms are added to the queue and looked up claim_size at a time, by this
+    process and by any `create_idiom_dataset worker` processes that joined the run.
+    """
+
+    name = "work_queue"
+    kind = "frequency"
+
+    def __init__(
+        self,
+        queue: WorkQueue,
+        backend: FrequencyBackend,
+        worker_id: str | None = None,
+        claim_size: int = 50,
+        poll_interval: float = 1.0,
+    ):
+        from create_idiom_dataset.work_queue import QueuedLookup
+
+        self.backend = backend
+        self.queued_lookup = QueuedLookup(
+            queue,
+            self.kind,
+            self.lookup,
+            worker_id=worker_id,
+            claim_size=claim_size,
+            poll_interval=poll_interval,
+        )
+
+    def lookup(self, keys: list[tuple]) -> list[tuple[tuple, int | None]]:
+        from create_idiom_dataset.http_client import RequestFailed
+
+        results = []
+        try:
+            for position, frequency in self.backend.get_frequencies(
+                [idiom for (idiom,) in keys]
+            ):
+                results.append((keys[position], frequency))
+        except RequestFailed as e:
+            # The idioms without a result are released to be retried
+            logger.debug("Releasing %s idioms: %s", len(keys) - len(results), e)
+        return results
+
+    def get_frequencies(self, idioms: list[str]) -> Iterator[tuple[int, int | None]]:
+        from create_idiom_dataset.http_client import RequestFailed
+
+        results = self.queued_lookup.run([(idiom,) for idiom in idioms])
+        for position, idiom in enumerate(idioms):
+            if (idiom,) in results:
+                yield position, results[(idiom,)]
+
+        num_failed = len(idioms) - len(results)
+        if num_failed:
+            raise RequestFailed(
+                f"Could not get the frequency of {num_failed} idioms from {self.backend.name}, rerun to retry them"
+            )
+
+
 def get_idiom_frequencies(
-    idiom_df: pd.DataFrame, save_every: int, frequency_file: Path
+    idiom_df: pd.DataFrame,
+    save_every: int,
+    frequency_file: Path,
+    max_concurrent_requests: int = 1,
+    url: str = NB_CATALOG_URL,
+    cache: ResponseCache | None = None,
+    resume: bool = True,
+    client: HttpClient | None = None,
+    max_passes: int = 3,
+    backend: FrequencyBackend | None = None,
 ) -> pd.DataFrame:
+    """Get missing idiom frequencies from backend (by default the NB catalog at url)
+
+    Frequencies are written to idiom_df as they arrive and appended to a checkpoint
+    journal next to frequency_file, which is synced every save_every idioms. If resume
+    is set, frequencies from an earlier interrupted run are replayed from the journal
+    first.
+
+    If the backend raises RequestFailed for some idioms, the frequencies found so far
+    are saved before it is raised, so that a rerun only looks up the failed idioms.
+    """
+    from tqdm import tqdm
+    from create_idiom_dataset.checkpoint import CheckpointJournal
+
+    if backend is None:
+        backend = NbCatalogBackend(
+            url=url,
+            client=client,
+            cache=cache,
+            max_concurrent_requests=max_concurrent_requests,
+            max_passes=max_passes,
+        )
+
+    journal = CheckpointJournal(
+        frequency_file, ["idiom"], "frequency", flush_every=save_every
+    )
+    if resume:
+        idiom_df = journal.replay(idiom_df)
+    else:
+        journal.clear()
+
     freq_missing = idiom_df[idiom_df.frequency.isnull()]
     logger.debug(
         "Total number of idioms: %s Number of idioms missing frequency: %s",
         len(idiom_df),
         len(freq_missing),
     )
-    every = 0
-    for tup in tqdm(freq_missing.itertuples(), total=len(freq_missing)):
-        frequency = get_frequency(tup.idiom)
-        idiom_df.at[tup.Index, "frequency"] = frequency
-
-        every += 1
-        if every % save_every == 0:
-            logger.debug("Saving idiom_df to file")
-            idiom_df.to_csv(frequency_file, index=False)
-    idiom_df.to_csv(frequency_file, index=False)
+
+    try:
+        with journal.appending():
+            for position, frequency in tqdm(
+                backend.get_frequencies(freq_missing.idiom.tolist()),
+                total=len(freq_missing),
+            ):
+                idiom_df.at[freq_missing.index[position], "frequency"] = frequency
+                if frequency is not None:
+                    journal.append((freq_missing.idiom.iat[position],), frequency)
+    finally:
+        logger.debug("Saving idiom_df to file %s", frequency_file)
+        journal.compact(idiom_df)
     return idiom_df
@@ -0,0 +1,243 @@
+import email.utils
+import logging
+import random
+import threading
+import time
+from typing import Self
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Responses that mean the host is overloaded or temporarily failing
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class RequestFailed(Exception):
+    """A request that still failed after all retries, or was not sent as the host's circuit is open
+
+    The query can be retried later, unlike a response with a non-retriable status.
+    """
+
+
+def create_session(pool_size: int = 10) -> requests.Session:
+    """Create a requests session that keeps up to pool_size connections alive per host"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Seconds to wait from a Retry-After header (delay in seconds or HTTP date)"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class HostLimiter:
+    """Adaptive limit on the number of concurrent requests to one host
+
+    The limit grows additively (by about one per limit successful requests) up to
+    max_limit, and is halved on every throttled or failed request (AIMD). A
+    Retry-After delay pauses all requests to the host until it has passed.
+    """
+
+    def __init__(self, max_limit: int, min_limit: int = 1):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        with self.condition:
+            while True:
+                pause = self.paused_until - time.monotonic()
+                if pause <= 0 and self.in_flight < int(self.limit):
+                    break
+                self.condition.wait(timeout=pause if pause > 0 else None)
+            self.in_flight += 1
+
+    def release(self, throttled: bool, retry_after: float | None = None):
+        with self.condition:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(self.min_limit, self.limit / 2)
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            if retry_after:
+                self.paused_until = max(
+                    self.paused_until, time.monotonic() + retry_after
+                )
+            self.condition.notify_all()
+
+
+class CircuitBreaker:
+    """Stops requests to a host after failure_threshold consecutive failed requests
+
+    After reset_timeout seconds, one trial request is let through (half open). The
+    circuit closes again if it succeeds and stays open for another reset_timeout if not.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if self.trial_in_flight or self.seconds_until_half_open() > 0:
+                return False
+            self.trial_in_flight = True
+            return True
+
+    def seconds_until_half_open(self) -> float:
+        if self.opened_at is None:
+            return 0
+        return max(0, self.opened_at + self.reset_timeout - time.monotonic())
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial_in_flight or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.warning(
+                        "Opening circuit after %s failed requests", self.failures
+                    )
+                self.opened_at = time.monotonic()
+            self.trial_in_flight = False
+
+
+class HttpClient:
+    """HTTP client shared by the API lookups, with per-host rate adaptation
+
+    Each host gets its own HostLimiter and CircuitBreaker. Connection errors, timeouts
+    and RETRY_STATUS_CODES responses are retried up to max_retries times with
+    exponential backoff and full jitter, waiting at least as long as the response's
+    Retry-After header asks. Responses with other statuses are returned as is.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 4,
+        max_retries: int = 5,
+        timeout: float = 60,
+        backoff: float = 0.5,
+        max_backoff: float = 60,
+        failure_threshold: int = 10,
+        reset_timeout: float = 30,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.session = create_session(pool_size=max_concurrency)
+        self.limiters: dict[str, HostLimiter] = {}
+        self.breakers: dict[str, CircuitBreaker] = {}
+        self.lock = threading.Lock()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    def host_state(self, url: str) -> tuple[HostLimiter, CircuitBreaker]:
+        host = urlparse(url).netloc
+        with self.lock:
+            if host not in self.limiters:
+                self.limiters[host] = HostLimiter(self.max_concurrency)
+                self.breakers[host] = CircuitBreaker(
+                    self.failure_threshold, self.reset_timeout
+                )
+            return self.limiters[host], self.breakers[host]
+
+    def wait_for_host(self, url: str):
+        """Sleep until the circuit of the host of url lets a trial request through"""
+        _, breaker = self.host_state(url)
+        wait = breaker.seconds_until_half_open()
+        if wait > 0:
+            logger.info("Waiting %.1f seconds for %s to recover", wait, url)
+            time.sleep(wait)
+
+    def backoff_delay(self, attempt: int, retry_after: float | None) -> float:
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2**attempt))
+        return max(delay, retry_after or 0)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Send a request, retrying transient failures
+
+        Raises RequestFailed if the request still fails after max_retries retries, or
+        if the circuit of the host is open.
+        """
+        limiter, breaker = self.host_state(url)
+        for attempt in range(self.max_retries + 1):
+            if not breaker.allow_request():
+                raise RequestFailed(f"Circuit for {url} is open")
+
+            limiter.acquire()
+            retry_after = None
+            try:
+                response = self.session.request(
+                    method, url, timeout=self.timeout, **kwargs
+                )
+            except requests.RequestException as e:
+                failure = f"{type(e).__name__}: {e}"
+            else:
+                if response.status_code not in RETRY_STATUS_CODES:
+                    limiter.release(throttled=False)
+                    breaker.record_success()
+                    return response
+                failure = f"status {response.status_code}"
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            limiter.release(throttled=True, retry_after=retry_after)
+            breaker.record_failure()
+
+            if attempt < self.max_retries:
+                delay = self.backoff_delay(attempt, retry_after)
+                logger.debug(
+                    "%s %s failed with %s, retrying in %.2f seconds",
+                    method,
+                    url,
+                    failure,
+                    delay,
+                )
+                time.sleep(delay)
+        raise RequestFailed(
+            f"{method} {url} failed after {self.max_retries + 1} attempts: {failure}"
+        )
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
@@ -1,33 +1,148 @@
-from collections import defaultdict
+from functools import partial
 import pandas as pd
-from nb_tokenizer import tokenize
+from create_idiom_dataset.concurrent_lookup import map_in_processes
+from create_idiom_dataset.idiom_trie import IdiomTrie
+from create_idiom_dataset.tokenization import get_token_lists
 
 
-def token_lists_to_idiom_completion_task(
-    tokenized_idioms: list[list[str]],
-) -> pd.DataFrame:
-    """Create idiom completion task from tokenized_idioms"""
-    first_last = defaultdict(list)
-    completion_task_data = {}
+def trie_completion_groups(
+    trie: IdiomTrie, completion_length: int = 1
+) -> list[tuple[int, list[int]]]:
+    """Group the nodes where idioms end by the node completion_length tokens above them
+
+    Returns (idiom start node, idiom end nodes) for every idiom start, with idiom
+    starts and ends in the order of the first idiom ending in them. Idioms shorter
+    than completion_length are left out.
+    """
+    node_parent = trie.node_parent
+    end_count = trie.end_count
+    end_first = trie.end_first
+
+    depth = [0] * len(trie)
+    groups: dict[int, list[int]] = {}
+    for node in range(1, len(trie)):
+        depth[node] = depth[node_parent[node]] + 1
+        if end_count[node] and depth[node] >= completion_length:
+            start = node
+            for _ in range(completion_length):
+                start = node_parent[start]
+            groups.setdefault(start, []).append(node)
+
+    for end_nodes in groups.values():
+        end_nodes.sort(key=end_first.__getitem__)
+    return sorted(groups.items(), key=lambda group: end_first[group[1][0]])
+
 
-    for e in tokenized_idioms:
-        first_words = " ".join(e[:-1])
-        last_word = e[-1]
-        first_last[first_words].append(last_word)
+def completion_groups_to_idiom_completion_task(
+    trie: IdiomTrie,
+    groups: list[tuple[int, list[int]]],
+    num_idioms: int | None = None,
+) -> pd.DataFrame:
+    """Create idiom completion task from trie_completion_groups output
 
-    completion_task_data["idiom_start"] = first_last.keys()
-    completion_task_data["accepted_completions"] = first_last.values()
+    If num_idioms is given, only idioms first inserted among the first num_idioms
+    token lists of the trie are included.
+    """
+    completion_task_data = {"idiom_start": [], "accepted_completions": []}
+    for start, end_nodes in groups:
+        if num_idioms is not None:
+            end_nodes = [e for e in end_nodes if trie.end_first[e] < num_idioms]
+            if not end_nodes:
+                continue
+        completion_task_data["idiom_start"].append(" ".join(trie.path(start)))
+        completion_task_data["accepted_completions"].append(
+            [
+                " ".join(trie.path(end, start))
+                for end in end_nodes
+                for _ in range(trie.end_count[end])
+            ]
+        )
     return pd.DataFrame(completion_task_data)
 
 
-def idiom_df_to_idiom_completion_task(idiom_df: pd.DataFrame) -> pd.DataFrame:
+def token_lists_to_idiom_completion_task(
+    tokenized_idioms: list[list[str]], completion_length: int = 1
+) -> pd.DataFrame:
+    """Create idiom completion task from tokenized_idioms
+
+    The last completion_length tokens of each idiom are its completion, and the
+    other tokens its start.
+    """
+    trie = IdiomTrie.from_token_lists(tokenized_idioms)
+    return completion_groups_to_idiom_completion_task(
+        trie, trie_completion_groups(trie, completion_length)
+    )
+
+
+def idiom_df_to_idiom_completion_task(
+    idiom_df: pd.DataFrame, completion_length: int = 1
+) -> pd.DataFrame:
     """Create idiom completion task from idiom_df"""
 
     dfs = []
     for language, df_ in idiom_df.groupby("language"):
-        tokenized_idioms = [tokenize(e) for e in df_.idiom]
-        completion_task_df = token_lists_to_idiom_completion_task(tokenized_idioms)
+        tokenized_idioms = get_token_lists(df_)
+        completion_task_df = token_lists_to_idiom_completion_task(
+            tokenized_idioms, completion_length=completion_length
+        )
         completion_task_df["language"] = language
         dfs.append(completion_task_df)
 
     return pd.concat(dfs)
+
+
+def language_completion_tasks(
+    language_df: pd.DataFrame, completion_length: int = 1
+) -> tuple[pd.DataFrame | None, pd.DataFrame]:
+    """Create the original and original + translated completion tasks of one language
+
+    language_df holds the idioms of one language with original idioms first, marked
+    in its "original" column. The original task is None if there are no originals.
+    """
+    language = language_df.language.iloc[0]
+    trie = IdiomTrie.from_token_lists(get_token_lists(language_df))
+    groups = trie_completion_groups(trie, completion_length)
+
+    completion_task_df = None
+    if language_df.original.any():
+        completion_task_df = completion_groups_to_idiom_completion_task(
+            trie, groups, num_idioms=int(language_df.original.sum())
+        )
+        completion_task_df["language"] = language
+
+    all_completion_task_df = completion_groups_to_idiom_completion_task(trie, groups)
+    all_completion_task_df["language"] = language
+    return completion_task_df, all_completion_task_df
+
+
+def idiom_dfs_to_idiom_completion_tasks(
+    idiom_df: pd.DataFrame,
+    translated_idiom_df: pd.DataFrame,
+    completion_length: int = 1,
+    num_processes: int = 1,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Create the original and the original + translated idiom completion tasks
+
+    Each language gets one trie of its original idioms followed by its translated
+    idioms, and both tasks are read from the same idiom start groups of that trie.
+    With num_processes > 1, languages are processed in parallel; the output is the
+    same either way.
+    """
+    columns = ["idiom", "language", "tokens"]
+    all_df = pd.concat(
+        [
+            idiom_df[columns].assign(original=True),
+            translated_idiom_df[columns].assign(original=False),
+        ]
+    ).drop_duplicates(subset=columns)
+
+    language_dfs = [df_ for _, df_ in all_df.groupby("language")]
+    results = map_in_processes(
+        partial(language_completion_tasks, completion_length=completion_length),
+        language_dfs,
+        num_processes=num_processes,
+    )
+
+    dfs = [df for df, _ in results if df is not None]
+    all_dfs = [all_df for _, all_df in results]
+    return pd.concat(dfs), pd.concat(all_dfs)
@@ -1,64 +1,139 @@
-from collections import defaultdict
+from __future__ import annotations
+
 from pathlib import Path
-from nb_tokenizer import tokenize
-import pandas as pd
+from typing import TYPE_CHECKING, TextIO
+from create_idiom_dataset.idiom_trie import IdiomTrie
 import json
 import logging
 
-logger = logging.getLogger(__name__)
+if TYPE_CHECKING:
+    import pandas as pd
 
+logger = logging.getLogger(__name__)
 
-def create_sequence_graph(tokenized_idioms: list[list[str]]) -> dict[str, str]:
-    sequence_graph = defaultdict(dict)
 
-    for sentence in tokenized_idioms:
-        prev_dict = sequence_graph
-        for i, word in enumerate(sentence):
-            if word not in prev_dict:
-                prev_dict[word] = {}
-            prev_dict = prev_dict[word]
-    return sequence_graph
+def create_sequence_graph(tokenized_idioms: list[list[str]]) -> dict[str, dict]:
+    return IdiomTrie.from_token_lists(tokenized_idioms).to_dict()
 
 
 def flatten_sequence_graph(d: dict) -> dict | str:
     """Flattens sequence graph by concatenating sequences of parent + single child node tokens."""
-    if d == {}:
+    if not d:
         return ""
 
-    flat_dict = {}
-    for k, v in d.items():
-        flat_v = flatten_sequence_graph(v)
-        if type(flat_v) is str:
-            if flat_v:
-                flat_dict[f"{k} {flat_v}"] = ""
-            else:
+    # Depth first traversal with an explicit stack of
+    # (iterator over the remaining children, flattened node, key of node in parent)
+    stack = [(iter(d.items()), {}, None)]
+    while True:
+        children, flat_dict, key = stack[-1]
+        for k, v in children:
+            if not v:
                 flat_dict[k] = ""
-        elif len(flat_v) == 1:
-            flat_v_k = list(flat_v.keys())[0]
-            flat_dict[f"{k} {flat_v_k}"] = flat_v[flat_v_k]
+            else:
+                stack.append((iter(v.items()), {}, k))
+                break
         else:
-            flat_dict[k] = flat_v
-    return flat_dict
+            stack.pop()
+            if not stack:
+                return flat_dict
+            parent_flat_dict = stack[-1][1]
+            if len(flat_dict) == 1:
+                flat_k, flat_v = next(iter(flat_dict.items()))
+                parent_flat_dict[f"{key} {flat_k}"] = flat_v
+            else:
+                parent_flat_dict[key] = flat_dict
+
+
+def iter_graph_entries(trie: IdiomTrie, node: int, flat: bool):
+    """Yield (key, child node) for the children of node in the sequence graph
+
+    In the flat sequence graph, chains of single child nodes are merged into one key.
+    """
+    child_offsets = trie.child_offsets
+    child_nodes = trie.child_nodes
+    for i in range(child_offsets[node], child_offsets[node + 1]):
+        child = child_nodes[i]
+        key = trie.token(child)
+        if flat:
+            while child_offsets[child + 1] - child_offsets[child] == 1:
+                child = child_nodes[child_offsets[child]]
+                key += " " + trie.token(child)
+        yield key, child
+
+
+def write_graph_json(trie: IdiomTrie, f: TextIO, flat: bool = False, indent: int = 4):
+    """Stream the (flat) sequence graph of trie to f as json
+
+    The output is identical to json.dump(graph, f, ensure_ascii=False, indent=indent)
+    with graph = trie.to_dict() (or trie.flatten() if flat), without building graph.
+    """
+    leaf = '""' if flat else "{}"
+    if trie.num_children(0) == 0:
+        f.write(leaf)
+        return
+
+    chunks = ["{"]
+    stack = [iter_graph_entries(trie, 0, flat)]
+    first = [True]
+    while stack:
+        entry = next(stack[-1], None)
+        if entry is None:
+            stack.pop()
+            first.pop()
+            chunks.append("\n" + " " * (indent * len(stack)) + "}")
+            continue
+
+        key, child = entry
+        chunks.append(
+            ("\n" if first[-1] else ",\n")
+            + " " * (indent * len(stack))
+            + json.dumps(key, ensure_ascii=False)
+            + ": "
+        )
+        first[-1] = False
+        if trie.num_children(child) == 0:
+            chunks.append(leaf)
+        else:
+            chunks.append("{")
+            stack.append(iter_graph_entries(trie, child, flat))
+            first.append(True)
+
+        if len(chunks) >= 4096:
+            f.write("".join(chunks))
+            chunks.clear()
+    f.write("".join(chunks))
 
 
 def write_sequence_graphs(
-    graph_dir: Path, idiom_df: pd.DataFrame, filename_prefix: str
+    graph_dir: Path,
+    idiom_df: pd.DataFrame,
+    filename_prefix: str,
+    binary: bool = False,
 ):
-    tokenized_idioms = [tokenize(e) for e in idiom_df.idiom]
+    """Write the sequence graph and flat sequence graph of idiom_df as json
+
+    If binary is set, the trie is also saved in the binary format of IdiomTrie.save.
+    """
+    from create_idiom_dataset.tokenization import get_token_lists
+
+    tokenized_idioms = get_token_lists(idiom_df)
 
     logger.info("Number of %s idioms: %s", filename_prefix, len(tokenized_idioms))
 
-    sequence_graph = create_sequence_graph(tokenized_idioms=tokenized_idioms)
-    flat_sequence_graph = flatten_sequence_graph(sequence_graph)
+    trie = IdiomTrie.from_token_lists(tokenized_idioms)
 
     logger.info(
-        "Number of sequence graphs (i.e unique idiom starts): %s", len(sequence_graph)
+        "Number of sequence graphs (i.e unique idiom starts): %s",
+        trie.num_children(0),
     )
 
     with open(graph_dir / f"{filename_prefix}_idioms_sequence_graph.json", "w+") as f:
-        json.dump(sequence_graph, f, ensure_ascii=False, indent=4)
+        write_graph_json(trie, f)
 
     with open(
         graph_dir / f"{filename_prefix}_idioms_flat_sequence_graph.json", "w+"
     ) as f:
-        json.dump(flat_sequence_graph, f, ensure_ascii=False, indent=4)
+        write_graph_json(trie, f, flat=True)
+
+    if binary:
+        trie.save(graph_dir / f"{filename_prefix}_idioms_sequence_graph.trie")
@@ -0,0 +1,238 @@
+import mmap
+import struct
+import sys
+from array import array
+from collections.abc import Iterable
+from pathlib import Path
+
+TRIE_FILE_MAGIC = b"IDTRIE01"
+# Number of tokens, byte length of the vocabulary, number of nodes, number of idioms
+TRIE_FILE_HEADER = struct.Struct("<4Q")
+TRIE_FILE_ARRAYS = (
+    "node_token",
+    "node_parent",
+    "end_count",
+    "end_first",
+    "child_offsets",
+    "child_nodes",
+)
+
+
+class IdiomTrie:
+    """Compact prefix tree of tokenized idioms
+
+    Tokens are interned to integer ids, and nodes are integer ids with the root as
+    node 0. Per node, the arrays hold the token id of the edge into the node, the
+    parent node, how many idioms end in the node and the index of the first idiom
+    ending there. Children are stored in CSR form: the children of node n are
+    child_nodes[child_offsets[n] : child_offsets[n + 1]], in the order they were
+    first inserted. A child always has a higher id than its parent.
+    """
+
+    __slots__ = (
+        "child_nodes",
+        "child_offsets",
+        "end_count",
+        "end_first",
+        "node_parent",
+        "node_token",
+        "num_idioms",
+        "token_ids",
+        "tokens",
+    )
+
+    def __init__(self):
+        self.tokens: list[str] = []
+        self.token_ids: dict[str, int] = {}
+        self.node_token = array("i", [-1])
+        self.node_parent = array("i", [-1])
+        self.end_count = array("i", [0])
+        self.end_first = array("i", [-1])
+        self.child_offsets = array("i", [0, 0])
+        self.child_nodes = array("i")
+        self.num_idioms = 0
+
+    @classmethod
+    def from_token_lists(cls, tokenized_idioms: Iterable[list[str]]) -> "IdiomTrie":
+        trie = cls()
+        token_ids = trie.token_ids
+        node_token = trie.node_token
+        node_parent = trie.node_parent
+        end_count = trie.end_count
+        end_first = trie.end_first
+
+        # Edges from (parent node, token id) to child node, only needed while building
+        edges: dict[int, int] = {}
+        idiom_index = -1
+        for idiom_index, sentence in enumerate(tokenized_idioms):
+            node = 0
+            for token in sentence:
+                token_id = token_ids.get(token)
+                if token_id is None:
+                    token_id = token_ids[token] = len(trie.tokens)
+                    trie.tokens.append(token)
+                edge = node << 32 | token_id
+                child = edges.get(edge)
+                if child is None:
+                    child = edges[edge] = len(node_token)
+                    node_token.append(token_id)
+                    node_parent.append(node)
+                    end_count.append(0)
+                    end_first.append(-1)
+                node = child
+            if node:
+                end_count[node] += 1
+                if end_first[node] < 0:
+                    end_first[node] = idiom_index
+        trie.num_idioms = idiom_index + 1
+        trie._build_child_table()
+        return trie
+
+    def _build_child_table(self):
+        """Build the CSR child table with a stable counting sort of nodes by parent"""
+        num_nodes = len(self.node_token)
+        offsets = array("i", bytes(4 * (num_nodes + 1)))
+        for node in range(1, num_nodes):
+            offsets[self.node_parent[node] + 1] += 1
+        for node in range(num_nodes):
+            offsets[node + 1] += offsets[node]
+
+        child_nodes = array("i", bytes(4 * (num_nodes - 1)))
+        next_slot = array("i", offsets)
+        for node in range(1, num_nodes):
+            parent = self.node_parent[node]
+            child_nodes[next_slot[parent]] = node
+            next_slot[parent] += 1
+
+        self.child_offsets = offsets
+        self.child_nodes = child_nodes
+
+    def __len__(self) -> int:
+        """Number of nodes, including the root"""
+        return len(self.node_token)
+
+    def token(self, node: int) -> str:
+        return self.tokens[self.node_token[node]]
+
+    def children(self, node: int) -> array:
+        return self.child_nodes[self.child_offsets[node] : self.child_offsets[node + 1]]
+
+    def path(self, node: int, ancestor: int = 0) -> list[str]:
+        """Tokens on the path from ancestor (exclusive) down to node"""
+        tokens = []
+        while node != ancestor:
+            tokens.append(self.tokens[self.node_token[node]])
+            node = self.node_parent[node]
+        tokens.reverse()
+        return tokens
+
+    def num_children(self, node: int) -> int:
+        return self.child_offsets[node + 1] - self.child_offsets[node]
+
+    def save(self, path: Path):
+        """Save in a packed binary format that load can memory map
+
+        The file holds TRIE_FILE_MAGIC, TRIE_FILE_HEADER, the newline separated utf-8
+        vocabulary padded to a multiple of 4 bytes, and the TRIE_FILE_ARRAYS as
+        little-endian int32 arrays.
+        """
+        vocabulary = "\n".join(self.tokens).encode()
+        with open(path, "wb") as f:
+            f.write(TRIE_FILE_MAGIC)
+            f.write(
+                TRIE_FILE_HEADER.pack(
+                    len(self.tokens), len(vocabulary), len(self), self.num_idioms
+                )
+            )
+            f.write(vocabulary + bytes(-len(vocabulary) % 4))
+            for name in TRIE_FILE_ARRAYS:
+                values = array("i", getattr(self, name))
+                if sys.byteorder != "little":
+                    values.byteswap()
+                f.write(values.tobytes())
+
+    @classmethod
+    def load(cls, path: Path, use_mmap: bool = True) -> "IdiomTrie":
+        """Load a trie written by save
+
+        With use_mmap, the node and child arrays are read only views of the memory
+        mapped file instead of copies.
+        """
+        with open(path, "rb") as f:
+            if use_mmap and sys.byteorder == "little":
+                buffer = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+            else:
+                buffer = memoryview(f.read())
+
+        if buffer[: len(TRIE_FILE_MAGIC)] != TRIE_FILE_MAGIC:
+            raise ValueError(f"{path} is not an idiom trie file")
+        offset = len(TRIE_FILE_MAGIC)
+        num_tokens, vocabulary_length, num_nodes, num_idioms = (
+            TRIE_FILE_HEADER.unpack_from(buffer, offset)
+        )
+        offset += TRIE_FILE_HEADER.size
+
+        trie = cls()
+        vocabulary = bytes(buffer[offset : offset + vocabulary_length]).decode()
+        trie.tokens = vocabulary.split("\n") if num_tokens else []
+        trie.token_ids = {token: i for i, token in enumerate(trie.tokens)}
+        trie.num_idioms = num_idioms
+        offset += vocabulary_length + (-vocabulary_length % 4)
+
+        for name in TRIE_FILE_ARRAYS:
+            length = {"child_offsets": num_nodes + 1, "child_nodes": num_nodes - 1}
+            size = 4 * length.get(name, num_nodes)
+            values = buffer[offset : offset + size]
+            if isinstance(values.obj, mmap.mmap):
+                values = values.cast("i")
+            else:
+                values = array("i", bytes(values))
+                if sys.byteorder != "little":
+                    values.byteswap()
+            setattr(trie, name, values)
+            offset += size
+        return trie
+
+    def to_dict(self) -> dict:
+        """Convert to nested dicts from token to subtree (the create_sequence_graph format)"""
+        node_dicts = [{}]
+        tokens = self.tokens
+        node_token = self.node_token
+        node_parent = self.node_parent
+        # Children have higher ids than their parents, and siblings are in insertion order
+        for node in range(1, len(node_token)):
+            node_dict = {}
+            node_dicts[node_parent[node]][tokens[node_token[node]]] = node_dict
+            node_dicts.append(node_dict)
+        return node_dicts[0]
+
+    def flatten(self) -> dict | str:
+        """Convert to the flatten_sequence_graph format, where chains of single child
+        nodes are merged into one key of space separated tokens"""
+        tokens = self.tokens
+        node_token = self.node_token
+        child_offsets = self.child_offsets
+        child_nodes = self.child_nodes
+        flat_nodes: list[dict | str | None] = [None] * len(node_token)
+
+        # Children have higher ids than their parents, so they are flattened first
+        for node in range(len(node_token) - 1, -1, -1):
+            start, end = child_offsets[node], child_offsets[node + 1]
+            if start == end:
+                flat_nodes[node] = ""
+                continue
+            flat_dict = {}
+            for i in range(start, end):
+                child = child_nodes[i]
+                token = tokens[node_token[child]]
+                flat_child = flat_nodes[child]
+                flat_nodes[child] = None
+                if not flat_child:
+                    flat_dict[token] = ""
+                elif len(flat_child) == 1:
+                    flat_k, flat_v = next(iter(flat_child.items()))
+                    flat_dict[f"{token} {flat_k}"] = flat_v
+                else:
+                    flat_dict[token] = flat_child
+            flat_nodes[node] = flat_dict
+        return flat_nodes[0]
@@ -0,0 +1,287 @@
+import logging
+import zlib
+import numpy as np
+import pandas as pd
+from create_idiom_dataset.corpus_ngrams import phrase_words
+
+logger = logging.getLogger(__name__)
+
+# Prime modulus of the MinHash permutations. Hashes and permutation coefficients are
+# below it, so a * hash + b fits in 64 bits
+PRIME = (1 << 31) - 1
+
+# Similarities estimated from 64 MinHash values are off by about 0.06, so pairs
+# estimated up to this much below the threshold are checked exactly
+ESTIMATE_MARGIN = 0.1
+
+# Articles and the infinitive marker, which may be added to or dropped from an idiom
+FUNCTION_WORDS = frozenset(
+    {"en", "ei", "et", "ein", "eit", "den", "det", "de", "dei", "å"}
+)
+
+# Shingle similarity above which two words are taken as spellings of the same word
+WORD_SIMILARITY = 0.4
+
+
+def idiom_shingles(idiom: str, size: int = 3) -> frozenset[str]:
+    """Character n-grams of the lowercased words of idiom, each word padded with spaces
+
+    Shingles are taken within words, so they do not depend on word order or
+    punctuation, and an OCR slip or an added article only changes a few of them.
+    """
+    shingles = set()
+    for word in phrase_words(idiom):
+        padded = f" {word} "
+        shingles.update(
+            padded[i : i + size] for i in range(max(1, len(padded) - size + 1))
+        )
+    return frozenset(shingles)
+
+
+def jaccard_similarity(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def similar_words(a: str, b: str) -> bool:
+    """Whether a and b are the same word up to an OCR slip, a split or an ending
+
+    Words are similar if the shorter one, of at least two letters, starts or ends
+    the longer one, or if their shingle sets are similar.
+    """
+    shorter, longer = sorted((a, b), key=len)
+    if len(shorter) >= 2 and (longer.startswith(shorter) or longer.endswith(shorter)):
+        return True
+    return jaccard_similarity(idiom_shingles(a), idiom_shingles(b)) >= WORD_SIMILARITY
+
+
+def same_words(words_a: frozenset[str], words_b: frozenset[str]) -> bool:
+    """Whether every word in one word set, except function words, has a similar word in the other
+
+    Idioms that differ by a whole word, like an added negation or verb, can have
+    similar shingle sets but a different meaning.
+    """
+    return all(
+        any(similar_words(word, other_word) for other_word in other_words)
+        for words, other_words in [(words_a, words_b), (words_b, words_a)]
+        for word in words - other_words - FUNCTION_WORDS
+    )
+
+
+class MinHashLsh:
+    """MinHash signatures of shingle sets, bucketed into LSH bands
+
+    Two sets with Jaccard similarity s share a bucket in at least one of num_bands
+    bands of rows_per_band hashes with probability 1 - (1 - s ** rows_per_band) ** num_bands,
+    so with the defaults almost all pairs above 0.7 similarity become candidates,
+    and few pairs below 0.3.
+    """
+
+    def __init__(
+        self,
+        num_bands: int = 16,
+        rows_per_band: int = 4,
+        seed: int = 0,
+        max_bucket_size: int = 50,
+    ):
+        self.num_bands = num_bands
+        self.rows_per_band = rows_per_band
+        self.max_bucket_size = max_bucket_size
+        num_hashes = num_bands * rows_per_band
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, PRIME, size=num_hashes, dtype=np.uint64)
+        self.b = rng.integers(0, PRIME, size=num_hashes, dtype=np.uint64)
+
+    def signatures(self, shingle_sets: list[frozenset[str]]) -> np.ndarray:
+        """MinHash signature of each shingle set, as one row per set
+
+        The signatures of all sets are computed in one vectorized step over all
+        their shingles. Empty sets get a signature of PRIME in every column.
+        """
+        sizes = np.array([len(shingles) for shingles in shingle_sets], dtype=np.int64)
+        hashes = np.fromiter(
+            (
+                zlib.crc32(shingle.encode()) % PRIME
+                for shingles in shingle_sets
+                for shingle in shingles
+            ),
+            dtype=np.uint64,
+            count=int(sizes.sum()),
+        )
+        permuted = (hashes[:, None] * self.a + self.b) % np.uint64(PRIME)
+
+        signatures = np.full((len(shingle_sets), len(self.a)), PRIME, dtype=np.uint64)
+        non_empty = sizes > 0
+        if non_empty.any():
+            starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])[non_empty]
+            signatures[non_empty] = np.minimum.reduceat(permuted, starts, axis=0)
+        return signatures
+
+    def candidate_pairs(self, signatures: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Rows i and j, with i < j, of the candidate pairs of similar rows
+
+        Rows sharing a bucket in a band are paired with every other row of the
+        bucket, so that a row that only shares the bucket by chance does not hide
+        the similar pairs in it. In buckets of more than max_bucket_size rows, each
+        row is only paired with the next row of the bucket, which bounds the number
+        of pairs.
+        """
+        num_rows = len(signatures)
+        pair_ids = []
+        for band in range(self.num_bands):
+            band_hashes = signatures[
+                :, band * self.rows_per_band : (band + 1) * self.rows_per_band
+            ]
+            # Combine the hashes of the band into one bucket key (overflow wraps)
+            buckets = np.zeros(num_rows, dtype=np.uint64)
+            for column in band_hashes.T:
+                buckets = buckets * np.uint64(PRIME) + column
+            # Rows of a bucket are adjacent and ascending in sorted order
+            rows = np.argsort(buckets, kind="stable")
+            sorted_buckets = buckets[rows]
+            _, bucket_sizes = np.unique(sorted_buckets, return_counts=True)
+            sizes = np.repeat(bucket_sizes, bucket_sizes)
+            # Pair the rows offset positions apart within their bucket
+            for offset in range(1, min(self.max_bucket_size, num_rows)):
+                same_bucket = sorted_buckets[offset:] == sorted_buckets[:-offset]
+                if offset > 1:
+                    same_bucket &= sizes[offset:] <= self.max_bucket_size
+                if not same_bucket.any():
+                    break
+                pair_ids.append(
+                    rows[:-offset][same_bucket] * num_rows + rows[offset:][same_bucket]
+                )
+        if not pair_ids:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        pair_ids = np.unique(np.concatenate(pair_ids))
+        return pair_ids // num_rows, pair_ids % num_rows
+
+    @staticmethod
+    def similarities(
+        signatures: np.ndarray, rows_i: np.ndarray, rows_j: np.ndarray
+    ) -> np.ndarray:
+        """Jaccard similarity of the sets of rows_i and rows_j, estimated from their signatures"""
+        return (signatures[rows_i] == signatures[rows_j]).mean(axis=1)
+
+
+def cluster_near_duplicates(
+    idioms: list[str], threshold: float = 0.7, lsh: MinHashLsh | None = None
+) -> list[int]:
+    """Cluster label of each idiom, the position of the first idiom in its cluster
+
+    Idioms whose shingle sets have a Jaccard similarity of at least threshold, and
+    that have the same words up to function words and spelling, are in the same
+    cluster, also through chains of such idioms. Candidate pairs are found
+    with MinHash LSH, and the pairs whose similarity estimated from their
+    signatures is close to or above threshold are checked with their exact
+    similarity.
+    """
+    lsh = lsh or MinHashLsh()
+    shingle_sets = [idiom_shingles(idiom) for idiom in idioms]
+    word_sets = [frozenset(phrase_words(idiom)) for idiom in idioms]
+    signatures = lsh.signatures(shingle_sets)
+    rows_i, rows_j = lsh.candidate_pairs(signatures)
+    estimated = (
+        lsh.similarities(signatures, rows_i, rows_j) >= threshold - ESTIMATE_MARGIN
+    )
+
+    parents = list(range(len(idioms)))
+
+    def find(i: int) -> int:
+        while parents[i] != i:
+            parents[i] = parents[parents[i]]
+            i = parents[i]
+        return i
+
+    for i, j in zip(rows_i[estimated].tolist(), rows_j[estimated].tolist()):
+        if jaccard_similarity(
+            shingle_sets[i], shingle_sets[j]
+        ) < threshold or not same_words(word_sets[i], word_sets[j]):
+            continue
+        root_i, root_j = find(i), find(j)
+        if root_i != root_j:
+            parents[max(root_i, root_j)] = min(root_i, root_j)
+    return [find(i) for i in range(len(idioms))]
+
+
+def cluster_idiom_df(
+    idiom_df: pd.DataFrame, threshold: float = 0.7, seed: int = 0
+) -> pd.DataFrame:
+    """Cluster the near-duplicate idioms of each language in idiom_df
+
+    Returns one row per unique idiom and language, with its cluster_id, the
+    canonical_idiom of its cluster and the cluster_size. The canonical idiom is the
+    member with the most rows in idiom_df, then the shortest one, then the first
+    alphabetically. Clusters are numbered per language in the order of their
+    canonical idioms.
+    """
+    lsh = MinHashLsh(seed=seed)
+    cluster_dfs = []
+    for language, df_ in idiom_df.dropna(subset="idiom").groupby("language", sort=True):
+        counts = df_.idiom.value_counts(sort=False)
+        cluster_df = pd.DataFrame(
+            {
+                "idiom": counts.index,
+                "language": language,
+                "num_rows": counts.to_numpy(),
+                "label": cluster_near_duplicates(
+                    counts.index.tolist(), threshold=threshold, lsh=lsh
+                ),
+            }
+        )
+        cluster_df["length"] = cluster_df.idiom.str.len()
+        canonical = (
+            cluster_df.sort_values(
+                ["num_rows", "length", "idiom"], ascending=[False, True, True]
+            )
+            .drop_duplicates("label")
+            .set_index("label")
+            .idiom
+        )
+        cluster_df["canonical_idiom"] = cluster_df.label.map(canonical)
+        cluster_numbers = {
+            label: number for number, label in enumerate(canonical.sort_values().index)
+        }
+        cluster_df["cluster_id"] = [
+            f"{language}-{cluster_numbers[label]}" for label in cluster_df.label
+        ]
+        cluster_df["cluster_size"] = cluster_df.groupby("label").idiom.transform("size")
+        cluster_dfs.append(
+            cluster_df[
+                ["idiom", "language", "cluster_id", "canonical_idiom", "cluster_size"]
+            ]
+        )
+    return pd.concat(cluster_dfs, ignore_index=True).sort_values(
+        ["language", "canonical_idiom", "idiom"], ignore_index=True
+    )
+
+
+def dedup_report(cluster_df: pd.DataFrame, max_clusters: int = 50) -> dict:
+    """Summary of the near-duplicate clusters of each language in cluster_df
+
+    Lists the number of idioms and clusters and the largest clusters of each
+    language, with their canonical idiom and variants.
+    """
+    report = {}
+    for language, df_ in cluster_df.groupby("language", sort=True):
+        clusters = df_[df_.cluster_size > 1].groupby("cluster_id", sort=False)
+        largest = sorted(
+            clusters, key=lambda e: (-len(e[1]), e[1].canonical_idiom.iat[0])
+        )[:max_clusters]
+        report[language] = {
+            "num_idioms": len(df_),
+            "num_clusters": df_.cluster_id.nunique(),
+            "num_clustered_idioms": int((df_.cluster_size > 1).sum()),
+            "largest_clusters": [
+                {
+                    "cluster_id": cluster_id,
+                    "canonical_idiom": members.canonical_idiom.iat[0],
+                    "variants": sorted(
+                        members.idiom[members.idiom != members.canonical_idiom]
+                    ),
+                }
+                for cluster_id, members in largest
+            ],
+        }
+    return report
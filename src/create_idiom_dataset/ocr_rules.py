@@ -0,0 +1,88 @@
+import hashlib
+import json
+import re
+from functools import lru_cache
+from pathlib import Path
+
+DEFAULT_OCR_RULES_FILE = Path(__file__).parent / "ocr_rules.json"
+
+
+class OcrRules:
+    """OCR corrections compiled to one dictionary lookup and one regular expression
+
+    A rules file is a json object with
+    - "version": version of the rule set
+    - "exact": mapping from OCR'd token to corrected token
+    - "rewrites": list of rules, each with "prefix", "suffix" and/or "infix" lists of
+      trigger strings and a "replace" string that is replaced by "with" everywhere in
+      the token if any trigger matches
+
+    Exact replacements take precedence, then the first rewrite rule with a matching
+    trigger is applied. Corrections are memoized per distinct token. A rewrite rule
+    without "replace" and "with", or without any non-empty trigger (which would
+    match every token), raises ValueError.
+    """
+
+    def __init__(self, exact: dict[str, str], rewrites: list[dict], version=None):
+        for i, rule in enumerate(rewrites):
+            for key in ["replace", "with"]:
+                if key not in rule:
+                    raise ValueError(f"Rewrite rule {i} has no {key!r} string")
+            triggers = rule.get("prefix", []) + rule.get("suffix", [])
+            triggers += rule.get("infix", [])
+            if not triggers or not all(triggers):
+                raise ValueError(
+                    f"Rewrite rule {i} ({rule['replace']!r} with {rule['with']!r}) "
+                    "needs non-empty prefix, suffix or infix triggers"
+                )
+        self.exact = dict(exact)
+        self.rewrites = [(rule["replace"], rule["with"]) for rule in rewrites]
+        self.version = version
+        self.fingerprint = hashlib.sha256(
+            json.dumps([version, exact, rewrites], sort_keys=True).encode()
+        ).hexdigest()
+
+        alternatives = []
+        for i, rule in enumerate(rewrites):
+            triggers = [re.escape(e) for e in rule.get("prefix", [])]
+            triggers += [f".*{re.escape(e)}\\Z" for e in rule.get("suffix", [])]
+            triggers += [f".*{re.escape(e)}" for e in rule.get("infix", [])]
+            alternatives.append(f"(?={'|'.join(triggers)})(?P<rule{i}>)")
+        self._rewrite_pattern = (
+            re.compile("|".join(alternatives), re.DOTALL) if alternatives else None
+        )
+        self._cache = {}
+
+    @classmethod
+    def from_file(cls, path: Path) -> "OcrRules":
+        rules = json.loads(Path(path).read_text())
+        try:
+            return cls(
+                exact=rules.get("exact", {}),
+                rewrites=rules.get("rewrites", []),
+                version=rules.get("version"),
+            )
+        except ValueError as e:
+            raise ValueError(f"Invalid OCR rules file {path}: {e}") from e
+
+    def clean(self, token: str) -> str:
+        cleaned = self._cache.get(token)
+        if cleaned is None:
+            cleaned = self._cache[token] = self._clean(token)
+        return cleaned
+
+    def _clean(self, token: str) -> str:
+        if token in self.exact:
+            return self.exact[token]
+        if self._rewrite_pattern is None:
+            return token
+        match = self._rewrite_pattern.match(token)
+        if match is None:
+            return token
+        old, new = self.rewrites[int(match.lastgroup.removeprefix("rule"))]
+        return token.replace(old, new)
+
+
+@lru_cache
+def load_ocr_rules(path: Path = DEFAULT_OCR_RULES_FILE) -> OcrRules:
+    return OcrRules.from_file(path)
@@ -0,0 +1,591 @@
+from functools import partial
+from pathlib import Path
+import logging
+from create_idiom_dataset.concurrent_lookup import map_in_processes
+from create_idiom_dataset.frequency_curation import (
+    FrequencyBackend,
+    LocalCorpusBackend,
+    NbCatalogBackend,
+    QueuedFrequencyBackend,
+    get_idiom_frequencies,
+)
+from create_idiom_dataset.stages import Stage
+from create_idiom_dataset.response_cache import ResponseCache
+from create_idiom_dataset.http_client import HttpClient
+from create_idiom_dataset.work_queue import WorkQueue
+from create_idiom_dataset.ocr_rules import load_ocr_rules
+from create_idiom_dataset.idiom_graphs import write_sequence_graphs
+from create_idiom_dataset.dataset_export import (
+    COMPLETION_TASK_CONFIGS,
+    completion_task_files,
+    datasets_readme_info,
+    write_completion_task,
+    write_table,
+)
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Modules only needed by some stages are imported in the functions running those
+# stages, so that up to date stages do not pay for their imports
+
+
+def open_response_cache(args) -> ResponseCache | None:
+    if args.no_cache:
+        return None
+    return ResponseCache(
+        args.cache_file,
+        ttl=args.cache_ttl_days * 24 * 60 * 60 if args.cache_ttl_days else None,
+        max_entries=args.cache_max_entries,
+    )
+
+
+def work_queue_settings(args) -> dict:
+    """Settings that workers joining a run look up idioms with"""
+    return {
+        "nb_catalog_url": args.nb_catalog_url,
+        "apertium_url": args.apertium_url,
+        "translation_batch_size": args.translation_batch_size,
+    }
+
+
+def open_work_queue(args) -> WorkQueue | None:
+    if args.work_queue is None:
+        return None
+    queue = WorkQueue(args.work_queue)
+    queue.start_run(work_queue_settings(args), clear=args.overwrite)
+    return queue
+
+
+def read_idiom_collection(args):
+    from create_idiom_dataset.read_idiom_collection import idiom_colletion_to_df
+
+    logger.info("Reading idiom collection")
+    dfs = []
+
+    for target_lang in args.languages:
+        lang_idiom_dir = args.idiom_collection_dir / target_lang
+        if not lang_idiom_dir.exists():
+            logger.error("Language directory %s does not exist", lang_idiom_dir)
+            exit(1)
+        logger.info("Reading idioms from %s", lang_idiom_dir)
+        book_cache_dir = None
+        if not args.no_book_cache:
+            # One cache directory per language, as each call removes the cache files
+            # that none of its books refer to
+            book_cache_dir = args.book_cache_dir / target_lang
+        idiom_df = idiom_colletion_to_df(
+            lang_idiom_dir,
+            special_chars=args.special_chars,
+            min_num_words=args.min_num_words,
+            ocr_rules=load_ocr_rules(args.ocr_rules_file),
+            num_processes=args.num_processes,
+            book_cache_dir=book_cache_dir,
+        )
+        idiom_df["language"] = target_lang
+        logger.debug("Number of idioms in %s: %s", target_lang, len(idiom_df))
+        dfs.append(idiom_df)
+
+    idiom_df = pd.concat(dfs)
+    logger.debug("Saving idioms to %s", args.collection_idioms_csv)
+    idiom_df.to_csv(args.collection_idioms_csv, index=False)
+
+
+def cluster_idioms(args):
+    import json
+    from create_idiom_dataset.near_duplicates import cluster_idiom_df, dedup_report
+
+    logger.info("Clustering near-duplicate idioms")
+    cluster_df = cluster_idiom_df(
+        pd.read_csv(args.collection_idioms_csv), threshold=args.cluster_threshold
+    )
+    cluster_df.to_csv(args.idiom_clusters_file, index=False)
+
+    report = dedup_report(cluster_df)
+    for language, language_report in report.items():
+        logger.info(
+            "%s: %s idioms in %s clusters",
+            language,
+            language_report["num_idioms"],
+            language_report["num_clusters"],
+        )
+    logger.debug("Writing near-duplicate report to %s", args.dedup_report)
+    with open(args.dedup_report, "w") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+def add_cluster_columns(args, idiom_df: pd.DataFrame) -> pd.DataFrame:
+    """Add the cluster_id and canonical_idiom of each idiom in idiom_df"""
+    cluster_df = pd.read_csv(args.idiom_clusters_file)
+    return idiom_df.merge(
+        cluster_df[["idiom", "language", "cluster_id", "canonical_idiom"]],
+        on=["idiom", "language"],
+        how="left",
+    )
+
+
+def init_frequency_df(
+    idioms: pd.Series, known_frequency_files: list[Path]
+) -> pd.DataFrame:
+    """Create a frequency dataframe for the unique idioms, with frequencies from
+    known_frequency_files filled in (the first file with a frequency for an idiom wins)"""
+    idiom_frequency_df = pd.DataFrame({"idiom": idioms.dropna().unique()})
+    idiom_frequency_df["frequency"] = None
+
+    for frequency_file in known_frequency_files:
+        if not frequency_file.exists():
+            continue
+        logger.debug("Reading existing frequencies from %s", frequency_file)
+        known_frequencies = (
+            pd.read_csv(frequency_file).dropna().drop_duplicates("idiom")
+        )
+        idiom_frequency_df["frequency"] = idiom_frequency_df.frequency.fillna(
+            idiom_frequency_df.idiom.map(known_frequencies.set_index("idiom").frequency)
+        )
+    return idiom_frequency_df
+
+
+def create_frequency_backend(
+    args,
+    cache: ResponseCache | None = None,
+    client: HttpClient | None = None,
+    queue: WorkQueue | None = None,
+) -> FrequencyBackend:
+    if args.frequency_backend == "local_corpus":
+        return LocalCorpusBackend(args.corpus_dir, num_processes=args.num_processes)
+    backend = NbCatalogBackend(
+        url=args.nb_catalog_url,
+        client=client,
+        cache=cache,
+        max_concurrent_requests=args.max_concurrent_requests,
+    )
+    if queue is not None:
+        return QueuedFrequencyBackend(queue, backend)
+    return backend
+
+
+def reuse_frequencies(args) -> bool:
+    """Whether frequencies of earlier runs are reused instead of looked up again
+
+    Local corpus counts are cheap to redo, and must not be mixed with NB catalog hits.
+    """
+    return not args.overwrite and args.frequency_backend == "nb_catalog"
+
+
+def get_and_filter_idiom_frequencies(
+    args,
+    cache: ResponseCache | None = None,
+    client: HttpClient | None = None,
+    queue: WorkQueue | None = None,
+):
+    idiom_df = pd.read_csv(args.collection_idioms_csv)
+    if args.cluster_idioms:
+        idiom_df = add_cluster_columns(args, idiom_df)
+    # With cluster_queries, only the canonical idiom of each cluster is looked up,
+    # and its frequency is used for every idiom in the cluster
+    query_idioms = idiom_df.canonical_idiom if args.cluster_queries else idiom_df.idiom
+
+    logger.info("Getting frequency of idioms from %s", args.frequency_backend)
+    idiom_frequency_df = init_frequency_df(
+        query_idioms, [args.idiom_freq_file] if reuse_frequencies(args) else []
+    )
+
+    idiom_frequency_df = get_idiom_frequencies(
+        idiom_frequency_df,
+        args.save_every,
+        args.idiom_freq_file,
+        backend=create_frequency_backend(args, cache=cache, client=client, queue=queue),
+        resume=reuse_frequencies(args),
+    )
+
+    idiom_df["frequency"] = query_idioms.map(
+        idiom_frequency_df.set_index("idiom").frequency
+    )
+
+    # Filter idioms based on frequency
+    idiom_df = idiom_df[idiom_df.frequency >= args.min_frequency]
+    idiom_df = idiom_df.reset_index(drop=True)
+
+    logger.info(
+        "Number of idioms with frequency >= %s: %s",
+        args.min_frequency,
+        len(idiom_df),
+    )
+
+    idiom_df.to_csv(args.filtered_idioms_file, index=False)
+
+
+def translate_idioms(
+    args,
+    cache: ResponseCache | None = None,
+    client: HttpClient | None = None,
+    queue: WorkQueue | None = None,
+):
+    from create_idiom_dataset.translation import (
+        ApertiumBackend,
+        QueuedTranslationBackend,
+        find_idioms_to_translate,
+        translate_idiom_df,
+    )
+
+    idiom_df = pd.read_csv(args.filtered_idioms_file)
+
+    translated_idioms_df = find_idioms_to_translate(idiom_df, args.languages)
+    if args.cluster_queries:
+        # Only idioms that are canonical in their source language are translated.
+        # Clusters are per language, so the missing languages are found from all rows
+        canonical = idiom_df[idiom_df.idiom == idiom_df.canonical_idiom]
+        is_canonical = pd.MultiIndex.from_frame(
+            translated_idioms_df[["source_idiom", "source_language"]]
+        ).isin(pd.MultiIndex.from_frame(canonical[["idiom", "language"]]))
+        translated_idioms_df = translated_idioms_df[is_canonical].reset_index(drop=True)
+    translated_idioms_df["idiom"] = None
+
+    if not args.overwrite and args.translated_idioms_file.exists():
+        logger.debug("Reading existing translations from translated idioms file")
+        translated_idioms_df = translated_idioms_df.drop(columns="idiom").merge(
+            pd.read_csv(args.translated_idioms_file)
+            .dropna(subset="idiom")
+            .drop_duplicates(["source_idiom", "source_language", "language"])[
+                ["source_idiom", "source_language", "language", "idiom"]
+            ],
+            on=["source_idiom", "source_language", "language"],
+            how="left",
+        )
+
+    backend = ApertiumBackend(
+        url=args.apertium_url,
+        client=client,
+        cache=cache,
+        batch_size=args.translation_batch_size,
+    )
+    if queue is not None:
+        backend = QueuedTranslationBackend(queue, backend)
+    translate_idiom_df(
+        translated_idioms_df,
+        save_every=args.save_every,
+        translated_idioms_file=args.translated_idioms_file,
+        resume=not args.overwrite,
+        backend=backend,
+    )
+
+
+def get_and_filter_translated_idiom_frequencies(
+    args,
+    cache: ResponseCache | None = None,
+    client: HttpClient | None = None,
+    queue: WorkQueue | None = None,
+):
+    from create_idiom_dataset.utils import normalize_and_filter_idiom_df
+
+    logger.info("Filtering and normalizing translated idioms")
+    # Idioms that could not be translated have no translation and are left out
+    translated_idioms_df = normalize_and_filter_idiom_df(
+        idiom_df=pd.read_csv(args.translated_idioms_file).dropna(subset="idiom"),
+        special_chars=args.special_chars,
+        min_num_words=args.min_num_words,
+        ocr_rules=load_ocr_rules(args.ocr_rules_file),
+    )
+
+    logger.info(
+        "Getting frequency of translated idioms from %s", args.frequency_backend
+    )
+    translated_idiom_frequency_df = init_frequency_df(
+        translated_idioms_df.idiom,
+        [args.translated_idiom_freq_file, args.idiom_freq_file]
+        if reuse_frequencies(args)
+        else [args.idiom_freq_file],
+    )
+    logger.debug("Number of unique idioms %s", len(translated_idiom_frequency_df))
+
+    translated_idiom_frequency_df = get_idiom_frequencies(
+        translated_idiom_frequency_df,
+        args.save_every,
+        args.translated_idiom_freq_file,
+        backend=create_frequency_backend(args, cache=cache, client=client, queue=queue),
+        resume=reuse_frequencies(args),
+    )
+
+    translated_idioms_df["frequency"] = translated_idioms_df.idiom.map(
+        translated_idiom_frequency_df.set_index("idiom").frequency
+    )
+
+    # Filter idioms based on frequency
+    translated_idioms_df = translated_idioms_df[
+        translated_idioms_df.frequency >= args.min_frequency
+    ]
+    translated_idioms_df = translated_idioms_df.reset_index(drop=True)
+
+    logger.info(
+        "Number of translated idioms with frequency >= %s: %s",
+        args.min_frequency,
+        len(translated_idioms_df),
+    )
+
+    translated_idioms_df.to_csv(args.filtered_translated_idioms_file, index=False)
+
+
+def read_filtered_idioms(args) -> tuple[pd.DataFrame, pd.DataFrame]:
+    from create_idiom_dataset.tokenization import add_token_column
+
+    idiom_df = add_token_column(pd.read_csv(args.filtered_idioms_file))
+    logger.info("Number of idioms: %s", len(idiom_df))
+    for lang, df_ in idiom_df.groupby("language"):
+        logger.info("Number of %s idioms: %s", lang, len(df_))
+
+    translated_idiom_df = add_token_column(
+        pd.read_csv(args.filtered_translated_idioms_file)
+    )
+    logger.info("Number of translated idioms: %s", len(translated_idiom_df))
+    for lang, df_ in translated_idiom_df.groupby("language"):
+        logger.info("Number of %s translated idioms: %s", lang, len(df_))
+    return idiom_df, translated_idiom_df
+
+
+def write_all_sequence_graphs(
+    idiom_df: pd.DataFrame,
+    translated_idiom_df: pd.DataFrame,
+    dataset_output_dir: Path,
+    binary: bool = False,
+    num_processes: int = 1,
+):
+    graph_dir = dataset_output_dir / "idiom_graphs"
+    graph_dir.mkdir(parents=True, exist_ok=True)
+
+    graph_dfs = {}
+    for lang, df_ in idiom_df.groupby("language"):
+        graph_dfs[f"{lang}"] = df_
+    for lang, df_ in translated_idiom_df.groupby("language"):
+        graph_dfs[f"translated_{lang}"] = df_
+
+    # Every graph is written to its own files, so start the largest ones first
+    filename_prefixes = sorted(graph_dfs, key=lambda e: len(graph_dfs[e]), reverse=True)
+    map_in_processes(
+        partial(write_sequence_graphs, graph_dir, binary=binary),
+        [graph_dfs[prefix] for prefix in filename_prefixes],
+        filename_prefixes,
+        num_processes=num_processes,
+    )
+
+
+def write_frequency_files(
+    idiom_df, translated_idiom_df, dataset_output_dir, formats=("jsonl",)
+):
+    freq_dir = dataset_output_dir / "idiom_freqs"
+    freq_dir.mkdir(exist_ok=True)
+    idiom_columns = ["idiom", "language", "frequency"]
+    if "cluster_id" in idiom_df:
+        idiom_columns.append("cluster_id")
+    write_table(
+        idiom_df[idiom_columns],
+        freq_dir / "idiom_frequencies.csv",
+        formats=formats,
+    )
+    write_table(
+        translated_idiom_df[
+            ["idiom", "language", "frequency", "source_idiom", "source_language"]
+        ],
+        freq_dir / "translated_idiom_frequencies.csv",
+        formats=formats,
+    )
+
+
+def write_idiom_completion_tasks(args):
+    from create_idiom_dataset.idiom_completion_task import (
+        idiom_dfs_to_idiom_completion_tasks,
+    )
+
+    idiom_df, translated_idiom_df = read_filtered_idioms(args)
+    args.dataset_output_dir.mkdir(parents=True, exist_ok=True)
+
+    logger.info("Creating original and original + translated idiom completion tasks")
+    idiom_comp_task_df, all_idiom_comp_task_df = idiom_dfs_to_idiom_completion_tasks(
+        idiom_df=idiom_df,
+        translated_idiom_df=translated_idiom_df,
+        completion_length=args.completion_length,
+        num_processes=args.num_processes,
+    )
+
+    write_completion_task(
+        idiom_comp_task_df,
+        args.dataset_output_dir,
+        COMPLETION_TASK_CONFIGS["default"],
+        formats=args.output_formats,
+    )
+    logger.debug(
+        "Number of idioms in idiom completion task: %s", len(idiom_comp_task_df)
+    )
+
+    write_completion_task(
+        all_idiom_comp_task_df,
+        args.dataset_output_dir,
+        COMPLETION_TASK_CONFIGS["include_translated_idioms"],
+        formats=args.output_formats,
+    )
+    logger.debug(
+        "Number of idioms in original + translated idiom completion task: %s",
+        len(all_idiom_comp_task_df),
+    )
+
+
+def export_dataset(args):
+    from create_idiom_dataset.validation import (
+        validate_dataset,
+        validate_dataset_with_datasets,
+    )
+
+    idiom_df, translated_idiom_df = read_filtered_idioms(args)
+
+    logger.info("Write frequency files")
+    write_frequency_files(
+        idiom_df=idiom_df,
+        translated_idiom_df=translated_idiom_df,
+        dataset_output_dir=args.dataset_output_dir,
+        formats=args.output_formats,
+    )
+
+    with open(args.dataset_output_dir / "README.md", "w") as f:
+        f.write(datasets_readme_info(args.output_formats))
+
+    logger.info("Validating dataset at %s", args.dataset_output_dir)
+    num_rows = validate_dataset(args.dataset_output_dir, args.output_formats)
+    if args.full_validation:
+        logger.info("Loading dataset with datasets to validate it")
+        validate_dataset_with_datasets(args.dataset_output_dir, num_rows)
+
+
+def get_stages(
+    args,
+    cache: ResponseCache | None = None,
+    client: HttpClient | None = None,
+    queue: WorkQueue | None = None,
+) -> list[Stage]:
+    """The pipeline stages, in the order they must be run"""
+    idiom_files = [args.filtered_idioms_file, args.filtered_translated_idioms_file]
+    task_files = completion_task_files(args.dataset_output_dir, args.output_formats)
+    normalization_params = {
+        "special_chars": args.special_chars,
+        "min_num_words": args.min_num_words,
+    }
+    # Translations from the default APy server are recorded without its url
+    translation_params = {}
+    if args.apertium_url is not None:
+        translation_params["apertium_url"] = args.apertium_url
+    if args.frequency_backend == "local_corpus":
+        frequency_params = {"frequency_backend": args.frequency_backend}
+        corpus_inputs = [args.corpus_dir]
+    else:
+        frequency_params = {"nb_catalog_url": args.nb_catalog_url}
+        corpus_inputs = []
+    # Runs without clustering are recorded without the clustering parameters
+    cluster_params = {}
+    cluster_inputs = []
+    if args.cluster_idioms:
+        cluster_params["cluster_queries"] = args.cluster_queries
+        cluster_inputs.append(args.idiom_clusters_file)
+
+    def write_graphs():
+        idiom_df, translated_idiom_df = read_filtered_idioms(args)
+        logger.info("Creating sequence graphs")
+        write_all_sequence_graphs(
+            idiom_df=idiom_df,
+            translated_idiom_df=translated_idiom_df,
+            dataset_output_dir=args.dataset_output_dir,
+            binary=args.binary_graphs,
+            num_processes=args.num_processes,
+        )
+
+    stages = [
+        Stage(
+            name="read",
+            run=lambda: read_idiom_collection(args),
+            inputs=[args.idiom_collection_dir / lang for lang in args.languages]
+            + [args.ocr_rules_file],
+            params={"languages": args.languages, **normalization_params},
+            outputs=[args.collection_idioms_csv],
+        ),
+        Stage(
+            name="frequency",
+            run=lambda: get_and_filter_idiom_frequencies(
+                args, cache=cache, client=client, queue=queue
+            ),
+            inputs=[args.collection_idioms_csv] + cluster_inputs + corpus_inputs,
+            params={
+                "min_frequency": args.min_frequency,
+                **frequency_params,
+                **cluster_params,
+            },
+            outputs=[args.idiom_freq_file, args.filtered_idioms_file],
+        ),
+        Stage(
+            name="translate",
+            run=lambda: translate_idioms(args, cache=cache, client=client, queue=queue),
+            inputs=[args.filtered_idioms_file],
+            params={
+                "languages": args.languages,
+                **translation_params,
+                **cluster_params,
+            },
+            outputs=[args.translated_idioms_file],
+        ),
+        Stage(
+            name="translated-frequency",
+            run=lambda: get_and_filter_translated_idiom_frequencies(
+                args, cache=cache, client=client, queue=queue
+            ),
+            inputs=[args.translated_idioms_file, args.idiom_freq_file]
+            + [args.ocr_rules_file]
+            + corpus_inputs,
+            params={
+                "min_frequency": args.min_frequency,
+                **frequency_params,
+                **normalization_params,
+            },
+            outputs=[
+                args.translated_idiom_freq_file,
+                args.filtered_translated_idioms_file,
+            ],
+        ),
+        Stage(
+            name="graphs",
+            run=write_graphs,
+            inputs=idiom_files,
+            params={"binary_graphs": args.binary_graphs},
+            outputs=[args.dataset_output_dir / "idiom_graphs"],
+        ),
+        Stage(
+            name="completion-task",
+            run=lambda: write_idiom_completion_tasks(args),
+            inputs=idiom_files,
+            params={
+                "completion_length": args.completion_length,
+                "output_formats": args.output_formats,
+            },
+            outputs=task_files,
+        ),
+        Stage(
+            name="export",
+            run=lambda: export_dataset(args),
+            inputs=idiom_files + task_files,
+            params={
+                "output_formats": args.output_formats,
+                "full_validation": args.full_validation,
+            },
+            outputs=[
+                args.dataset_output_dir / "idiom_freqs",
+                args.dataset_output_dir / "README.md",
+            ],
+        ),
+    ]
+    if args.cluster_idioms:
+        stages.insert(
+            1,
+            Stage(
+                name="cluster",
+                run=lambda: cluster_idioms(args),
+                inputs=[args.collection_idioms_csv],
+                params={"cluster_threshold": args.cluster_threshold},
+                outputs=[args.idiom_clusters_file, args.dedup_report],
+            ),
+        )
+    return stages
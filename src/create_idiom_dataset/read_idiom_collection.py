@@ -1,23 +1,173 @@
+import hashlib
+import json
 import logging
+import os
+from collections.abc import Callable, Iterator
+from functools import partial
 from pathlib import Path
+from create_idiom_dataset.concurrent_lookup import map_in_processes
 from create_idiom_dataset.utils import normalize_and_filter_idiom_df
+from create_idiom_dataset.ocr_rules import OcrRules, load_ocr_rules
 import pandas as pd
 
 logger = logging.getLogger(__name__)
 
 
-def idiom_colletion_to_df(
-    idiom_collection: Path, special_chars: list[str], min_num_words: int
+def iter_book_lines(book: Path) -> Iterator[str]:
+    """Yield the non-blank lines of book one at a time"""
+    with open(book) as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if line.strip():
+                yield line
+
+
+def book_to_df(
+    book: Path,
+    special_chars: list[str],
+    min_num_words: int,
+    ocr_rules: OcrRules | None = None,
 ) -> pd.DataFrame:
-    idioms = [
-        idiom
-        for book in idiom_collection.iterdir()
-        for idiom in book.read_text().split("\n")
-    ]
-    idiom_df = pd.DataFrame({"idiom": idioms})
+    """Read, normalize and filter the idioms in a single book"""
+    idiom_df = pd.DataFrame({"idiom": pd.Series(iter_book_lines(book), dtype=object)})
+    logger.debug("Read %s lines from %s", len(idiom_df), book)
 
     return normalize_and_filter_idiom_df(
         idiom_df=idiom_df,
         special_chars=special_chars,
         min_num_words=min_num_words,
+        ocr_rules=ocr_rules,
+    )
+
+
+def book_fingerprint(
+    book: Path, special_chars: list[str], min_num_words: int, ocr_rules: OcrRules
+) -> dict:
+    """Content hash of book and the normalization parameters its idioms depend on"""
+    fingerprint = {
+        "content_hash": hashlib.sha256(book.read_bytes()).hexdigest(),
+        "special_chars": special_chars,
+        "min_num_words": min_num_words,
+        "ocr_rules_version": ocr_rules.version,
+        "ocr_rules_fingerprint": ocr_rules.fingerprint,
+    }
+    fingerprint["key"] = hashlib.sha256(
+        json.dumps(fingerprint, sort_keys=True).encode()
+    ).hexdigest()
+    return fingerprint
+
+
+def write_book_cache_manifest(book_cache_dir: Path, manifest: dict[str, dict]):
+    manifest_file = book_cache_dir / "manifest.json"
+    tmp_file = book_cache_dir / "manifest.json.tmp"
+    tmp_file.write_text(json.dumps(manifest, ensure_ascii=False, indent=4))
+    os.replace(tmp_file, manifest_file)
+
+
+def process_books(
+    read_book: Callable[[Path], pd.DataFrame], books: list[Path], num_processes: int
+) -> list[pd.DataFrame]:
+    return map_in_processes(read_book, books, num_processes=num_processes)
+
+
+def process_books_with_cache(
+    read_book: Callable[[Path], pd.DataFrame],
+    books: list[Path],
+    num_processes: int,
+    book_cache_dir: Path,
+    fingerprint_book: Callable[[Path], dict],
+) -> list[pd.DataFrame]:
+    book_cache_dir.mkdir(parents=True, exist_ok=True)
+    fingerprints = [fingerprint_book(book) for book in books]
+    cache_files = [book_cache_dir / f"{e['key']}.csv" for e in fingerprints]
+
+    changed_books = [
+        (book, cache_file)
+        for book, cache_file in zip(books, cache_files)
+        if not cache_file.exists()
+    ]
+    logger.info(
+        "Processing %s of %s books in %s (the rest are cached in %s)",
+        len(changed_books),
+        len(books),
+        books[0].parent if books else "",
+        book_cache_dir,
+    )
+    changed_dfs = process_books(
+        read_book, [book for book, _ in changed_books], num_processes
+    )
+    for (_, cache_file), df in zip(changed_books, changed_dfs):
+        # Written to a temporary file first, so an interrupted run leaves no partial
+        # cache file behind to be read as a complete result by the next run
+        tmp_file = cache_file.with_name(cache_file.name + ".tmp")
+        df.to_csv(tmp_file, index=False)
+        os.replace(tmp_file, cache_file)
+
+    manifest = {
+        str(book): fingerprint for book, fingerprint in zip(books, fingerprints)
+    }
+    write_book_cache_manifest(book_cache_dir, manifest)
+
+    # Remove cached results that no current book refers to anymore (e.g. for edited
+    # or deleted books)
+    referenced = {f"{e['key']}.csv" for e in manifest.values()}
+    for cache_file in book_cache_dir.glob("*.csv"):
+        if cache_file.name not in referenced:
+            cache_file.unlink()
+
+    return [
+        pd.read_csv(cache_file, dtype=str, keep_default_na=False)
+        for cache_file in cache_files
+    ]
+
+
+def idiom_colletion_to_df(
+    idiom_collection: Path,
+    special_chars: list[str],
+    min_num_words: int,
+    ocr_rules: OcrRules | None = None,
+    num_processes: int = 1,
+    book_cache_dir: Path | None = None,
+) -> pd.DataFrame:
+    """Read, normalize and filter the idioms of all books in idiom_collection
+
+    Books are processed one at a time, or num_processes books at a time in a process
+    pool, and idioms found in several books are kept once, at their first occurrence.
+
+    If book_cache_dir is given, the idioms of each book are cached there under a
+    fingerprint of the book content and normalization parameters, and only books
+    without a cached result are processed. book_cache_dir/manifest.json records the
+    fingerprint of every book.
+    """
+    books = list(idiom_collection.iterdir())
+    read_book = partial(
+        book_to_df,
+        special_chars=special_chars,
+        min_num_words=min_num_words,
+        ocr_rules=ocr_rules,
+    )
+
+    if book_cache_dir is None:
+        dfs = process_books(read_book, books, num_processes)
+    else:
+        dfs = process_books_with_cache(
+            read_book,
+            books,
+            num_processes,
+            book_cache_dir,
+            lambda book: book_fingerprint(
+                book,
+                special_chars,
+                min_num_words,
+                ocr_rules if ocr_rules is not None else load_ocr_rules(),
+            ),
+        )
+
+    if not dfs:
+        return pd.DataFrame({"idiom": [], "tokens": []}, dtype=object)
+
+    idiom_df = pd.concat(dfs, ignore_index=True).drop_duplicates()
+    logger.debug(
+        "Idiom dataframe length after merging %s books %s", len(books), len(idiom_df)
     )
+    return idiom_df
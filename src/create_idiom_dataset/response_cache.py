@@ -0,0 +1,110 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(query: str) -> str:
+    """Strip the query and collapse runs of whitespace to single spaces"""
+    return " ".join(query.split())
+
+
+class ResponseCache:
+    """Persistent SQLite cache of API responses
+
+    Entries are keyed by a hash of the namespace (e.g. the API endpoint), the normalized
+    query and the language pair. Entries older than ttl seconds are treated as missing,
+    and the cache is trimmed to the max_entries most recently used entries on open and close.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        ttl: float | None = None,
+        max_entries: int | None = None,
+    ):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(
+            self.path, check_same_thread=False, isolation_level=None
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self.evict()
+
+    @staticmethod
+    def make_key(namespace: str, query: str, langpair: str = "") -> str:
+        key = json.dumps([namespace, normalize_query(query), langpair])
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def get(self, namespace: str, query: str, langpair: str = ""):
+        """Return the cached value for the query, or None if it is missing or expired"""
+        key = self.make_key(namespace, query, langpair)
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT value, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (self.ttl is not None and row[1] < now - self.ttl):
+                self.misses += 1
+                return None
+            self._connection.execute(
+                "UPDATE responses SET accessed = ? WHERE key = ?", (now, key)
+            )
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, namespace: str, query: str, value, langpair: str = ""):
+        key = self.make_key(namespace, query, langpair)
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now, now),
+            )
+
+    def evict(self):
+        """Delete expired entries and the least recently used entries beyond max_entries"""
+        with self._lock:
+            if self.ttl is not None:
+                self._connection.execute(
+                    "DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,)
+                )
+            if self.max_entries is not None:
+                self._connection.execute(
+                    "DELETE FROM responses WHERE key NOT IN "
+                    "(SELECT key FROM responses ORDER BY accessed DESC LIMIT ?)",
+                    (self.max_entries,),
+                )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute(
+                "SELECT COUNT(*) FROM responses"
+            ).fetchone()[0]
+
+    def close(self):
+        self.evict()
+        logger.info(
+            "Response cache %s: %s hits, %s misses, %s entries",
+            self.path,
+            self.hits,
+            self.misses,
+            len(self),
+        )
+        self._connection.close()
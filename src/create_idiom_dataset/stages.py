@@ -0,0 +1,94 @@
+import hashlib
+import json
+import logging
+import os
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Stage:
+    """A pipeline stage that turns input files into output files
+
+    The stage is rerun when its fingerprint (the content of its inputs and its
+    params) differs from the one recorded after its last successful run, or when one
+    of its outputs is missing.
+    """
+
+    name: str
+    run: Callable[[], None]
+    inputs: list[Path] = field(default_factory=list)
+    params: dict = field(default_factory=dict)
+    outputs: list[Path] = field(default_factory=list)
+
+    def fingerprint(self) -> str:
+        fingerprint = hashlib.sha256()
+        fingerprint.update(
+            json.dumps(self.params, sort_keys=True, default=str).encode()
+        )
+        for path in self.inputs:
+            fingerprint.update(str(path).encode())
+            update_with_path_content(fingerprint, Path(path))
+        return fingerprint.hexdigest()
+
+
+def update_with_path_content(fingerprint, path: Path):
+    """Update fingerprint with the content of a file, or all files under a directory"""
+    if path.is_dir():
+        for child in sorted(path.rglob("*")):
+            if child.is_file():
+                fingerprint.update(str(child.relative_to(path)).encode())
+                update_with_path_content(fingerprint, child)
+    elif path.is_file():
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(2**20), b""):
+                fingerprint.update(chunk)
+    else:
+        fingerprint.update(b"<missing>")
+
+
+def read_stage_manifest(manifest_file: Path) -> dict[str, str]:
+    if not manifest_file.exists():
+        return {}
+    return json.loads(manifest_file.read_text())
+
+
+def write_stage_manifest(manifest_file: Path, manifest: dict[str, str]):
+    manifest_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = manifest_file.with_name(manifest_file.name + ".tmp")
+    tmp_file.write_text(json.dumps(manifest, indent=4))
+    os.replace(tmp_file, manifest_file)
+
+
+def run_stages(stages: list[Stage], manifest_file: Path, force: bool = False):
+    """Run stages in order, skipping stages that are up to date according to manifest_file
+
+    Stages must be listed after the stages producing their inputs, so that a rerun
+    stage that changes its outputs also changes the fingerprint of later stages.
+    If force is set, every stage is rerun.
+    """
+    manifest = read_stage_manifest(manifest_file)
+    for stage in stages:
+        fingerprint = stage.fingerprint()
+        missing_outputs = [e for e in stage.outputs if not Path(e).exists()]
+
+        if force:
+            logger.info("Running stage %s", stage.name)
+        elif missing_outputs:
+            logger.info(
+                "Running stage %s (missing %s)",
+                stage.name,
+                ", ".join(map(str, missing_outputs)),
+            )
+        elif manifest.get(stage.name) != fingerprint:
+            logger.info("Running stage %s (inputs or parameters changed)", stage.name)
+        else:
+            logger.info("Skipping stage %s (up to date)", stage.name)
+            continue
+
+        stage.run()
+        manifest[stage.name] = fingerprint
+        write_stage_manifest(manifest_file, manifest)
@@ -0,0 +1,51 @@
+from functools import lru_cache
+from nb_tokenizer import tokenize
+import pandas as pd
+
+# Tokens never contain whitespace, so token lists are stored space separated in the
+# "tokens" column, which keeps them readable in the csv checkpoints
+TOKEN_SEPARATOR = " "
+
+
+@lru_cache(maxsize=2**20)
+def tokenize_idiom(idiom: str) -> tuple[str, ...]:
+    """Tokenize idiom with nb_tokenizer, memoized per distinct idiom"""
+    return tuple(tokenize(idiom))
+
+
+def join_tokens(tokens: tuple[str, ...]) -> str:
+    """Join tokens with TOKEN_SEPARATOR, so that get_token_lists splits them back
+
+    Raises ValueError for an empty token or a token containing the separator, which
+    would not survive the round trip.
+    """
+    for token in tokens:
+        if not token or TOKEN_SEPARATOR in token:
+            raise ValueError(
+                f"Token {token!r} of {tokens} can not be joined with {TOKEN_SEPARATOR!r}"
+            )
+    return TOKEN_SEPARATOR.join(tokens)
+
+
+def add_token_column(idiom_df: pd.DataFrame) -> pd.DataFrame:
+    """Add (or fill missing values in) the "tokens" column, tokenizing each unique idiom once"""
+    if "tokens" in idiom_df.columns:
+        missing = idiom_df.tokens.isnull()
+    else:
+        missing = pd.Series(True, index=idiom_df.index)
+        idiom_df["tokens"] = None
+
+    unique_idioms = idiom_df.idiom[missing].dropna().unique()
+    tokens = {idiom: join_tokens(tokenize_idiom(idiom)) for idiom in unique_idioms}
+    idiom_df.loc[missing, "tokens"] = idiom_df.idiom[missing].map(tokens)
+    return idiom_df
+
+
+def get_token_lists(idiom_df: pd.DataFrame) -> list[list[str]]:
+    """Get the token list of every idiom, from the "tokens" column if it is present"""
+    if "tokens" not in idiom_df.columns:
+        return [list(tokenize_idiom(idiom)) for idiom in idiom_df.idiom]
+    return [
+        tokens.split(TOKEN_SEPARATOR) if isinstance(tokens, str) and tokens else []
+        for tokens in idiom_df.tokens
+    ]
@@ -1,7 +1,13 @@
-import requests
+from abc import ABC, abstractmethod
+from collections.abc import Hashable, Iterator
 from typing import TypedDict
 import logging
 from create_idiom_dataset.utils import normalize_and_filter_idiom_df
+from create_idiom_dataset.response_cache import ResponseCache
+from create_idiom_dataset.checkpoint import CheckpointJournal
+from create_idiom_dataset.http_client import HttpClient, RequestFailed
+from create_idiom_dataset.ocr_rules import OcrRules
+from create_idiom_dataset.work_queue import QueuedLookup, WorkQueue
 from tqdm import tqdm
 from pathlib import Path
 import pandas as pd
@@ -15,54 +21,454 @@ class UntranslatedIdiom(TypedDict):
     target_lang: str
 
 
-def get_translation(source_idiom: str, source_lang: str, target_lang: str) -> str:
-    payload = {"q": source_idiom, "langpair": f"{source_lang}|{target_lang}"}
-    url = "https://apertium.org/apy/translate"
+APERTIUM_URL = "https://apertium.org/apy/translate"
 
-    response = requests.get(url, params=payload)
+
+def find_idioms_to_translate(
+    idiom_df: pd.DataFrame, languages: list[str]
+) -> pd.DataFrame:
+    """Find the languages each idiom is missing in, as a source_idiom/source_language/language table
+
+    Idioms with fewer rows than there are languages are translated from the language
+    of their first row into each language they have no row in. Rows are ordered by
+    idiom and then by the order of languages.
+    """
+    idiom_df = idiom_df.loc[idiom_df.idiom.notnull(), ["idiom", "language"]]
+    num_rows = idiom_df.groupby("idiom").idiom.transform("size")
+    sources = (
+        idiom_df[num_rows < len(languages)]
+        .drop_duplicates("idiom")
+        .sort_values("idiom", kind="stable")
+    )
+
+    candidates = pd.DataFrame(
+        {
+            "source_idiom": sources.idiom.repeat(len(languages)).to_numpy(),
+            "source_language": sources.language.repeat(len(languages)).to_numpy(),
+            "language": languages * len(sources),
+        }
+    )
+    exists = pd.MultiIndex.from_frame(candidates[["source_idiom", "language"]]).isin(
+        pd.MultiIndex.from_frame(idiom_df)
+    )
+    return candidates[~exists].reset_index(drop=True)
+
+
+def get_translation(
+    source_idiom: str,
+    source_lang: str,
+    target_lang: str,
+    cache: ResponseCache | None = None,
+    client: HttpClient | None = None,
+    url: str | None = None,
+) -> str:
+    """Translate source_idiom with the APy server at url (by default APERTIUM_URL)
+
+    Returns "" if Apertium answers with a non-retriable error, and raises
+    RequestFailed if it could not be reached.
+    """
+    langpair = f"{source_lang}|{target_lang}"
+    url = url or APERTIUM_URL
+    if cache is not None:
+        translation = cache.get(url, source_idiom, langpair)
+        if translation is not None:
+            return translation
+
+    if client is None:
+        # A client for this lookup only, closed when it is done
+        with HttpClient(max_concurrency=1) as own_client:
+            return get_translation(
+                source_idiom, source_lang, target_lang, cache, own_client, url
+            )
+
+    payload = {"q": source_idiom, "langpair": langpair}
+
+    response = client.get(url, params=payload)
     if response.ok:
-        return response.json()["responseData"]["translatedText"]
+        translation = response.json()["responseData"]["translatedText"]
+        if cache is not None:
+            cache.set(url, source_idiom, translation, langpair)
+        return translation
     else:
         logger.warning("Couldn't get translation for idiom %s", source_idiom)
         logger.warning(response)
         return ""
 
 
-def get_idiom_translations(
+def get_translations(
+    source_idioms: list[str],
+    source_lang: str,
+    target_lang: str,
+    cache: ResponseCache | None = None,
+    client: HttpClient | None = None,
+    url: str | None = None,
+) -> list[str]:
+    """Translate source_idioms with one request, sending them as newline separated segments
+
+    If the response does not contain exactly one line per segment, the batch is split in
+    two and each half is translated separately, down to single idiom requests. Raises
+    RequestFailed if Apertium could not be reached.
+    """
+    langpair = f"{source_lang}|{target_lang}"
+    url = url or APERTIUM_URL
+    if client is None:
+        # One client for this call and its split batches, closed when they are done
+        with HttpClient(max_concurrency=1) as own_client:
+            return get_translations(
+                source_idioms, source_lang, target_lang, cache, own_client, url
+            )
+
+    translations = [None] * len(source_idioms)
+    if cache is not None:
+        translations = [cache.get(url, e, langpair) for e in source_idioms]
+    missing = [i for i, translation in enumerate(translations) if translation is None]
+
+    if len(missing) == 1:
+        translations[missing[0]] = get_translation(
+            source_idioms[missing[0]],
+            source_lang,
+            target_lang,
+            cache=cache,
+            client=client,
+            url=url,
+        )
+    elif missing:
+        segments = [source_idioms[i].replace("\n", " ") for i in missing]
+        payload = {"q": "\n".join(segments), "langpair": langpair}
+
+        response = client.post(url, data=payload)
+        if response.ok:
+            lines = response.json()["responseData"]["translatedText"].split("\n")
+        else:
+            logger.warning("Couldn't get translation for %s idioms", len(segments))
+            logger.warning(response)
+            lines = [""] * len(segments)
+
+        if len(lines) != len(segments):
+            logger.debug(
+                "Got %s lines for %s segments, splitting batch",
+                len(lines),
+                len(segments),
+            )
+            half = len(missing) // 2
+            lines = get_translations(
+                [source_idioms[i] for i in missing[:half]],
+                source_lang,
+                target_lang,
+                cache=cache,
+                client=client,
+                url=url,
+            ) + get_translations(
+                [source_idioms[i] for i in missing[half:]],
+                source_lang,
+                target_lang,
+                cache=cache,
+                client=client,
+                url=url,
+            )
+        elif response.ok and cache is not None:
+            for segment, line in zip(segments, lines):
+                cache.set(url, segment, line, langpair)
+
+        for i, line in zip(missing, lines):
+            translations[i] = line
+    return translations
+
+
+class TranslationBackend(ABC):
+    """Machine translation service for translate_idiom_df"""
+
+    name = ""
+    # Number of idioms translate_idiom_df passes to translate at a time
+    batch_size = 1
+
+    @abstractmethod
+    def translate(self, pairs: list[UntranslatedIdiom]) -> list[str | None]:
+        """Translate each source idiom from its source to its target language
+
+        A translation is "" if the service could not translate the idiom, and None
+        if the service could not be reached (so the idiom should be re-queued).
+        """
+
+    def wait_until_available(self):
+        """Wait before re-queueing idioms that failed"""
+
+    def close(self):
+        pass
+
+
+class ApertiumBackend(TranslationBackend):
+    """Translation with an Apertium APy server, e.g. a self-hosted instance
+
+    Idioms with the same language pair are sent batch_size at a time, as newline
+    separated segments of one request.
+    """
+
+    name = "apertium"
+
+    def __init__(
+        self,
+        url: str | None = None,
+        client: HttpClient | None = None,
+        cache: ResponseCache | None = None,
+        batch_size: int = 1,
+    ):
+        self.url = url or APERTIUM_URL
+        # A client passed in is left open for its owner
+        self.owns_client = client is None
+        self.client = client or HttpClient(max_concurrency=1)
+        self.cache = cache
+        self.batch_size = max(1, batch_size)
+
+    def translate(self, pairs: list[UntranslatedIdiom]) -> list[str | None]:
+        translations = [None] * len(pairs)
+        positions_by_langpair = {}
+        for position, pair in enumerate(pairs):
+            langpair = (pair["source_lang"], pair["target_lang"])
+            positions_by_langpair.setdefault(langpair, []).append(position)
+
+        for (source_lang, target_lang), positions in positions_by_langpair.items():
+            for start in range(0, len(positions), self.batch_size):
+                batch = positions[start : start + self.batch_size]
+                source_idioms = [pairs[i]["source_idiom"] for i in batch]
+                try:
+                    if len(batch) == 1:
+                        batch_translations = [
+                            get_translation(
+                                source_idioms[0],
+                                source_lang,
+                                target_lang,
+                                cache=self.cache,
+                                client=self.client,
+                                url=self.url,
+                            )
+                        ]
+                    else:
+                        batch_translations = get_translations(
+                            source_idioms,
+                            source_lang,
+                            target_lang,
+                            cache=self.cache,
+                            client=self.client,
+                            url=self.url,
+                        )
+                except RequestFailed as e:
+                    logger.debug("Re-queueing %s idioms: %s", len(batch), e)
+                    continue
+                for i, translation in zip(batch, batch_translations):
+                    translations[i] = translation
+        return translations
+
+    def wait_until_available(self):
+        self.client.wait_for_host(self.url)
+
+    def close(self):
+        if self.owns_client:
+            self.client.close()
+
+
+class QueuedTranslationBackend(TranslationBackend):
+    """Translations from backend, looked up by all workers sharing queue
+
+    Rows are added to the queue batch_size at a time, so that the progress and
+    journal of translate_idiom_df advance between batches, and translated
+    backend.batch_size at a time by this process and by any `create_idiom_dataset
+    worker` processes that joined the run.
+    """
+
+    name = "work_queue"
+    kind = "translation"
+
+    def __init__(
+        self,
+        queue: WorkQueue,
+        backend: TranslationBackend,
+        worker_id: str | None = None,
+        poll_interval: float = 1.0,
+        batch_size: int = 500,
+    ):
+        self.backend = backend
+        self.batch_size = max(batch_size, backend.batch_size)
+        self.queued_lookup = QueuedLookup(
+            queue,
+            self.kind,
+            self.lookup,
+            worker_id=worker_id,
+            claim_size=backend.batch_size,
+            poll_interval=poll_interval,
+        )
+
+    def lookup(self, keys: list[tuple]) -> list[tuple[tuple, str]]:
+        translations = self.backend.translate(
+            [
+                UntranslatedIdiom(
+                    source_idiom=source_idiom,
+                    source_lang=source_lang,
+                    target_lang=target_lang,
+                )
+                for source_idiom, source_lang, target_lang in keys
+            ]
+        )
+        # Idioms the backend could not reach its service for are released to be retried
+        return [
+            (key, translation)
+            for key, translation in zip(keys, translations)
+            if translation is not None
+        ]
+
+    def translate(self, pairs: list[UntranslatedIdiom]) -> list[str | None]:
+        keys = [
+            (pair["source_idiom"], pair["source_lang"], pair["target_lang"])
+            for pair in pairs
+        ]
+        results = self.queued_lookup.run(keys)
+        return [results.get(key) for key in keys]
+
+    def wait_until_available(self):
+        self.backend.wait_until_available()
+
+    def close(self):
+        self.backend.close()
+
+
+def translate_rows(
+    idiom_df: pd.DataFrame, backend: TranslationBackend
+) -> Iterator[tuple[Hashable, str | None]]:
+    """Yield (index, translation) for every row in idiom_df
+
+    Rows are grouped by (source_language, language) and passed to backend
+    backend.batch_size rows at a time. The translation is None for rows the backend
+    could not reach its service for.
+    """
+    for _, df_ in idiom_df.groupby(["source_language", "language"], sort=False):
+        for start in range(0, len(df_), backend.batch_size):
+            batch = df_.iloc[start : start + backend.batch_size]
+            pairs = [
+                UntranslatedIdiom(
+                    source_idiom=tup.source_idiom,
+                    source_lang=tup.source_language,
+                    target_lang=tup.language,
+                )
+                for tup in batch.itertuples()
+            ]
+            yield from zip(batch.index, backend.translate(pairs))
+
+
+def translate_idiom_df(
     idiom_df: pd.DataFrame,
     save_every: int,
-    special_chars: list[str],
-    min_num_words: int,
     translated_idioms_file: Path,
+    cache: ResponseCache | None = None,
+    batch_size: int = 1,
+    resume: bool = True,
+    client: HttpClient | None = None,
+    max_passes: int = 3,
+    backend: TranslationBackend | None = None,
 ) -> pd.DataFrame:
+    """Translate rows missing a translation and save idiom_df to translated_idioms_file
+
+    Rows are translated with backend, by default an ApertiumBackend for APERTIUM_URL
+    with the given cache, batch_size and client. Translations are appended to a
+    checkpoint journal next to translated_idioms_file, which is synced every
+    save_every idioms. If resume is set, translations from an earlier interrupted
+    run are replayed from the journal first.
+
+    Rows whose translation failed are re-queued, up to max_passes passes over the
+    missing rows. If some still fail, the translations found so far are saved and
+    RequestFailed is raised, so that a rerun only translates the failed rows.
+    """
+    own_backend = backend is None
+    if own_backend:
+        backend = ApertiumBackend(client=client, cache=cache, batch_size=batch_size)
+
+    journal = CheckpointJournal(
+        translated_idioms_file,
+        ["source_idiom", "source_language", "language"],
+        "idiom",
+        flush_every=save_every,
+    )
+    if resume:
+        idiom_df = journal.replay(idiom_df)
+    else:
+        journal.clear()
+
     translation_missing = idiom_df[idiom_df.idiom.isnull()]
     logger.debug(
         "Total number of idioms: %s Number of idioms missing translation: %s",
         len(idiom_df),
         len(translation_missing),
     )
-    every = 0
-    for tup in tqdm(translation_missing.itertuples(), total=len(translation_missing)):
-        target_idiom = get_translation(
-            source_idiom=tup.source_idiom,
-            source_lang=tup.source_language,
-            target_lang=tup.language,
+    pending = translation_missing
+    with journal.appending():
+        for num_pass in range(1, max_passes + 1):
+            failed = []
+            for index, target_idiom in tqdm(
+                translate_rows(pending, backend), total=len(pending)
+            ):
+                if target_idiom is None:
+                    failed.append(index)
+                    continue
+                idiom_df.at[index, "idiom"] = target_idiom
+                journal.append(
+                    (
+                        pending.at[index, "source_idiom"],
+                        pending.at[index, "source_language"],
+                        pending.at[index, "language"],
+                    ),
+                    target_idiom,
+                )
+
+            pending = pending.loc[failed]
+            if pending.empty or num_pass == max_passes:
+                break
+            logger.warning(
+                "Re-queueing %s idioms whose translation failed", len(pending)
+            )
+            backend.wait_until_available()
+    if own_backend:
+        backend.close()
+
+    logger.debug("Saving idiom_df to file %s", translated_idioms_file)
+    journal.compact(idiom_df)
+    if not pending.empty:
+        raise RequestFailed(
+            f"Could not translate {len(pending)} idioms with {backend.name}, rerun to retry them"
         )
-        idiom_df.at[tup.Index, "idiom"] = target_idiom
+    return idiom_df
 
-        every += 1
-        if every % save_every == 0:
-            logger.debug("Saving idiom_df to file %s", translated_idioms_file)
-            idiom_df.to_csv(translated_idioms_file, index=False)
 
-    idiom_df.to_csv(translated_idioms_file, index=False)
+def get_idiom_translations(
+    idiom_df: pd.DataFrame,
+    save_every: int,
+    special_chars: list[str],
+    min_num_words: int,
+    translated_idioms_file: Path,
+    cache: ResponseCache | None = None,
+    batch_size: int = 1,
+    resume: bool = True,
+    ocr_rules: OcrRules | None = None,
+    client: HttpClient | None = None,
+    backend: TranslationBackend | None = None,
+) -> pd.DataFrame:
+    """Translate rows missing a translation and normalize and filter the translated idioms"""
+    idiom_df = translate_idiom_df(
+        idiom_df,
+        save_every=save_every,
+        translated_idioms_file=translated_idioms_file,
+        cache=cache,
+        batch_size=batch_size,
+        resume=resume,
+        client=client,
+        backend=backend,
+    )
 
     logger.info("Filtering and normalizing translated idioms")
     # Filter and normalize the translated idioms
     idiom_df = normalize_and_filter_idiom_df(
-        idiom_df=idiom_df,
+        idiom_df=idiom_df.dropna(subset="idiom"),
         special_chars=special_chars,
         min_num_words=min_num_words,
+        ocr_rules=ocr_rules,
     )
 
     return idiom_df
@@ -3,7 +3,9 @@ from datetime import datetime
 from pathlib import Path
 import pandas as pd
 import logging
-from nb_tokenizer import tokenize
+from create_idiom_dataset.tokenization import add_token_column, tokenize_idiom
+from create_idiom_dataset.ocr_rules import OcrRules, load_ocr_rules
+import re
 import sys
 
 logger = logging.getLogger(__name__)
@@ -27,55 +29,61 @@ def setup_logging(log_level: str, source_script: str):
     )
 
 
-def clean_ocr(token: str) -> str:
-    """Replace common OCR mistakes with correct tokens"""
+def clean_ocr(token: str, ocr_rules: OcrRules | None = None) -> str:
+    """Replace common OCR mistakes with correct tokens (using the default OCR rules if ocr_rules is None)"""
+    if ocr_rules is None:
+        ocr_rules = load_ocr_rules()
+    return ocr_rules.clean(token)
 
-    match token:
-        case "seiv":
-            return "selv"
-        case "stjemesmeli":
-            return "stjernsmell"
-        case "papirkvem":
-            return "papirkvern"
 
-    if token.startswith("bame") or token.endswith("bam"):
-        return token.replace("bam", "barn")
-    if "stjeme" in token or "fjeme" in token or "hjeme" in token:
-        return token.replace("eme", "erne")
-    if token.startswith("bjøme") or token.startswith("øme"):
-        return token.replace("øme", "ørne")
-    return token
-
-
-def comma_normalize(sentence: str) -> str:
+def comma_normalize(sentence: str, ocr_rules: OcrRules | None = None) -> str:
     """Put a space before all tokens except commas and replace common OCR errors"""
-    tokens = tokenize(sentence)
+    tokens = tokenize_idiom(sentence)
     s = ""
     for t in tokens:
         if t == ",":
             s += t
         else:
-            s += " " + clean_ocr(t)
-    if s[0] == " ":
+            s += " " + clean_ocr(t, ocr_rules)
+    if s.startswith(" "):
         return s[1:]
     return s
 
 
-def normalize_idiom_df(idiom_df: pd.DataFrame) -> pd.DataFrame:
-    logger.debug("Unique idioms before normalization %s", len(idiom_df.idiom.unique()))
+def normalize_idioms(idioms: pd.Series, ocr_rules: OcrRules | None = None) -> pd.Series:
+    """Strip whitespace, decapitalize the first letter and comma normalize idioms
+
+    Each unique idiom is only normalized once.
+    """
+    unique_idioms = pd.Series(idioms.dropna().unique(), dtype=object)
+
     # strip whitespace
-    idiom_df["idiom"] = idiom_df.idiom.apply(lambda x: x.strip())
+    normalized = unique_idioms.str.strip()
 
     # decapitalize first letter
-    idiom_df["idiom"] = idiom_df.idiom.apply(lambda idiom: idiom[0].lower() + idiom[1:])
+    normalized = normalized.str[:1].str.lower() + normalized.str[1:]
 
     # comma normalize
-    idiom_df["idiom"] = idiom_df.idiom.apply(comma_normalize)
+    normalized = normalized.map(lambda idiom: comma_normalize(idiom, ocr_rules))
 
-    logger.debug("Unique idioms after normalization %s", len(idiom_df.idiom.unique()))
+    return idioms.map(dict(zip(unique_idioms, normalized)))
 
-    idiom_df = idiom_df.drop_duplicates()
-    logger.debug("Idiom dataframe length after dropping duplicates %s", len(idiom_df))
+
+def normalize_idiom_df(
+    idiom_df: pd.DataFrame,
+    drop_duplicates: bool = True,
+    ocr_rules: OcrRules | None = None,
+) -> pd.DataFrame:
+    logger.debug("Unique idioms before normalization %s", idiom_df.idiom.nunique())
+    idiom_df = idiom_df.drop(columns="tokens", errors="ignore")
+    idiom_df["idiom"] = normalize_idioms(idiom_df.idiom, ocr_rules=ocr_rules)
+    logger.debug("Unique idioms after normalization %s", idiom_df.idiom.nunique())
+
+    if drop_duplicates:
+        idiom_df = idiom_df.drop_duplicates()
+        logger.debug(
+            "Idiom dataframe length after dropping duplicates %s", len(idiom_df)
+        )
     return idiom_df
 
 
@@ -87,18 +95,22 @@ def filter_idiom_df(
     logger.debug(
         "Idiom dataframe length before special character filtering %s", len(idiom_df)
     )
+    unique_idioms = pd.Series(idiom_df.idiom.dropna().unique(), dtype=object)
+
     # remove idioms with special characters
-    idiom_df = idiom_df[
-        idiom_df.idiom.apply(lambda x: all([char not in x for char in special_chars]))
-    ]
+    if special_chars:
+        special_chars_pattern = re.compile("|".join(map(re.escape, special_chars)))
+        keep = ~unique_idioms.str.contains(special_chars_pattern)
+    else:
+        keep = pd.Series(True, index=unique_idioms.index)
     logger.debug(
-        "Idiom dataframe length after special character filtering %s", len(idiom_df)
+        "Idiom dataframe length after special character filtering %s",
+        idiom_df.idiom.isin(unique_idioms[keep]).sum(),
     )
 
     # remove idioms with less than min_num_words
-    idiom_df = idiom_df[
-        idiom_df.idiom.apply(lambda x: len(x.split(" ")) >= min_num_words)
-    ]
+    keep &= unique_idioms.str.count(" ") + 1 >= min_num_words
+    idiom_df = idiom_df[idiom_df.idiom.isin(unique_idioms[keep])]
     logger.debug("Idiom dataframe length after length filtering %s", len(idiom_df))
 
     idiom_df = idiom_df.drop_duplicates()
@@ -107,13 +119,21 @@ def filter_idiom_df(
 
 
 def normalize_and_filter_idiom_df(
-    idiom_df: pd.DataFrame, special_chars: list[str], min_num_words: int
+    idiom_df: pd.DataFrame,
+    special_chars: list[str],
+    min_num_words: int,
+    ocr_rules: OcrRules | None = None,
 ) -> pd.DataFrame:
-    idiom_df = normalize_idiom_df(idiom_df=idiom_df)
+    # filter_idiom_df drops duplicates, so normalize_idiom_df does not have to
+    idiom_df = normalize_idiom_df(
+        idiom_df=idiom_df, drop_duplicates=False, ocr_rules=ocr_rules
+    )
 
     idiom_df = filter_idiom_df(
         idiom_df=idiom_df,
         special_chars=special_chars,
         min_num_words=min_num_words,
     )
+
+    idiom_df = add_token_column(idiom_df)
     return idiom_df
@@ -0,0 +1,142 @@
+from collections.abc import Iterator
+from pathlib import Path
+import json
+import logging
+import re
+import pyarrow.parquet as pq
+from create_idiom_dataset.dataset_export import (
+    COMPLETION_TASK_CONFIGS,
+    COMPLETION_TASK_COLUMNS,
+    completion_task_schema,
+    readme_format,
+)
+
+logger = logging.getLogger(__name__)
+
+README_CONFIG_PATTERN = re.compile(
+    r'^- config_name: (?P<name>\S+)\n  data_files:\n  - split: test\n    path: "(?P<path>[^"]+)"$',
+    re.MULTILINE,
+)
+
+
+def read_readme_configs(readme_file: Path) -> dict[str, str]:
+    """Map each config name in the dataset README header to its data file path"""
+    text = readme_file.read_text()
+    if not text.lstrip("\n").startswith("---\n"):
+        raise ValueError(f"{readme_file} has no configs header")
+    header = text.lstrip("\n").split("---\n")[1]
+    return {
+        match["name"]: match["path"] for match in README_CONFIG_PATTERN.finditer(header)
+    }
+
+
+def iter_jsonl_records(path: Path) -> Iterator[dict]:
+    with open(path) as f:
+        for line_number, line in enumerate(f, start=1):
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{line_number} is not valid json: {e}")
+
+
+def validate_completion_task_record(record: dict) -> str | None:
+    """Describe what is wrong with a completion task record, or None if it is valid"""
+    if set(record) != set(COMPLETION_TASK_COLUMNS):
+        return f"has columns {sorted(record)}"
+    if not isinstance(record["idiom_start"], str):
+        return "has an idiom_start that is not a string"
+    if not isinstance(record["language"], str) or not record["language"]:
+        return "has no language"
+    completions = record["accepted_completions"]
+    if (
+        not isinstance(completions, list)
+        or not completions
+        or not all(isinstance(e, str) for e in completions)
+    ):
+        return "has accepted_completions that are not a non-empty list of strings"
+    return None
+
+
+def validate_jsonl_completion_task(path: Path) -> int:
+    """Stream a completion task jsonl file, check every record and return the number of rows"""
+    num_rows = 0
+    for num_rows, record in enumerate(iter_jsonl_records(path), start=1):
+        problem = validate_completion_task_record(record)
+        if problem is not None:
+            raise ValueError(f"{path}:{num_rows} {problem}")
+    return num_rows
+
+
+def validate_parquet_completion_task(path: Path) -> int:
+    """Check the schema of a completion task parquet file and return its number of rows
+
+    Only the parquet footer is read.
+    """
+    metadata = pq.read_metadata(path)
+    schema = metadata.schema.to_arrow_schema()
+    if not schema.remove_metadata().equals(completion_task_schema()):
+        raise ValueError(
+            f"{path} has schema {schema}, expected {completion_task_schema()}"
+        )
+    return metadata.num_rows
+
+
+def validate_completion_task_file(path: Path) -> int:
+    if path.suffix == ".parquet":
+        return validate_parquet_completion_task(path)
+    return validate_jsonl_completion_task(path)
+
+
+def validate_dataset(dataset_output_dir: Path, formats: list[str]) -> dict[str, int]:
+    """Check the completion task files and README configs in dataset_output_dir
+
+    Returns the number of rows of each config. Raises ValueError if a file is missing
+    or malformed, if the README configs do not point to the expected files, or if the
+    formats disagree on the number of rows.
+    """
+    configs = read_readme_configs(dataset_output_dir / "README.md")
+    output_format = readme_format(formats)
+    expected_configs = {
+        config_name: f"{stem}.{output_format}"
+        for config_name, stem in COMPLETION_TASK_CONFIGS.items()
+    }
+    if configs != expected_configs:
+        raise ValueError(f"README configs are {configs}, expected {expected_configs}")
+
+    num_rows = {}
+    for config_name, stem in COMPLETION_TASK_CONFIGS.items():
+        rows_per_format = {}
+        for file_format in formats:
+            path = dataset_output_dir / f"{stem}.{file_format}"
+            if not path.exists():
+                raise ValueError(f"{path} does not exist")
+            rows_per_format[file_format] = validate_completion_task_file(path)
+        if len(set(rows_per_format.values())) > 1:
+            raise ValueError(
+                f"Formats of config {config_name} have different numbers of rows: {rows_per_format}"
+            )
+        num_rows[config_name] = rows_per_format[output_format]
+        logger.debug("Config %s has %s rows", config_name, num_rows[config_name])
+    return num_rows
+
+
+def validate_dataset_with_datasets(
+    dataset_output_dir: Path, expected_num_rows: dict[str, int]
+):
+    """Load every config with datasets.load_dataset and check its number of rows"""
+    from datasets import load_dataset
+    from tempfile import TemporaryDirectory
+
+    # A fresh cache directory, as datasets reuses cached splits of earlier runs
+    with TemporaryDirectory() as cache_dir:
+        for config_name, num_rows in expected_num_rows.items():
+            ds = load_dataset(
+                str(dataset_output_dir),
+                split="test",
+                name=config_name,
+                cache_dir=cache_dir,
+            )
+            if ds.num_rows != num_rows:
+                raise ValueError(
+                    f"datasets loaded {ds.num_rows} rows for config {config_name}, expected {num_rows}"
+                )
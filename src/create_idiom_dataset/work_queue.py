@@ -0,0 +1,301 @@
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+def new_worker_id() -> str:
+    """Id that is unique for every worker, on every host"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class WorkQueue:
+    """Lease based queue of API lookups, shared by the workers of a run through a SQLite file
+
+    Tasks are identified by their kind (e.g. "frequency") and key (a tuple of
+    strings). A worker claims a batch of pending tasks, which leases them to it for
+    lease_seconds, and completes them with their results. Tasks whose lease expired
+    (e.g. because their worker died) can be claimed by another worker, and tasks
+    released after a failed lookup are retried until they have failed max_failures
+    times.
+
+    The queue file must be on storage with working file locks for every worker, and
+    the clocks of the hosts must agree to well within lease_seconds.
+    """
+
+    def __init__(self, path: Path, lease_seconds: float = 300.0, max_failures: int = 3):
+        self.path = Path(path)
+        self.lease_seconds = lease_seconds
+        self.max_failures = max_failures
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # The default rollback journal is used, as WAL mode does not work on network
+        # file systems
+        self._connection = sqlite3.connect(
+            self.path, check_same_thread=False, isolation_level=None, timeout=60
+        )
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS tasks ("
+            "kind TEXT NOT NULL, key TEXT NOT NULL, result TEXT, "
+            "done INTEGER NOT NULL DEFAULT 0, failures INTEGER NOT NULL DEFAULT 0, "
+            "lease_owner TEXT, lease_expires REAL, PRIMARY KEY (kind, key))"
+        )
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS settings (name TEXT PRIMARY KEY, value TEXT)"
+        )
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Hold the lock and the database write lock for a transaction"""
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._connection
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._connection.execute("COMMIT")
+
+    @staticmethod
+    def encode_key(key: tuple) -> str:
+        return json.dumps(list(key), ensure_ascii=False)
+
+    def start_run(self, settings: dict, clear: bool = False):
+        """Record the settings of a new run, which workers joining it look up with
+
+        Tasks of earlier runs are kept so that their results are reused, unless clear
+        is set or the settings changed.
+        """
+        previous_settings = self.settings()
+        previous_settings.pop("finished", None)
+        clear = clear or previous_settings != settings
+        with self.transaction():
+            if clear:
+                logger.info("Clearing the tasks of earlier runs from %s", self.path)
+                self._connection.execute("DELETE FROM tasks")
+            self._connection.execute("DELETE FROM settings")
+            self._connection.executemany(
+                "INSERT INTO settings VALUES (?, ?)",
+                [
+                    (name, json.dumps(value))
+                    for name, value in {**settings, "finished": False}.items()
+                ],
+            )
+
+    def settings(self) -> dict:
+        with self._lock:
+            rows = self._connection.execute("SELECT name, value FROM settings")
+            return {name: json.loads(value) for name, value in rows}
+
+    def finish(self):
+        """Mark the run as finished, so that its workers exit"""
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO settings VALUES ('finished', 'true')"
+            )
+
+    def is_finished(self) -> bool:
+        return self.settings().get("finished", False)
+
+    def add(self, kind: str, keys: Iterable[tuple]):
+        """Add tasks for keys, and reset the failures of the ones that are not done"""
+        with self.transaction():
+            self._connection.executemany(
+                "INSERT INTO tasks (kind, key) VALUES (?, ?) "
+                "ON CONFLICT (kind, key) DO UPDATE SET failures = 0 WHERE done = 0",
+                [(kind, self.encode_key(key)) for key in keys],
+            )
+
+    def claim(self, kind: str, worker_id: str, batch_size: int) -> list[tuple]:
+        """Lease up to batch_size pending tasks to worker_id and return their keys"""
+        now = time.time()
+        with self.transaction():
+            # The write lock is taken before reading, so that two workers can not
+            # claim the same tasks
+            keys = [
+                key
+                for (key,) in self._connection.execute(
+                    "SELECT key FROM tasks WHERE kind = ? AND done = 0 "
+                    "AND failures < ? AND (lease_expires IS NULL OR lease_expires < ?) "
+                    "LIMIT ?",
+                    (kind, self.max_failures, now, batch_size),
+                )
+            ]
+            self._connection.executemany(
+                "UPDATE tasks SET lease_owner = ?, lease_expires = ? "
+                "WHERE kind = ? AND key = ?",
+                [(worker_id, now + self.lease_seconds, kind, key) for key in keys],
+            )
+        return [tuple(json.loads(key)) for key in keys]
+
+    def complete(self, kind: str, results: Iterable[tuple[tuple, object]]):
+        """Record the results of tasks as (key, result) pairs
+
+        Lookups give the same result whichever worker does them, so a result is
+        recorded even if the lease of the task expired in the meantime.
+        """
+        with self.transaction():
+            self._connection.executemany(
+                "UPDATE tasks SET result = ?, done = 1, lease_owner = NULL, "
+                "lease_expires = NULL WHERE kind = ? AND key = ? AND done = 0",
+                [
+                    (json.dumps(result, ensure_ascii=False), kind, self.encode_key(key))
+                    for key, result in results
+                ],
+            )
+
+    def release(self, kind: str, worker_id: str, keys: Iterable[tuple]):
+        """Give up the leases of tasks whose lookup failed, so they can be retried"""
+        with self.transaction():
+            self._connection.executemany(
+                "UPDATE tasks SET failures = failures + 1, lease_owner = NULL, "
+                "lease_expires = NULL "
+                "WHERE kind = ? AND key = ? AND lease_owner = ? AND done = 0",
+                [(kind, self.encode_key(key), worker_id) for key in keys],
+            )
+
+    def renew(self, kind: str, worker_id: str, keys: Iterable[tuple]):
+        """Extend the leases worker_id still holds on tasks by lease_seconds from now"""
+        lease_expires = time.time() + self.lease_seconds
+        with self.transaction():
+            self._connection.executemany(
+                "UPDATE tasks SET lease_expires = ? "
+                "WHERE kind = ? AND key = ? AND lease_owner = ? AND done = 0",
+                [
+                    (lease_expires, kind, self.encode_key(key), worker_id)
+                    for key in keys
+                ],
+            )
+
+    def num_unsettled(self, kind: str) -> int:
+        """Number of tasks that are neither done nor failed max_failures times"""
+        with self._lock:
+            return self._connection.execute(
+                "SELECT COUNT(*) FROM tasks WHERE kind = ? AND done = 0 "
+                "AND failures < ?",
+                (kind, self.max_failures),
+            ).fetchone()[0]
+
+    def results(self, kind: str) -> dict[tuple, object]:
+        """Results of the done tasks of kind, by key"""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT key, result FROM tasks WHERE kind = ? AND done = 1", (kind,)
+            ).fetchall()
+        return {tuple(json.loads(key)): json.loads(result) for key, result in rows}
+
+    def close(self):
+        self._connection.close()
+
+
+class QueuedLookup:
+    """Lookups of one kind of task in a WorkQueue, done with lookup
+
+    lookup is called with the keys of a batch of up to claim_size tasks, and returns
+    (key, result) pairs for the keys it could look up. The other tasks are released
+    to be retried. The leases of the batch are renewed every third of the lease time
+    while lookup runs, so that retries and backoff within lookup do not let them
+    expire.
+    """
+
+    def __init__(
+        self,
+        queue: WorkQueue,
+        kind: str,
+        lookup: Callable[[list[tuple]], list[tuple[tuple, object]]],
+        worker_id: str | None = None,
+        claim_size: int = 50,
+        poll_interval: float = 1.0,
+    ):
+        self.queue = queue
+        self.kind = kind
+        self.lookup = lookup
+        self.worker_id = worker_id or new_worker_id()
+        self.claim_size = claim_size
+        self.poll_interval = poll_interval
+
+    def process_batch(self) -> int:
+        """Claim a batch of tasks and look them up, returning the number of tasks claimed"""
+        keys = self.queue.claim(self.kind, self.worker_id, self.claim_size)
+        if not keys:
+            return 0
+        try:
+            with self.renewing_leases(keys):
+                results = self.lookup(keys)
+        except BaseException:
+            self.queue.release(self.kind, self.worker_id, keys)
+            raise
+        self.queue.complete(self.kind, results)
+        found = {key for key, _ in results}
+        self.queue.release(
+            self.kind, self.worker_id, [key for key in keys if key not in found]
+        )
+        return len(keys)
+
+    @contextmanager
+    def renewing_leases(self, keys: list[tuple]) -> Iterator[None]:
+        """Renew the leases of keys in a background thread until the block exits"""
+        stop = threading.Event()
+
+        def renew():
+            while not stop.wait(self.queue.lease_seconds / 3):
+                try:
+                    self.queue.renew(self.kind, self.worker_id, keys)
+                except sqlite3.Error as e:
+                    logger.warning(
+                        "Could not renew the leases of %s tasks: %s", len(keys), e
+                    )
+
+        thread = threading.Thread(target=renew, daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def run(self, keys: list[tuple]) -> dict[tuple, object]:
+        """Add tasks for keys and process them, together with any other workers
+
+        Returns once no task of this kind is left to do, with the results of the keys
+        that were looked up. Keys that failed max_failures times are left out.
+        """
+        self.queue.add(self.kind, keys)
+        while True:
+            if self.process_batch():
+                continue
+            num_unsettled = self.queue.num_unsettled(self.kind)
+            if not num_unsettled:
+                break
+            logger.debug(
+                "Waiting for other workers to look up %s %s tasks",
+                num_unsettled,
+                self.kind,
+            )
+            time.sleep(self.poll_interval)
+        results = self.queue.results(self.kind)
+        return {key: results[key] for key in keys if key in results}
+
+
+def run_worker(queue: WorkQueue, lookups: list[QueuedLookup], poll_interval: float):
+    """Process tasks of the kinds in lookups until the run of queue is finished"""
+    num_processed = 0
+    while True:
+        num_claimed = sum(lookup.process_batch() for lookup in lookups)
+        num_processed += num_claimed
+        if num_claimed:
+            continue
+        if queue.is_finished():
+            break
+        time.sleep(poll_interval)
+    logger.info("Processed %s tasks from %s", num_processed, queue.path)
@@ -0,0 +1,58 @@
+from create_idiom_dataset.checkpoint import CheckpointJournal
+import pandas as pd
+import pytest
+
+
+def get_journal(tmp_path):
+    return CheckpointJournal(
+        tmp_path / "frequencies.csv",
+        key_columns=["idiom"],
+        value_column="frequency",
+        flush_every=2,
+    )
+
+
+def test_torn_line_is_skipped(tmp_path):
+    journal = get_journal(tmp_path)
+    journal.path.write_text('[["a"], 1]\n[["b"], 2[["c"], 3]\n')
+    assert journal.read() == {("a",): 1}
+
+
+def test_append_after_torn_line_starts_a_new_line(tmp_path):
+    journal = get_journal(tmp_path)
+    journal.path.write_text('[["a"], 1]\n[["b"], 2')
+    with journal.appending():
+        journal.append(("c",), 3)
+    assert journal.read() == {("a",): 1, ("c",): 3}
+
+    with journal.appending():
+        journal.append(("d",), 4)
+    assert journal.path.read_text().endswith('[["c"], 3]\n[["d"], 4]\n')
+
+
+def test_replay_and_compact(tmp_path):
+    journal = get_journal(tmp_path)
+    with journal.appending():
+        for key, value in [(("a",), 1), (("b",), 2), (("a",), 3)]:
+            journal.append(key, value)
+
+    df = pd.DataFrame({"idiom": ["a", "b", "c"], "frequency": [None, 5, None]})
+    df = journal.replay(df)
+    # The last value of a key is used, and values already in df are kept
+    assert df.frequency.tolist()[:2] == [3, 5]
+    assert pd.isnull(df.frequency.iat[2])
+
+    journal.compact(df)
+    assert not journal.path.exists()
+    assert pd.read_csv(journal.csv_file).frequency.tolist()[:2] == [3, 5]
+
+
+def test_journal_is_closed_and_flushed_on_error(tmp_path):
+    journal = get_journal(tmp_path)
+    with pytest.raises(KeyboardInterrupt), journal.appending():
+        journal.append(("a",), 1)
+        raise KeyboardInterrupt
+    assert journal.read() == {("a",): 1}
+
+    with pytest.raises(ValueError, match="appending block"):
+        journal.append(("b",), 2)
@@ -0,0 +1,46 @@
+import subprocess
+import sys
+import pytest
+
+HEAVY_MODULES = {"pandas", "pyarrow", "datasets", "requests", "tqdm", "nb_tokenizer"}
+
+
+def imported_modules(*args: str) -> dict[str, int]:
+    """Run python -X importtime with args and map each imported module to its cumulative import time in us"""
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    modules = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line.split("|")
+        modules[module.strip()] = int(cumulative)
+    return modules
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        ["-m", "create_idiom_dataset", "--help"],
+        ["-m", "create_idiom_dataset", "serve", "--help"],
+        ["-m", "create_idiom_dataset", "worker", "--help"],
+        ["-c", "import create_idiom_dataset"],
+        ["-c", "from create_idiom_dataset.idiom_graphs import flatten_sequence_graph"],
+        ["-c", "from create_idiom_dataset.idiom_trie import IdiomTrie"],
+    ],
+)
+def test_short_invocations_do_not_import_heavy_modules(args):
+    modules = imported_modules(*args)
+    assert "create_idiom_dataset" in modules
+    assert not HEAVY_MODULES & {module.split(".")[0] for module in modules}
+
+
+def test_pipeline_attributes_are_imported_on_access():
+    modules = imported_modules(
+        "-c", "from create_idiom_dataset import get_stages, create_idiom_dataset"
+    )
+    assert "pandas" in modules
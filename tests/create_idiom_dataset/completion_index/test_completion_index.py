@@ -0,0 +1,95 @@
+from create_idiom_dataset.completion_index import (
+    CompletionIndex,
+    create_completion_server,
+)
+from create_idiom_dataset.idiom_completion_task import idiom_df_to_idiom_completion_task
+from create_idiom_dataset.idiom_graphs import create_sequence_graph
+from urllib.parse import urlencode
+from urllib.request import urlopen
+import json
+import threading
+import pandas as pd
+import pytest
+
+IDIOM_DF = pd.DataFrame(
+    {
+        "idiom": [
+            "hoppe i havet",
+            "hoppe i høyet",
+            "hoppe over bekken etter vann",
+            "hoppe i havet",
+        ],
+        "language": ["nob", "nob", "nob", "nno"],
+    }
+)
+
+
+@pytest.fixture
+def index():
+    return CompletionIndex.from_completion_task(
+        idiom_df_to_idiom_completion_task(IDIOM_DF)
+    )
+
+
+def test_exact_lookup(index):
+    assert index.complete("hoppe i", "nob") == ["havet", "høyet"]
+    assert index.complete("hoppe i", "nno") == ["havet"]
+    assert index.complete("hoppe", "nob") == []
+    assert index.complete("hoppe i", "sme") == []
+
+
+def test_prefix_lookup(index):
+    assert index.prefix("hoppe ", "nob") == [
+        ("hoppe i", ["havet", "høyet"]),
+        ("hoppe over bekken etter", ["vann"]),
+    ]
+    assert index.prefix("hoppe ", "nob", limit=1) == [("hoppe i", ["havet", "høyet"])]
+    assert index.prefix("hoppe o", "nno") == []
+
+
+def test_batch_lookup(index):
+    assert index.complete_many(
+        [("hoppe i", "nob"), ("hoppe i", "nno"), ("x", "nob")]
+    ) == [
+        ["havet", "høyet"],
+        ["havet"],
+        [],
+    ]
+
+
+def test_index_from_sequence_graphs_matches_completion_task(index):
+    sequence_graphs = {
+        language: create_sequence_graph([e.split(" ") for e in df_.idiom])
+        for language, df_ in IDIOM_DF.groupby("language")
+    }
+    assert CompletionIndex.from_sequence_graphs(sequence_graphs).completions == (
+        index.completions
+    )
+
+
+def test_http_endpoint(index):
+    server = create_completion_server(index, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}"
+    try:
+        query = urlencode({"idiom_start": "hoppe i", "language": "nob"})
+        with urlopen(f"{url}/complete?{query}") as response:
+            assert json.load(response)["accepted_completions"] == ["havet", "høyet"]
+
+        query = urlencode({"prefix": "hoppe o", "language": "nob"})
+        with urlopen(f"{url}/prefix?{query}") as response:
+            assert json.load(response)["matches"] == [
+                {
+                    "idiom_start": "hoppe over bekken etter",
+                    "accepted_completions": ["vann"],
+                }
+            ]
+
+        body = json.dumps(
+            {"queries": [{"idiom_start": "hoppe i", "language": "nno"}]}
+        ).encode()
+        with urlopen(f"{url}/complete", data=body) as response:
+            assert json.load(response)["results"] == [["havet"]]
+    finally:
+        server.shutdown()
+        server.server_close()
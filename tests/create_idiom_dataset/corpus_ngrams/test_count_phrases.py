@@ -0,0 +1,73 @@
+from create_idiom_dataset import corpus_ngrams
+from create_idiom_dataset.corpus_ngrams import count_phrases, phrase_words
+from create_idiom_dataset.frequency_curation import (
+    LocalCorpusBackend,
+    get_idiom_frequencies,
+)
+import numpy as np
+import pandas as pd
+import pytest
+
+
+def naive_count(corpus_words, phrase):
+    words = phrase_words(phrase)
+    return sum(
+        tuple(corpus_words[i : i + len(words)]) == words
+        for i in range(len(corpus_words) - len(words) + 1)
+    )
+
+
+def test_case_punctuation_and_line_breaks_are_ignored(tmp_path):
+    (tmp_path / "a.txt").write_text(
+        "Han kastet inn håndkleet. Så kastet\ninn HÅNDKLEET hun, og hei på deg!\n"
+    )
+    (tmp_path / "b.txt").write_text("«Hei på deg», sa hun.\n")
+    assert count_phrases(
+        tmp_path, ["kaste inn håndkleet", "kastet inn håndkleet", "Hei på deg!", "på"]
+    ) == {
+        "kaste inn håndkleet": 0,
+        "kastet inn håndkleet": 2,
+        "Hei på deg!": 2,
+        "på": 2,
+    }
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 1 << 16])
+@pytest.mark.parametrize("num_processes", [1, 2])
+def test_same_as_naive_count(tmp_path, monkeypatch, chunk_size, num_processes):
+    monkeypatch.setattr(corpus_ngrams, "CHUNK_SIZE", chunk_size)
+    rng = np.random.default_rng(0)
+    vocabulary = ["a", "b", "c", "d"]
+    corpus_words = []
+    for i in range(3):
+        words = rng.choice(vocabulary, 400).tolist()
+        lines = [" ".join(words[j : j + 7]) for j in range(0, len(words), 7)]
+        (tmp_path / f"{i}.txt").write_text("\n".join(lines))
+        corpus_words.append(words)
+
+    phrases = ["a", "a b", "a b c", "b b b b", "d c b a d", "c c", "x", "a x"]
+    counts = count_phrases(tmp_path, phrases, num_processes=num_processes)
+    assert counts == {
+        phrase: sum(naive_count(words, phrase) for words in corpus_words)
+        for phrase in phrases
+    }
+
+
+def test_local_corpus_backend(tmp_path):
+    corpus_dir = tmp_path / "corpus"
+    corpus_dir.mkdir()
+    (corpus_dir / "a.txt").write_text("hei på deg og hei på deg igjen")
+    idiom_df = pd.DataFrame(
+        {
+            "idiom": ["hei på deg", "deg og meg", "kjent idiom her"],
+            "frequency": [None, None, 7],
+        }
+    )
+
+    idiom_df = get_idiom_frequencies(
+        idiom_df,
+        save_every=10,
+        frequency_file=tmp_path / "freqs.csv",
+        backend=LocalCorpusBackend(corpus_dir),
+    )
+    assert idiom_df.frequency.tolist() == [2, 0, 7]
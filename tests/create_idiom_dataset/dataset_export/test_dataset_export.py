@@ -0,0 +1,64 @@
+from create_idiom_dataset.dataset_export import (
+    datasets_readme_info,
+    parquet_num_rows,
+    write_completion_task,
+    write_table,
+)
+import pandas as pd
+import pyarrow.parquet as pq
+
+COMPLETION_TASK_DF = pd.DataFrame(
+    {
+        "idiom_start": ["hei på", "kaste inn"],
+        "accepted_completions": [["deg", "meg"], ["håndkleet"]],
+        "language": ["nob", "nno"],
+    }
+)
+
+
+def test_jsonl_readme_info():
+    assert (
+        datasets_readme_info(["jsonl"])
+        == """
+---
+configs:
+- config_name: default
+  data_files:
+  - split: test
+    path: "data.jsonl"
+- config_name: include_translated_idioms
+  data_files:
+  - split: test
+    path: "original_and_translated_data.jsonl"
+---
+"""
+    )
+
+
+def test_readme_info_points_to_parquet_when_written():
+    readme_info = datasets_readme_info(["jsonl", "parquet"])
+    assert 'path: "data.parquet"' in readme_info
+    assert ".jsonl" not in readme_info
+
+
+def test_completion_task_parquet_has_list_column(tmp_path):
+    write_completion_task(COMPLETION_TASK_DF, tmp_path, "data", ["jsonl", "parquet"])
+
+    table = pq.read_table(tmp_path / "data.parquet")
+    assert (
+        str(table.schema.field("accepted_completions").type) == "list<element: string>"
+    )
+    assert table.to_pylist() == COMPLETION_TASK_DF.to_dict("records")
+    assert parquet_num_rows(tmp_path / "data.parquet") == 2
+    pd.testing.assert_frame_equal(
+        pd.read_json(tmp_path / "data.jsonl", lines=True), COMPLETION_TASK_DF
+    )
+
+
+def test_write_table_only_writes_parquet_when_asked(tmp_path):
+    df = pd.DataFrame({"idiom": ["hei på deg"], "language": ["nob"], "frequency": [3]})
+    write_table(df, tmp_path / "freqs.csv", ["jsonl"])
+    assert not (tmp_path / "freqs.parquet").exists()
+
+    write_table(df, tmp_path / "freqs.csv", ["jsonl", "parquet"])
+    pd.testing.assert_frame_equal(pd.read_parquet(tmp_path / "freqs.parquet"), df)
@@ -0,0 +1,242 @@
+from create_idiom_dataset.frequency_curation import (
+    FrequencyBackend,
+    NbCatalogBackend,
+    QueuedFrequencyBackend,
+    get_frequency,
+    get_idiom_frequencies,
+)
+from create_idiom_dataset.http_client import HttpClient, RequestFailed
+from create_idiom_dataset.response_cache import ResponseCache
+from create_idiom_dataset.work_queue import WorkQueue
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import json
+import threading
+import time
+from typing import ClassVar
+import pandas as pd
+import pytest
+
+
+class NbCatalogStandIn(BaseHTTPRequestHandler):
+    """Answers catalog queries with the number of characters in the quoted query
+
+    Queries in failures are answered with 503 as many times as their count there.
+    """
+
+    queries: ClassVar[list[str]] = []
+    failures: ClassVar[dict[str, int]] = {}
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)["q"][0]
+        self.queries.append(query)
+        if self.failures.get(query):
+            self.failures[query] -= 1
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = json.dumps({"page": {"totalElements": len(query) - 2}}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def catalog_url():
+    NbCatalogStandIn.queries = []
+    NbCatalogStandIn.failures = {}
+    server = ThreadingHTTPServer(("127.0.0.1", 0), NbCatalogStandIn)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/catalog/v1/items"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize("max_concurrent_requests", [1, 4])
+def test_missing_frequencies_are_fetched(
+    catalog_url, tmp_path, max_concurrent_requests
+):
+    idioms = [f"idiom nummer {i}" for i in range(25)]
+    idiom_df = pd.DataFrame({"idiom": idioms, "frequency": [None] * len(idioms)})
+
+    idiom_df = get_idiom_frequencies(
+        idiom_df,
+        save_every=10,
+        frequency_file=tmp_path / "freqs.csv",
+        max_concurrent_requests=max_concurrent_requests,
+        url=catalog_url,
+    )
+
+    assert idiom_df.frequency.tolist() == [len(idiom) for idiom in idioms]
+    assert sorted(NbCatalogStandIn.queries) == sorted(f'"{i}"' for i in idioms)
+    saved_df = pd.read_csv(tmp_path / "freqs.csv")
+    assert saved_df.frequency.tolist() == [len(idiom) for idiom in idioms]
+
+
+def test_existing_frequencies_are_not_fetched(catalog_url, tmp_path):
+    idiom_df = pd.DataFrame(
+        {"idiom": ["kjent idiom her", "ukjent idiom her"], "frequency": [7, None]}
+    )
+
+    idiom_df = get_idiom_frequencies(
+        idiom_df,
+        save_every=10,
+        frequency_file=tmp_path / "freqs.csv",
+        max_concurrent_requests=2,
+        url=catalog_url,
+    )
+
+    assert idiom_df.frequency.tolist() == [7, len("ukjent idiom her")]
+    assert NbCatalogStandIn.queries == ['"ukjent idiom her"']
+
+
+def test_cached_frequencies_are_not_fetched(catalog_url, tmp_path):
+    cache = ResponseCache(tmp_path / "cache.sqlite")
+    cache.set(catalog_url, "kjent  idiom her ", 7)
+    idiom_df = pd.DataFrame(
+        {"idiom": ["kjent idiom her", "ukjent idiom her"], "frequency": [None, None]}
+    )
+
+    idiom_df = get_idiom_frequencies(
+        idiom_df,
+        save_every=10,
+        frequency_file=tmp_path / "freqs.csv",
+        url=catalog_url,
+        cache=cache,
+    )
+
+    assert idiom_df.frequency.tolist() == [7, len("ukjent idiom her")]
+    assert NbCatalogStandIn.queries == ['"ukjent idiom her"']
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cache.get(catalog_url, "ukjent idiom her") == len("ukjent idiom her")
+
+
+def test_frequencies_are_resumed_from_journal(catalog_url, tmp_path):
+    frequency_file = tmp_path / "freqs.csv"
+    journal_file = tmp_path / "freqs.csv.journal.jsonl"
+    journal_file.write_text('[["kjent idiom her"], 7]\n[["ukjent idi')
+    idiom_df = pd.DataFrame(
+        {"idiom": ["kjent idiom her", "ukjent idiom her"], "frequency": [None, None]}
+    )
+
+    idiom_df = get_idiom_frequencies(
+        idiom_df, save_every=10, frequency_file=frequency_file, url=catalog_url
+    )
+
+    assert idiom_df.frequency.tolist() == [7, len("ukjent idiom her")]
+    assert NbCatalogStandIn.queries == ['"ukjent idiom her"']
+    assert not journal_file.exists()
+    assert pd.read_csv(frequency_file).frequency.tolist() == [7, 16]
+
+
+def test_failed_lookups_are_requeued(catalog_url, tmp_path):
+    idioms = [f"idiom nummer {i}" for i in range(6)]
+    NbCatalogStandIn.failures = {'"idiom nummer 1"': 1, '"idiom nummer 4"': 2}
+    idiom_df = pd.DataFrame({"idiom": idioms, "frequency": [None] * len(idioms)})
+
+    with HttpClient(max_retries=0, failure_threshold=100) as client:
+        idiom_df = get_idiom_frequencies(
+            idiom_df,
+            save_every=10,
+            frequency_file=tmp_path / "freqs.csv",
+            max_concurrent_requests=2,
+            url=catalog_url,
+            client=client,
+        )
+
+    assert idiom_df.frequency.tolist() == [len(idiom) for idiom in idioms]
+    assert NbCatalogStandIn.queries.count('"idiom nummer 4"') == 3
+
+
+def test_requeued_lookups_wait_for_open_circuit(catalog_url, tmp_path):
+    idioms = [f"idiom nummer {i}" for i in range(5)]
+    # A short outage opens the circuit, so the later idioms are not even sent
+    NbCatalogStandIn.failures = {'"idiom nummer 0"': 1, '"idiom nummer 1"': 1}
+    idiom_df = pd.DataFrame({"idiom": idioms, "frequency": [None] * len(idioms)})
+
+    start = time.monotonic()
+    with HttpClient(max_retries=0, failure_threshold=2, reset_timeout=0.2) as client:
+        idiom_df = get_idiom_frequencies(
+            idiom_df,
+            save_every=10,
+            frequency_file=tmp_path / "freqs.csv",
+            url=catalog_url,
+            client=client,
+            max_passes=2,
+        )
+
+    # The second pass waits for the half-open trial request, which closes the circuit
+    assert time.monotonic() - start >= 0.2
+    assert idiom_df.frequency.tolist() == [len(idiom) for idiom in idioms]
+    assert NbCatalogStandIn.queries.count('"idiom nummer 0"') == 2
+    assert NbCatalogStandIn.queries.count('"idiom nummer 4"') == 1
+
+
+def test_get_frequency_without_client(catalog_url):
+    assert get_frequency("idiom nummer en", url=catalog_url) == len("idiom nummer en")
+
+
+def test_lookups_failing_every_pass_are_left_missing(catalog_url, tmp_path):
+    idioms = ["idiom nummer en", "idiom nummer to"]
+    NbCatalogStandIn.failures = {'"idiom nummer to"': 2}
+    idiom_df = pd.DataFrame({"idiom": idioms, "frequency": [None, None]})
+
+    with (
+        HttpClient(max_retries=0, failure_threshold=100) as client,
+        pytest.raises(RequestFailed, match="1 idioms"),
+    ):
+        get_idiom_frequencies(
+            idiom_df,
+            save_every=10,
+            frequency_file=tmp_path / "freqs.csv",
+            url=catalog_url,
+            client=client,
+            max_passes=2,
+        )
+
+    saved_df = pd.read_csv(tmp_path / "freqs.csv")
+    assert saved_df.frequency.tolist()[0] == len("idiom nummer en")
+    assert pd.isnull(saved_df.frequency.tolist()[1])
+
+    idiom_df = get_idiom_frequencies(
+        saved_df, save_every=10, frequency_file=tmp_path / "freqs.csv", url=catalog_url
+    )
+    assert idiom_df.frequency.tolist() == [15, 15]
+    assert NbCatalogStandIn.queries.count('"idiom nummer en"') == 1
+
+
+def test_frequencies_are_looked_up_through_work_queue(catalog_url, tmp_path):
+    queue = WorkQueue(tmp_path / "queue.sqlite")
+    # Looked up by another worker
+    queue.add("frequency", [("kjent idiom her",)])
+    queue.complete("frequency", [(("kjent idiom her",), 7)])
+    idiom_df = pd.DataFrame(
+        {"idiom": ["kjent idiom her", "ukjent idiom her"], "frequency": [None, None]}
+    )
+
+    idiom_df = get_idiom_frequencies(
+        idiom_df,
+        save_every=10,
+        frequency_file=tmp_path / "freqs.csv",
+        backend=QueuedFrequencyBackend(queue, NbCatalogBackend(url=catalog_url)),
+    )
+
+    assert idiom_df.frequency.tolist() == [7, len("ukjent idiom her")]
+    assert NbCatalogStandIn.queries == ['"ukjent idiom her"']
+    assert queue.results("frequency")[("ukjent idiom her",)] == 16
+    queue.close()
+
+
+def test_backend_without_get_frequencies_can_not_be_created():
+    class IncompleteBackend(FrequencyBackend):
+        name = "incomplete"
+
+    with pytest.raises(TypeError, match="get_frequencies"):
+        IncompleteBackend()
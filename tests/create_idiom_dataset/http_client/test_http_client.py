@@ -0,0 +1,152 @@
+from create_idiom_dataset.http_client import (
+    CircuitBreaker,
+    HostLimiter,
+    HttpClient,
+    RequestFailed,
+    parse_retry_after,
+)
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import email.utils
+import threading
+import time
+from typing import ClassVar
+import pytest
+
+
+class FlakyStandIn(BaseHTTPRequestHandler):
+    """Answers with the next status in statuses (200 once they run out)"""
+
+    statuses: ClassVar[list[int]] = []
+    retry_after = None
+    num_requests = 0
+
+    def do_GET(self):
+        type(self).num_requests += 1
+        status = self.statuses.pop(0) if self.statuses else 200
+        body = b"{}"
+        self.send_response(status)
+        if self.retry_after is not None:
+            self.send_header("Retry-After", self.retry_after)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def url():
+    FlakyStandIn.statuses = []
+    FlakyStandIn.retry_after = None
+    FlakyStandIn.num_requests = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FlakyStandIn)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/api"
+    server.shutdown()
+    server.server_close()
+
+
+def test_transient_failures_are_retried(url):
+    FlakyStandIn.statuses = [503, 429, 502]
+    with HttpClient(max_retries=3, backoff=0.001) as client:
+        assert client.get(url).status_code == 200
+    assert FlakyStandIn.num_requests == 4
+
+
+def test_non_retriable_responses_are_returned(url):
+    FlakyStandIn.statuses = [404]
+    with HttpClient(backoff=0.001) as client:
+        assert client.get(url).status_code == 404
+    assert FlakyStandIn.num_requests == 1
+
+
+def test_request_failed_after_retries(url):
+    FlakyStandIn.statuses = [500] * 3
+    with (
+        HttpClient(max_retries=2, backoff=0.001) as client,
+        pytest.raises(RequestFailed, match="after 3 attempts"),
+    ):
+        client.get(url)
+
+
+def test_connection_errors_are_retried():
+    with (
+        HttpClient(max_retries=1, backoff=0.001, timeout=1) as client,
+        pytest.raises(RequestFailed, match="ConnectionError"),
+    ):
+        client.get("http://127.0.0.1:9/api")
+
+
+def test_retry_after_is_respected(url):
+    FlakyStandIn.statuses = [429]
+    FlakyStandIn.retry_after = "0.2"
+    with HttpClient(max_retries=1, backoff=0.001) as client:
+        start = time.monotonic()
+        assert client.get(url).ok
+        assert time.monotonic() - start >= 0.2
+
+
+def test_circuit_opens_after_consecutive_failures(url):
+    FlakyStandIn.statuses = [503] * 4
+    with HttpClient(
+        max_retries=0, backoff=0.001, failure_threshold=2, reset_timeout=0.2
+    ) as client:
+        for _ in range(2):
+            with pytest.raises(RequestFailed, match="after 1 attempts"):
+                client.get(url)
+        with pytest.raises(RequestFailed, match="Circuit"):
+            client.get(url)
+        assert FlakyStandIn.num_requests == 2
+
+        # The half open trial fails, which opens the circuit again
+        client.wait_for_host(url)
+        with pytest.raises(RequestFailed, match="after 1 attempts"):
+            client.get(url)
+        with pytest.raises(RequestFailed, match="Circuit"):
+            client.get(url)
+
+        client.wait_for_host(url)
+        FlakyStandIn.statuses = []
+        assert client.get(url).ok
+        assert client.get(url).ok
+
+
+def test_aimd_limit():
+    limiter = HostLimiter(max_limit=8)
+    for _ in range(3):
+        limiter.acquire()
+        limiter.release(throttled=True)
+    assert limiter.limit == 1
+    for _ in range(3):
+        limiter.acquire()
+        limiter.release(throttled=False)
+    assert limiter.limit == pytest.approx(2.9)
+    for _ in range(100):
+        limiter.acquire()
+        limiter.release(throttled=False)
+    assert limiter.limit == 8
+
+
+def test_half_open_circuit_lets_one_trial_through():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+    breaker.record_success()
+    assert breaker.allow_request()
+    assert breaker.allow_request()
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [(None, None), ("", None), ("3", 3), ("1.5", 1.5), ("-2", 0), ("soon", None)],
+)
+def test_parse_retry_after(value, expected):
+    assert parse_retry_after(value) == expected
+
+
+def test_parse_retry_after_date():
+    value = email.utils.formatdate(time.time() + 60, usegmt=True)
+    assert 55 < parse_retry_after(value) <= 60
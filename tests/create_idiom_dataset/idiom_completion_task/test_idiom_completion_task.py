@@ -0,0 +1,134 @@
+from collections import defaultdict
+from create_idiom_dataset.idiom_completion_task import (
+    idiom_df_to_idiom_completion_task,
+    idiom_dfs_to_idiom_completion_tasks,
+    token_lists_to_idiom_completion_task,
+)
+import pandas as pd
+import pytest
+
+TOKENIZED_IDIOMS = [
+    ["hei", "på", "deg"],
+    ["hei", "på", "meg"],
+    ["kaste", "inn", "håndkleet"],
+    ["kaste", "perler", "for", "svin"],
+    ["hoi"],
+    ["hei", "hopp"],
+]
+
+
+def regrouped_completion_task(tokenized_idioms, completion_length):
+    completions = defaultdict(list)
+    for e in tokenized_idioms:
+        if len(e) >= completion_length:
+            completions[" ".join(e[:-completion_length])].append(
+                " ".join(e[-completion_length:])
+            )
+    return pd.DataFrame(
+        {
+            "idiom_start": list(completions.keys()),
+            "accepted_completions": list(completions.values()),
+        }
+    )
+
+
+@pytest.mark.parametrize("completion_length", [1, 2, 3, 4, 5])
+def test_completion_task_matches_regrouping_token_lists(completion_length):
+    completion_task_df = token_lists_to_idiom_completion_task(
+        TOKENIZED_IDIOMS, completion_length=completion_length
+    )
+    pd.testing.assert_frame_equal(
+        completion_task_df,
+        regrouped_completion_task(TOKENIZED_IDIOMS, completion_length),
+        check_dtype=False,
+    )
+
+
+def test_two_token_completions():
+    completion_task_df = token_lists_to_idiom_completion_task(
+        TOKENIZED_IDIOMS, completion_length=2
+    )
+    assert completion_task_df.idiom_start.tolist() == [
+        "hei",
+        "kaste",
+        "kaste perler",
+        "",
+    ]
+    assert completion_task_df.accepted_completions.tolist() == [
+        ["på deg", "på meg"],
+        ["inn håndkleet"],
+        ["for svin"],
+        ["hei hopp"],
+    ]
+
+
+def test_duplicate_idioms_are_grouped_with_their_first_occurrence():
+    completion_task_df = token_lists_to_idiom_completion_task(
+        [["hei", "på", "deg"], ["hei", "på", "meg"], ["hei", "på", "deg"]]
+    )
+    assert completion_task_df.accepted_completions.tolist() == [["deg", "deg", "meg"]]
+
+
+@pytest.mark.parametrize("completion_length", [1, 2])
+def test_shared_build_matches_separate_tasks(completion_length):
+    idiom_df = pd.DataFrame(
+        {
+            "idiom": [
+                "hei på deg",
+                "kaste inn håndkleet",
+                "hoi",
+                "ta skjeen i egen hånd",
+            ],
+            "language": ["nob", "nob", "nno", "nno"],
+        }
+    )
+    translated_idiom_df = pd.DataFrame(
+        {
+            "idiom": ["hei på meg", "kaste inn kluten", "hoi", "ta skeia i eiga hand"],
+            "language": ["nno", "nno", "nob", "nob"],
+        }
+    )
+    for df in (idiom_df, translated_idiom_df):
+        df["tokens"] = df.idiom
+
+    original_df, all_df = idiom_dfs_to_idiom_completion_tasks(
+        idiom_df, translated_idiom_df, completion_length=completion_length
+    )
+    pd.testing.assert_frame_equal(
+        original_df,
+        idiom_df_to_idiom_completion_task(
+            idiom_df, completion_length=completion_length
+        ),
+    )
+    pd.testing.assert_frame_equal(
+        all_df,
+        idiom_df_to_idiom_completion_task(
+            pd.concat([idiom_df, translated_idiom_df]),
+            completion_length=completion_length,
+        ),
+    )
+
+
+def test_parallel_build_matches_serial_build():
+    idiom_df = pd.DataFrame(
+        {
+            "idiom": ["hei på deg", "kaste inn håndkleet", "hoi hoi", "ta skjeen i"],
+            "language": ["nob", "nob", "nno", "sme"],
+        }
+    )
+    translated_idiom_df = pd.DataFrame(
+        {
+            "idiom": ["hei på meg", "kaste inn kluten", "hoi hoi", "ta skeia i"],
+            "language": ["nno", "nno", "nob", "dan"],
+        }
+    )
+    for df in (idiom_df, translated_idiom_df):
+        df["tokens"] = df.idiom
+
+    serial = idiom_dfs_to_idiom_completion_tasks(idiom_df, translated_idiom_df)
+    parallel = idiom_dfs_to_idiom_completion_tasks(
+        idiom_df, translated_idiom_df, num_processes=2
+    )
+    for serial_df, parallel_df in zip(serial, parallel):
+        pd.testing.assert_frame_equal(serial_df, parallel_df)
+    assert serial[1].language.unique().tolist() == ["dan", "nno", "nob", "sme"]
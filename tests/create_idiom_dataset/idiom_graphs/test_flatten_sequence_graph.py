@@ -0,0 +1,73 @@
+from create_idiom_dataset.idiom_graphs import flatten_sequence_graph
+from create_idiom_dataset.idiom_trie import IdiomTrie
+from pathlib import Path
+import json
+import pytest
+
+GRAPH_DIR = Path(__file__).parents[3] / "idiom_dataset" / "idiom_graphs"
+
+
+def trie_from_graph(sequence_graph: dict) -> IdiomTrie:
+    token_lists = []
+    stack = [([], sequence_graph)]
+    while stack:
+        path, d = stack.pop()
+        if not d:
+            token_lists.append(path)
+        for k, v in reversed(d.items()):
+            stack.append((path + [k], v))
+    return IdiomTrie.from_token_lists(token_lists)
+
+
+@pytest.mark.parametrize(
+    "sequence_graph, expected",
+    [
+        ({}, ""),
+        ({"hei": {}}, {"hei": ""}),
+        ({"hei": {"på": {"deg": {}}}}, {"hei på deg": ""}),
+        ({"du": {"da": {}, "du": {}}}, {"du": {"da": "", "du": ""}}),
+        (
+            {
+                "snerk": {"og": {"herk": {}}},
+                "satan": {"og": {"julebrus": {}, "au": {}}, "au": {}},
+            },
+            {
+                "snerk og herk": "",
+                "satan": {"og": {"julebrus": "", "au": ""}, "au": ""},
+            },
+        ),
+        (
+            {"a": {"b": {"c": {}, "d": {"e": {}}}}},
+            {"a b": {"c": "", "d e": ""}},
+        ),
+    ],
+)
+def test_flatten_sequence_graph(sequence_graph, expected):
+    assert flatten_sequence_graph(sequence_graph) == expected
+    assert trie_from_graph(sequence_graph).flatten() == expected
+
+
+def test_deep_sequence_graph_is_flattened_without_recursion():
+    tokens = [str(i) for i in range(10_000)]
+    expected = {" ".join(tokens[:-1]): {tokens[-1]: "", "x": ""}}
+    trie = IdiomTrie.from_token_lists([tokens, tokens[:-1] + ["x"]])
+
+    assert flatten_sequence_graph(trie.to_dict()) == expected
+    assert trie.flatten() == expected
+
+
+@pytest.mark.parametrize(
+    "filename_prefix",
+    ["nob", "nno", "translated_nob", "translated_nno"],
+)
+def test_flattened_shipped_graphs_are_byte_identical(filename_prefix):
+    sequence_graph_file = GRAPH_DIR / f"{filename_prefix}_idioms_sequence_graph.json"
+    flat_file = GRAPH_DIR / f"{filename_prefix}_idioms_flat_sequence_graph.json"
+    sequence_graph = json.loads(sequence_graph_file.read_text())
+    expected = flat_file.read_text()
+
+    flat_sequence_graph = flatten_sequence_graph(sequence_graph)
+    assert json.dumps(flat_sequence_graph, ensure_ascii=False, indent=4) == expected
+
+    flat_sequence_graph = trie_from_graph(sequence_graph).flatten()
+    assert json.dumps(flat_sequence_graph, ensure_ascii=False, indent=4) == expected
@@ -0,0 +1,37 @@
+from create_idiom_dataset.idiom_graphs import write_graph_json
+from create_idiom_dataset.idiom_trie import IdiomTrie
+import io
+import json
+import pytest
+
+TOKENIZED_IDIOMS = [
+    [[]],
+    [["hei"]],
+    [["hei", "på", "deg"], ["hei"]],
+    [["snerk", "og", "herk"], ["satan", "og", "julebrus"], ["satan", "au"]],
+    [["a", "b", "c"], ["a", "b", "d", "e"], ["f", '"g"', "ø"]],
+]
+
+
+@pytest.mark.parametrize("tokenized_idioms", TOKENIZED_IDIOMS)
+@pytest.mark.parametrize("flat", [False, True])
+def test_streamed_json_is_identical_to_json_dump(tokenized_idioms, flat):
+    trie = IdiomTrie.from_token_lists(tokenized_idioms)
+    graph = trie.flatten() if flat else trie.to_dict()
+
+    f = io.StringIO()
+    write_graph_json(trie, f, flat=flat)
+    assert f.getvalue() == json.dumps(graph, ensure_ascii=False, indent=4)
+
+
+@pytest.mark.parametrize("tokenized_idioms", TOKENIZED_IDIOMS)
+@pytest.mark.parametrize("use_mmap", [False, True])
+def test_saved_trie_loads_to_the_same_graph(tokenized_idioms, use_mmap, tmp_path):
+    trie = IdiomTrie.from_token_lists(tokenized_idioms)
+    trie.save(tmp_path / "graph.trie")
+
+    loaded_trie = IdiomTrie.load(tmp_path / "graph.trie", use_mmap=use_mmap)
+    assert loaded_trie.to_dict() == trie.to_dict()
+    assert loaded_trie.flatten() == trie.flatten()
+    assert list(loaded_trie.end_count) == list(trie.end_count)
+    assert loaded_trie.num_idioms == trie.num_idioms
@@ -0,0 +1,168 @@
+from create_idiom_dataset.near_duplicates import (
+    MinHashLsh,
+    cluster_idiom_df,
+    cluster_near_duplicates,
+    dedup_report,
+    idiom_shingles,
+    jaccard_similarity,
+    same_words,
+)
+from create_idiom_dataset.corpus_ngrams import phrase_words
+import numpy as np
+import pandas as pd
+import pytest
+
+
+def test_shingles_ignore_case_punctuation_and_word_order():
+    assert idiom_shingles("Kaste inn håndkleet!") == idiom_shingles(
+        "håndkleet, kaste inn"
+    )
+    assert idiom_shingles("i") == {" i "}
+    assert idiom_shingles("...") == frozenset()
+
+
+@pytest.mark.parametrize(
+    "variant",
+    [
+        "kaste inn håndkleet",
+        "kaste inn hånd kleet",  # OCR slip
+        "kaste inn, håndkleet",
+        "å kaste inn håndkleet",
+        "håndkleet kaste inn",
+    ],
+)
+def test_variants_are_clustered(variant):
+    idioms = ["kaste inn håndkleet", "ikke se skogen for bare trær", variant]
+    assert cluster_near_duplicates(idioms) == [0, 1, 0]
+
+
+@pytest.mark.parametrize(
+    "idiom, other_idiom",
+    [
+        ("ta det med ro", "ta det ikke med ro"),  # Jaccard similarity 0.71
+        ("en kald skulder", "vise en kald skulder"),
+    ],
+)
+def test_idioms_differing_by_a_word_are_not_clustered(idiom, other_idiom):
+    assert jaccard_similarity(idiom_shingles(idiom), idiom_shingles(other_idiom)) >= 0.7
+    assert cluster_near_duplicates([idiom, other_idiom]) == [0, 1]
+
+
+def test_same_words_allows_function_words_and_spelling():
+    def words(idiom):
+        return frozenset(phrase_words(idiom))
+
+    assert same_words(words("kaste inn håndkleet"), words("å kaste inn hånd kleet"))
+    assert same_words(words("kaste inn håndkleet"), words("kaste inn handkleet"))
+    assert same_words(words("ta det med ro"), words("ta den med roa"))
+    assert not same_words(words("ta det med ro"), words("ta det ikke med ro"))
+
+
+def exact_clusters(idioms, threshold):
+    """Clusters of idioms by comparing every pair, as sets of positions"""
+    shingle_sets = [idiom_shingles(idiom) for idiom in idioms]
+    word_sets = [frozenset(phrase_words(idiom)) for idiom in idioms]
+    labels = list(range(len(idioms)))
+    for i in range(len(idioms)):
+        for j in range(i + 1, len(idioms)):
+            if jaccard_similarity(
+                shingle_sets[i], shingle_sets[j]
+            ) >= threshold and same_words(word_sets[i], word_sets[j]):
+                old, new = max(labels[i], labels[j]), min(labels[i], labels[j])
+                labels = [new if label == old else label for label in labels]
+    return {
+        frozenset(i for i, e in enumerate(labels) if e == label) for label in labels
+    }
+
+
+def test_lsh_clusters_match_exact_clusters():
+    idioms = [
+        f"{verb} {article}{noun} {ending}"
+        for verb in ["kaste", "kast", "kastet"]
+        for article in ["", "det "]
+        for noun in ["håndkleet", "hanskene", "kortene"]
+        for ending in ["i ringen", "på bordet"]
+    ]
+    labels = cluster_near_duplicates(idioms, threshold=0.7)
+    clusters = {
+        frozenset(i for i, e in enumerate(labels) if e == label) for label in labels
+    }
+    assert clusters == exact_clusters(idioms, 0.7)
+
+
+class CollidingLsh(MinHashLsh):
+    """Puts all idioms in the same bucket of every band"""
+
+    def signatures(self, shingle_sets):
+        return np.zeros(
+            (len(shingle_sets), self.num_bands * self.rows_per_band), dtype=np.uint64
+        )
+
+
+def test_similar_idioms_behind_a_chance_collision_are_clustered():
+    idioms = ["ugler i mosen", "kaste inn håndkleet", "kaste inn, håndkleet"]
+    assert cluster_near_duplicates(idioms, lsh=CollidingLsh()) == [0, 1, 1]
+
+
+def test_large_buckets_pair_adjacent_rows():
+    lsh = CollidingLsh(num_bands=2, max_bucket_size=3)
+    rows_i, rows_j = lsh.candidate_pairs(lsh.signatures([frozenset()] * 3))
+    assert list(zip(rows_i.tolist(), rows_j.tolist())) == [(0, 1), (0, 2), (1, 2)]
+
+    rows_i, rows_j = lsh.candidate_pairs(lsh.signatures([frozenset()] * 4))
+    assert list(zip(rows_i.tolist(), rows_j.tolist())) == [(0, 1), (1, 2), (2, 3)]
+
+
+def test_signatures_estimate_similarity():
+    lsh = MinHashLsh(num_bands=64, rows_per_band=4)
+    a = idiom_shingles("ikke se skogen for bare trær")
+    b = idiom_shingles("ikke se skogen for bare trærne")
+    signatures = lsh.signatures([a, b, frozenset()])
+    estimate = lsh.similarities(signatures, [0], [1])[0]
+    assert estimate == pytest.approx(jaccard_similarity(a, b), abs=0.1)
+    assert (signatures[2] == signatures.max()).all()
+
+
+def test_cluster_idiom_df():
+    idiom_df = pd.DataFrame(
+        {
+            "idiom": [
+                "kaste inn håndkleet",
+                "kaste inn håndkleet",
+                "kaste inn, håndkleet",
+                "kaste inn hånd kleet",
+                "ugler i mosen",
+                "kaste inn håndkleet",
+            ],
+            "language": ["nob", "nob", "nob", "nob", "nob", "nno"],
+        }
+    )
+    cluster_df = cluster_idiom_df(idiom_df).set_index(["idiom", "language"])
+
+    nob_cluster = cluster_df.loc[
+        [
+            ("kaste inn håndkleet", "nob"),
+            ("kaste inn, håndkleet", "nob"),
+            ("kaste inn hånd kleet", "nob"),
+        ]
+    ]
+    # The idiom with the most rows is the canonical idiom of its cluster
+    assert set(nob_cluster.canonical_idiom) == {"kaste inn håndkleet"}
+    assert set(nob_cluster.cluster_id) == {"nob-0"}
+    assert set(nob_cluster.cluster_size) == {3}
+    assert cluster_df.loc[("ugler i mosen", "nob")].cluster_id == "nob-1"
+    # Languages are clustered separately
+    assert cluster_df.loc[("kaste inn håndkleet", "nno")].cluster_id == "nno-0"
+
+    report = dedup_report(cluster_df.reset_index())
+    assert report["nob"]["num_idioms"] == 4
+    assert report["nob"]["num_clusters"] == 2
+    assert report["nob"]["num_clustered_idioms"] == 3
+    assert report["nob"]["largest_clusters"] == [
+        {
+            "cluster_id": "nob-0",
+            "canonical_idiom": "kaste inn håndkleet",
+            "variants": ["kaste inn hånd kleet", "kaste inn, håndkleet"],
+        }
+    ]
+    assert report["nno"]["largest_clusters"] == []
@@ -0,0 +1,91 @@
+from create_idiom_dataset.ocr_rules import OcrRules, load_ocr_rules
+import json
+import pytest
+
+
+def handwritten_clean_ocr(token: str) -> str:
+    """The original hand-written OCR corrections that ocr_rules.json replaces"""
+    match token:
+        case "seiv":
+            return "selv"
+        case "stjemesmeli":
+            return "stjernsmell"
+        case "papirkvem":
+            return "papirkvern"
+
+    if token.startswith("bame") or token.endswith("bam"):
+        return token.replace("bam", "barn")
+    if "stjeme" in token or "fjeme" in token or "hjeme" in token:
+        return token.replace("eme", "erne")
+    if token.startswith("bjøme") or token.startswith("øme"):
+        return token.replace("øme", "ørne")
+    return token
+
+
+@pytest.mark.parametrize(
+    "token",
+    [
+        "seiv",
+        "stjemesmeli",
+        "papirkvem",
+        "bamet",
+        "bamebam",
+        "smårollingbam",
+        "bambus",
+        "stjemer",
+        "lysstjeme",
+        "fjemeste",
+        "hjemet",
+        "hjememe",
+        "bjømen",
+        "ømeunge",
+        "løme",
+        "barn",
+        "",
+        "bam\n",
+    ],
+)
+def test_default_rules_match_handwritten_corrections(token):
+    assert load_ocr_rules().clean(token) == handwritten_clean_ocr(token)
+
+
+def test_first_matching_rewrite_is_applied():
+    ocr_rules = OcrRules(
+        exact={"rn": "m"},
+        rewrites=[
+            {"suffix": ["ii"], "replace": "ii", "with": "il"},
+            {"infix": ["ii"], "replace": "ii", "with": "ü"},
+        ],
+    )
+    assert ocr_rules.clean("rn") == "m"
+    assert ocr_rules.clean("hiiii") == "hilil"
+    assert ocr_rules.clean("hiir") == "hür"
+    assert ocr_rules.clean("hei") == "hei"
+
+
+@pytest.mark.parametrize(
+    "rule",
+    [
+        {"replace": "ii", "with": "il"},
+        {"prefix": [], "suffix": [], "replace": "ii", "with": "il"},
+        {"infix": [""], "replace": "ii", "with": "il"},
+    ],
+)
+def test_rewrite_without_triggers_is_rejected(rule, tmp_path):
+    with pytest.raises(ValueError, match="Rewrite rule 1"):
+        OcrRules(
+            exact={}, rewrites=[{"suffix": ["ii"], "replace": "ii", "with": "il"}, rule]
+        )
+
+    rules_file = tmp_path / "ocr_rules.json"
+    rules_file.write_text(json.dumps({"rewrites": [rule]}))
+    with pytest.raises(ValueError, match="ocr_rules.json"):
+        load_ocr_rules(rules_file)
+
+
+@pytest.mark.parametrize("key", ["replace", "with"])
+def test_rewrite_without_replacement_is_rejected(key):
+    rule = {"replace": "ii", "with": "il"}
+    del rule[key]
+    with pytest.raises(ValueError, match=f"Rewrite rule 0 has no '{key}'"):
+        OcrRules(exact={}, rewrites=[rule])
@@ -0,0 +1,140 @@
+from create_idiom_dataset.apy_stand_in import ApyStandIn
+from create_idiom_dataset.cli import get_parser
+from create_idiom_dataset.pipeline import (
+    cluster_idioms,
+    get_and_filter_idiom_frequencies,
+    get_stages,
+    translate_idioms,
+    write_frequency_files,
+)
+import pandas as pd
+import pytest
+
+COLLECTION = [
+    ("kaste inn håndkleet", "nob"),
+    ("kaste inn hånd kleet", "nob"),
+    ("ta det med ro", "nob"),
+    ("ta det med roa", "nno"),
+    ("ta det med roa", "nno"),
+    ("ta det med ro", "nno"),
+]
+
+CORPUS = "kaste inn håndkleet. Ta det med ro! ta det med roa\n" * 3
+
+
+@pytest.fixture
+def apy():
+    with ApyStandIn() as server:
+        yield server
+
+
+def get_args(tmp_path, apy, *options):
+    corpus_dir = tmp_path / "corpus"
+    corpus_dir.mkdir(exist_ok=True)
+    (corpus_dir / "book.txt").write_text(CORPUS)
+    data_dir = tmp_path / "data"
+    data_dir.mkdir(exist_ok=True)
+    args = get_parser().parse_args(
+        [
+            str(tmp_path / "collection"),
+            str(tmp_path / "out"),
+            "--min_frequency",
+            "1",
+            "--frequency_backend",
+            "local_corpus",
+            "--corpus_dir",
+            str(corpus_dir),
+            "--apertium_url",
+            apy.url,
+            "--collection_idioms_csv",
+            str(data_dir / "collection_idioms.csv"),
+            "--idiom_freq_file",
+            str(data_dir / "idiom_frequencies.csv"),
+            "--filtered_idioms_file",
+            str(data_dir / "filtered_idioms.csv"),
+            "--translated_idioms_file",
+            str(data_dir / "translated_idioms.csv"),
+            "--idiom_clusters_file",
+            str(data_dir / "idiom_clusters.csv"),
+            "--dedup_report",
+            str(data_dir / "dedup_report.json"),
+            *options,
+        ]
+    )
+    if args.cluster_queries:
+        args.cluster_idioms = True
+    pd.DataFrame(COLLECTION, columns=["idiom", "language"]).to_csv(
+        args.collection_idioms_csv, index=False
+    )
+    return args
+
+
+def run_frequency_and_translate(args):
+    if args.cluster_idioms:
+        cluster_idioms(args)
+    get_and_filter_idiom_frequencies(args)
+    translate_idioms(args)
+    return (
+        pd.read_csv(args.filtered_idioms_file),
+        pd.read_csv(args.translated_idioms_file),
+    )
+
+
+def test_without_clustering_every_idiom_is_queried(tmp_path, apy):
+    args = get_args(tmp_path, apy)
+    assert "cluster" not in [stage.name for stage in get_stages(args)]
+
+    filtered_df, translated_df = run_frequency_and_translate(args)
+
+    assert "cluster_id" not in filtered_df
+    # The OCR slip is not in the corpus, so it is filtered out
+    assert "kaste inn hånd kleet" not in filtered_df.idiom.tolist()
+    assert sorted(pd.read_csv(args.idiom_freq_file).idiom) == [
+        "kaste inn hånd kleet",
+        "kaste inn håndkleet",
+        "ta det med ro",
+        "ta det med roa",
+    ]
+    assert translated_df[
+        ["source_idiom", "source_language", "language"]
+    ].values.tolist() == [["kaste inn håndkleet", "nob", "nno"]]
+
+    write_frequency_files(filtered_df, translated_df.assign(frequency=1), tmp_path)
+    freq_df = pd.read_csv(tmp_path / "idiom_freqs" / "idiom_frequencies.csv")
+    assert freq_df.columns.tolist() == ["idiom", "language", "frequency"]
+
+
+def test_cluster_queries_look_up_canonical_idioms_only(tmp_path, apy):
+    args = get_args(tmp_path, apy, "--cluster_queries")
+    stage_names = [stage.name for stage in get_stages(args)]
+    assert stage_names[:3] == ["read", "cluster", "frequency"]
+
+    filtered_df, translated_df = run_frequency_and_translate(args)
+
+    filtered_df = filtered_df.drop_duplicates().set_index(["idiom", "language"])
+    # The OCR slip, the longer variant, takes the frequency of its canonical idiom
+    assert (
+        filtered_df.loc[("kaste inn hånd kleet", "nob")].frequency
+        == filtered_df.loc[("kaste inn håndkleet", "nob")].frequency
+        == 3
+    )
+    assert (
+        filtered_df.loc[("kaste inn hånd kleet", "nob")].cluster_id
+        == filtered_df.loc[("kaste inn håndkleet", "nob")].cluster_id
+    )
+    assert sorted(pd.read_csv(args.idiom_freq_file).idiom) == [
+        "kaste inn håndkleet",
+        "ta det med ro",
+        "ta det med roa",
+    ]
+    # "ta det med ro" is canonical in nob and a variant in nno, so it already
+    # exists in nno and is not translated
+    assert translated_df[
+        ["source_idiom", "source_language", "language"]
+    ].values.tolist() == [["kaste inn håndkleet", "nob", "nno"]]
+
+    write_frequency_files(
+        filtered_df.reset_index(), translated_df.assign(frequency=1), tmp_path
+    )
+    freq_df = pd.read_csv(tmp_path / "idiom_freqs" / "idiom_frequencies.csv")
+    assert freq_df.columns.tolist() == ["idiom", "language", "frequency", "cluster_id"]
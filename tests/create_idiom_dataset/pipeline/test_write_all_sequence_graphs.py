@@ -0,0 +1,38 @@
+from create_idiom_dataset.pipeline import write_all_sequence_graphs
+from create_idiom_dataset.tokenization import add_token_column
+from pathlib import Path
+import pandas as pd
+import pytest
+
+IDIOM_DATASET_DIR = Path(__file__).parents[3] / "idiom_dataset"
+
+
+def read_graph_files(dataset_output_dir: Path) -> dict[str, bytes]:
+    graph_dir = dataset_output_dir / "idiom_graphs"
+    return {e.name: e.read_bytes() for e in sorted(graph_dir.iterdir())}
+
+
+@pytest.mark.parametrize("binary", [False, True])
+def test_parallel_graph_files_equal_serial_graph_files(tmp_path, binary):
+    freq_dir = IDIOM_DATASET_DIR / "idiom_freqs"
+    idiom_df = add_token_column(
+        pd.read_csv(freq_dir / "idiom_frequencies.csv").groupby("language").head(300)
+    )
+    translated_idiom_df = add_token_column(
+        pd.read_csv(freq_dir / "translated_idiom_frequencies.csv")
+        .groupby("language")
+        .head(300)
+    )
+
+    for num_processes in [1, 2]:
+        write_all_sequence_graphs(
+            idiom_df=idiom_df,
+            translated_idiom_df=translated_idiom_df,
+            dataset_output_dir=tmp_path / str(num_processes),
+            binary=binary,
+            num_processes=num_processes,
+        )
+
+    serial_files = read_graph_files(tmp_path / "1")
+    assert len(serial_files) >= 4
+    assert read_graph_files(tmp_path / "2") == serial_files
@@ -0,0 +1,139 @@
+from create_idiom_dataset.cli import get_parser
+from create_idiom_dataset.ocr_rules import load_ocr_rules
+from create_idiom_dataset.pipeline import read_idiom_collection as read_languages
+from create_idiom_dataset.read_idiom_collection import (
+    book_fingerprint,
+    book_to_df,
+    idiom_colletion_to_df,
+    process_books_with_cache,
+)
+from functools import partial
+import importlib
+import json
+import pandas as pd
+import pytest
+
+
+@pytest.fixture
+def collection(tmp_path):
+    collection = tmp_path / "collection"
+    collection.mkdir()
+    (collection / "a.txt").write_text("kaste inn håndkleet\nta det med ro\n")
+    (collection / "b.txt").write_text("ikke se skogen for bare trær\n")
+    return collection
+
+
+def process_collection(collection, book_cache_dir, min_num_words=3):
+    """Idioms of each book in collection, and the books that were processed"""
+    processed = []
+
+    def read_book(book):
+        processed.append(book.name)
+        return book_to_df(book, special_chars=[], min_num_words=min_num_words)
+
+    books = sorted(collection.iterdir())
+    dfs = process_books_with_cache(
+        read_book,
+        books,
+        num_processes=1,
+        book_cache_dir=book_cache_dir,
+        fingerprint_book=partial(
+            book_fingerprint,
+            special_chars=[],
+            min_num_words=min_num_words,
+            ocr_rules=load_ocr_rules(),
+        ),
+    )
+    return [df.idiom.tolist() for df in dfs], processed
+
+
+def test_unchanged_books_are_read_from_cache(collection, tmp_path):
+    book_cache_dir = tmp_path / "book_cache"
+    idioms, processed = process_collection(collection, book_cache_dir)
+    assert processed == ["a.txt", "b.txt"]
+
+    cached_idioms, processed = process_collection(collection, book_cache_dir)
+    assert processed == []
+    assert (
+        cached_idioms
+        == idioms
+        == [
+            ["kaste inn håndkleet", "ta det med ro"],
+            ["ikke se skogen for bare trær"],
+        ]
+    )
+    assert not list(book_cache_dir.glob("*.tmp"))
+
+
+def test_edited_and_added_books_are_processed(collection, tmp_path):
+    book_cache_dir = tmp_path / "book_cache"
+    process_collection(collection, book_cache_dir)
+
+    (collection / "b.txt").write_text("ikke se skogen for bare trærne\n")
+    (collection / "c.txt").write_text("ugler i mosen\n")
+    idioms, processed = process_collection(collection, book_cache_dir)
+    assert processed == ["b.txt", "c.txt"]
+    assert idioms[1:] == [["ikke se skogen for bare trærne"], ["ugler i mosen"]]
+
+    # A change of the normalization parameters also changes the fingerprints
+    _, processed = process_collection(collection, book_cache_dir, min_num_words=4)
+    assert processed == ["a.txt", "b.txt", "c.txt"]
+
+
+def test_stale_cache_files_are_removed(collection, tmp_path):
+    book_cache_dir = tmp_path / "book_cache"
+    process_collection(collection, book_cache_dir)
+
+    (collection / "a.txt").write_text("ta det med ro\n")
+    (collection / "b.txt").unlink()
+    process_collection(collection, book_cache_dir)
+
+    manifest = json.loads((book_cache_dir / "manifest.json").read_text())
+    assert list(manifest) == [str(collection / "a.txt")]
+    assert [e.name for e in book_cache_dir.glob("*.csv")] == [
+        f"{manifest[str(collection / 'a.txt')]['key']}.csv"
+    ]
+
+
+def test_collection_is_the_same_with_and_without_cache(collection, tmp_path):
+    read_collection = partial(
+        idiom_colletion_to_df, collection, special_chars=[], min_num_words=3
+    )
+    idiom_df = read_collection()
+    for _ in range(2):
+        cached_df = read_collection(book_cache_dir=tmp_path / "book_cache")
+        assert sorted(cached_df.idiom) == sorted(idiom_df.idiom)
+
+
+def test_languages_keep_their_cached_books(tmp_path, monkeypatch):
+    collection = tmp_path / "collection"
+    for language, idiom in [("nob", "ikke se skogen"), ("nno", "ikkje sjå skogen")]:
+        (collection / language).mkdir(parents=True)
+        (collection / language / "book.txt").write_text(f"{idiom} for bare trær\n")
+    args = get_parser().parse_args(
+        [
+            str(collection),
+            str(tmp_path / "out"),
+            "--book_cache_dir",
+            str(tmp_path / "book_cache"),
+            "--collection_idioms_csv",
+            str(tmp_path / "collection_idioms.csv"),
+        ]
+    )
+
+    # The module, which the package attribute of the same name hides
+    module = importlib.import_module("create_idiom_dataset.read_idiom_collection")
+    processed = []
+
+    def counting_book_to_df(book, **kwargs):
+        processed.append(book.parent.name)
+        return book_to_df(book, **kwargs)
+
+    monkeypatch.setattr(module, "book_to_df", counting_book_to_df)
+    for expected in [["nob", "nno"], []]:
+        processed.clear()
+        read_languages(args)
+        assert processed == expected
+
+    idiom_df = pd.read_csv(args.collection_idioms_csv)
+    assert idiom_df.language.tolist() == ["nob", "nno"]
@@ -0,0 +1,42 @@
+from create_idiom_dataset.read_idiom_collection import (
+    idiom_colletion_to_df,
+    iter_book_lines,
+)
+import pandas as pd
+
+
+def test_iter_book_lines_skips_blank_lines(tmp_path):
+    book = tmp_path / "book.txt"
+    book.write_text("kaste inn håndkleet\n\n   \n\tta det med ro \nugler i mosen")
+    assert list(iter_book_lines(book)) == [
+        "kaste inn håndkleet",
+        "\tta det med ro ",
+        "ugler i mosen",
+    ]
+
+
+def test_parallel_reading_equals_serial_reading(tmp_path):
+    collection = tmp_path / "collection"
+    collection.mkdir()
+    for i in range(6):
+        (collection / f"book_{i}.txt").write_text(
+            "\n".join(
+                [
+                    f"Idiom nummer {i} , med komma",
+                    "kaste inn håndkleet",
+                    "",
+                    f"  ta det med ro {i % 2}",
+                    "for kort",
+                    "ugler i mosen?",
+                ]
+            )
+        )
+
+    serial_df = idiom_colletion_to_df(collection, special_chars=["?"], min_num_words=3)
+    parallel_df = idiom_colletion_to_df(
+        collection, special_chars=["?"], min_num_words=3, num_processes=2
+    )
+    pd.testing.assert_frame_equal(parallel_df, serial_df)
+    assert "kaste inn håndkleet" in serial_df.idiom.tolist()
+    assert "ugler i mosen?" not in serial_df.idiom.tolist()
+    assert not serial_df.idiom.duplicated().any()
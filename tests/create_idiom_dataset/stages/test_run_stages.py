@@ -0,0 +1,150 @@
+from create_idiom_dataset.cli import get_parser
+from create_idiom_dataset.pipeline import get_stages
+from create_idiom_dataset.stages import Stage, run_stages, update_with_path_content
+import hashlib
+import json
+import pytest
+
+
+class Pipeline:
+    """Two stages, upper-casing a text file and then counting its words"""
+
+    def __init__(self, tmp_path):
+        self.input_file = tmp_path / "idioms.txt"
+        self.input_file.write_text("kaste inn håndkleet\n")
+        self.upper_file = tmp_path / "upper.txt"
+        self.count_file = tmp_path / "count.txt"
+        self.manifest_file = tmp_path / "stages" / "manifest.json"
+        self.params = {"suffix": "!"}
+        self.runs = []
+        self.fail = None
+
+    def upper(self):
+        self.runs.append("upper")
+        if self.fail == "upper":
+            raise RuntimeError("upper failed")
+        self.upper_file.write_text(
+            self.input_file.read_text().strip().upper() + self.params["suffix"]
+        )
+
+    def count(self):
+        self.runs.append("count")
+        self.count_file.write_text(str(len(self.upper_file.read_text().split())))
+
+    def stages(self):
+        return [
+            Stage(
+                name="upper",
+                run=self.upper,
+                inputs=[self.input_file],
+                params=dict(self.params),
+                outputs=[self.upper_file],
+            ),
+            Stage(
+                name="count",
+                run=self.count,
+                inputs=[self.upper_file],
+                outputs=[self.count_file],
+            ),
+        ]
+
+    def run(self, force=False):
+        self.runs = []
+        run_stages(self.stages(), self.manifest_file, force=force)
+        return self.runs
+
+
+@pytest.fixture
+def pipeline(tmp_path):
+    pipeline = Pipeline(tmp_path)
+    assert pipeline.run() == ["upper", "count"]
+    return pipeline
+
+
+def test_up_to_date_stages_are_skipped(pipeline):
+    assert pipeline.run() == []
+    assert pipeline.count_file.read_text() == "3"
+
+
+def test_param_change_reruns_stage_and_changed_outputs_rerun_later_stages(pipeline):
+    pipeline.params["suffix"] = "?"
+    assert pipeline.run() == ["upper", "count"]
+    assert pipeline.run() == []
+
+
+def test_unchanged_outputs_do_not_rerun_later_stages(pipeline):
+    # Rewriting the input with the same content changes nothing
+    pipeline.input_file.write_text(pipeline.input_file.read_text())
+    assert pipeline.run() == []
+
+    pipeline.upper_file.write_text("KASTE INN HÅNDKLEET")
+    assert pipeline.run() == ["count"]
+
+
+def test_input_edit_reruns_stage(pipeline):
+    pipeline.input_file.write_text("ta det med ro\n")
+    assert pipeline.run() == ["upper", "count"]
+    assert pipeline.count_file.read_text() == "4"
+
+
+def test_missing_output_reruns_stage(pipeline):
+    pipeline.count_file.unlink()
+    assert pipeline.run() == ["count"]
+
+
+def test_force_reruns_every_stage(pipeline):
+    assert pipeline.run(force=True) == ["upper", "count"]
+
+
+def test_manifest_is_not_updated_when_stage_raises(pipeline):
+    manifest = json.loads(pipeline.manifest_file.read_text())
+    pipeline.input_file.write_text("ta det med ro\n")
+    pipeline.fail = "upper"
+    with pytest.raises(RuntimeError):
+        pipeline.run()
+    assert json.loads(pipeline.manifest_file.read_text()) == manifest
+
+    pipeline.fail = None
+    assert pipeline.run() == ["upper", "count"]
+
+
+def test_fingerprint_covers_files_under_directories(tmp_path):
+    def fingerprint(path):
+        fingerprint = hashlib.sha256()
+        update_with_path_content(fingerprint, path)
+        return fingerprint.hexdigest()
+
+    directory = tmp_path / "collection"
+    missing = fingerprint(directory)
+    (directory / "nob").mkdir(parents=True)
+    (directory / "nob" / "book.txt").write_text("kaste inn håndkleet\n")
+    first = fingerprint(directory)
+    assert first != missing
+
+    (directory / "nob" / "book.txt").rename(directory / "nob" / "other_book.txt")
+    assert fingerprint(directory) != first
+    (directory / "nob" / "other_book.txt").rename(directory / "nob" / "book.txt")
+    assert fingerprint(directory) == first
+
+
+@pytest.mark.parametrize("options", [[], ["--cluster_idioms"]])
+def test_pipeline_stages_follow_the_stages_producing_their_inputs(tmp_path, options):
+    args = get_parser().parse_args(
+        [str(tmp_path / "collection"), str(tmp_path / "out"), *options]
+    )
+    stages = get_stages(args)
+    produced = set()
+    outputs = {str(output) for stage in stages for output in stage.outputs}
+    for stage in stages:
+        assert {str(e) for e in stage.inputs if str(e) in outputs} <= produced
+        produced.update(str(e) for e in stage.outputs)
+
+
+def test_pipeline_fingerprints_do_not_depend_on_off_options(tmp_path):
+    argv = [str(tmp_path / "collection"), str(tmp_path / "out")]
+    args = get_parser().parse_args(argv)
+    cluster_args = get_parser().parse_args(argv + ["--cluster_threshold", "0.9"])
+    # The cluster threshold only matters with --cluster_idioms
+    assert [stage.fingerprint() for stage in get_stages(args)] == [
+        stage.fingerprint() for stage in get_stages(cluster_args)
+    ]
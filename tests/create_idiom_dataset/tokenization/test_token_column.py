@@ -0,0 +1,49 @@
+from create_idiom_dataset.tokenization import (
+    add_token_column,
+    get_token_lists,
+    join_tokens,
+    tokenize_idiom,
+)
+from nb_tokenizer import tokenize
+from pathlib import Path
+import pandas as pd
+import pytest
+
+IDIOM_DATASET_DIR = Path(__file__).parents[3] / "idiom_dataset"
+
+
+def test_token_column_round_trips_shipped_idioms(tmp_path):
+    idiom_df = pd.concat(
+        [
+            pd.read_csv(IDIOM_DATASET_DIR / "idiom_freqs" / "idiom_frequencies.csv"),
+            pd.read_csv(
+                IDIOM_DATASET_DIR / "idiom_freqs" / "translated_idiom_frequencies.csv"
+            ),
+        ],
+        ignore_index=True,
+    )[["idiom", "language"]].dropna()
+
+    # Through a csv checkpoint, as between the pipeline stages
+    add_token_column(idiom_df).to_csv(tmp_path / "idioms.csv", index=False)
+    saved_df = pd.read_csv(tmp_path / "idioms.csv")
+
+    assert get_token_lists(saved_df) == [
+        list(tokenize(idiom)) for idiom in idiom_df.idiom
+    ]
+    assert get_token_lists(saved_df) == get_token_lists(saved_df.drop(columns="tokens"))
+
+
+def test_missing_tokens_are_filled():
+    idiom_df = pd.DataFrame(
+        {"idiom": ["kaste inn håndkleet", "ta det med ro"], "tokens": ["x y", None]}
+    )
+    assert get_token_lists(add_token_column(idiom_df)) == [
+        ["x", "y"],
+        list(tokenize_idiom("ta det med ro")),
+    ]
+
+
+@pytest.mark.parametrize("tokens", [("ta det", "med"), ("ta", "")])
+def test_tokens_that_do_not_round_trip_are_rejected(tokens):
+    with pytest.raises(ValueError):
+        join_tokens(tokens)
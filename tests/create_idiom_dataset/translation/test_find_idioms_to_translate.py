@@ -0,0 +1,68 @@
+from create_idiom_dataset.translation import find_idioms_to_translate
+import pandas as pd
+import numpy as np
+import pytest
+
+
+def find_idioms_to_translate_by_group(idiom_df, languages):
+    idioms_to_translate = {"source_idiom": [], "source_language": [], "language": []}
+    for idiom, df_ in idiom_df.groupby("idiom"):
+        if len(df_) < len(languages):
+            lang_list = df_.language.tolist()
+            source_lang = lang_list[0]
+            for lang in languages:
+                if lang not in lang_list:
+                    idioms_to_translate["source_idiom"].append(idiom)
+                    idioms_to_translate["source_language"].append(source_lang)
+                    idioms_to_translate["language"].append(lang)
+    return pd.DataFrame(idioms_to_translate)
+
+
+def random_idiom_df(languages, num_rows, seed):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            "idiom": [
+                f"idiom nummer {i}" for i in rng.integers(0, num_rows // 2, num_rows)
+            ],
+            "language": rng.choice(languages, num_rows),
+        }
+    )
+
+
+@pytest.mark.parametrize(
+    "languages", [["nob", "nno"], ["nno", "nob"], ["nob", "nno", "sme", "dan", "swe"]]
+)
+@pytest.mark.parametrize("seed", [0, 1])
+def test_same_as_grouping_by_idiom(languages, seed):
+    idiom_df = random_idiom_df(languages, 500, seed)
+    pd.testing.assert_frame_equal(
+        find_idioms_to_translate(idiom_df, languages),
+        find_idioms_to_translate_by_group(idiom_df, languages),
+        check_dtype=False,
+    )
+
+
+def test_source_language_is_language_of_first_row():
+    idiom_df = pd.DataFrame(
+        {
+            "idiom": ["b c d", "a b c", "b c d", "a b c"],
+            "language": ["nno", "nob", "sme", "nno"],
+        }
+    )
+    idioms_to_translate = find_idioms_to_translate(idiom_df, ["nob", "nno", "sme"])
+    assert idioms_to_translate.to_dict("records") == [
+        {"source_idiom": "a b c", "source_language": "nob", "language": "sme"},
+        {"source_idiom": "b c d", "source_language": "nno", "language": "nob"},
+    ]
+
+
+def test_nothing_to_translate():
+    idiom_df = pd.DataFrame({"idiom": ["a b c", "a b c"], "language": ["nob", "nno"]})
+    idioms_to_translate = find_idioms_to_translate(idiom_df, ["nob", "nno"])
+    assert idioms_to_translate.empty
+    assert idioms_to_translate.columns.tolist() == [
+        "source_idiom",
+        "source_language",
+        "language",
+    ]
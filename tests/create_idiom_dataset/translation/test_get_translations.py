@@ -0,0 +1,85 @@
+from create_idiom_dataset import translation
+from create_idiom_dataset.apy_stand_in import ApyStandIn
+from create_idiom_dataset.http_client import HttpClient, RequestFailed
+from create_idiom_dataset.translation import get_translations, translate_idiom_df
+import pandas as pd
+import pytest
+
+
+def upper_case_segment(segment, langpair):
+    """Translates each segment to upper case, and "tom" to an empty segment"""
+    return "" if segment == "tom" else segment.upper()
+
+
+@pytest.fixture(autouse=True)
+def apy(monkeypatch):
+    with ApyStandIn(translate_segment=upper_case_segment) as server:
+        monkeypatch.setattr(translation, "APERTIUM_URL", server.url)
+        yield server
+
+
+def test_batch_is_translated_in_one_request(apy):
+    idioms = ["hei på deg", "ha det bra", "takk for maten"]
+    assert get_translations(idioms, "nob", "nno") == [e.upper() for e in idioms]
+    assert len(apy.queries) == 1
+
+
+@pytest.mark.parametrize(
+    "idioms",
+    [
+        ["hei på deg", "tom", "takk for maten"],
+        ["hei på deg", "ha det bra", "tom"],
+        ["tom", "tom"],
+    ],
+)
+def test_empty_translations_stay_on_their_row(idioms):
+    expected = ["" if e == "tom" else e.upper() for e in idioms]
+    assert get_translations(idioms, "nob", "nno") == expected
+
+
+def untranslated_df(idioms):
+    return pd.DataFrame(
+        {
+            "source_idiom": idioms,
+            "source_language": "nob",
+            "language": "nno",
+            "idiom": None,
+        }
+    )
+
+
+@pytest.mark.parametrize("batch_size", [1, 2])
+def test_failed_translations_are_requeued(apy, tmp_path, batch_size):
+    idioms = ["hei på deg", "ha det bra", "takk for maten"]
+    apy.num_failures = 2
+
+    with HttpClient(max_retries=0, failure_threshold=100) as client:
+        idiom_df = translate_idiom_df(
+            untranslated_df(idioms),
+            save_every=10,
+            translated_idioms_file=tmp_path / "translated.csv",
+            batch_size=batch_size,
+            client=client,
+        )
+    assert idiom_df.idiom.tolist() == [e.upper() for e in idioms]
+
+
+def test_failing_translations_are_not_recorded_as_empty(apy, tmp_path):
+    translated_idioms_file = tmp_path / "translated.csv"
+    apy.num_failures = 3
+
+    with (
+        HttpClient(max_retries=0, failure_threshold=100) as client,
+        pytest.raises(RequestFailed, match="1 idioms"),
+    ):
+        translate_idiom_df(
+            untranslated_df(["hei på deg", "ha det bra"]),
+            save_every=10,
+            translated_idioms_file=translated_idioms_file,
+            client=client,
+            max_passes=2,
+        )
+
+    saved_df = pd.read_csv(translated_idioms_file)
+    assert saved_df.idiom.isnull().tolist() == [True, False]
+    assert not (tmp_path / "translated.csv.journal.jsonl").exists()
@@ -0,0 +1,170 @@
+from create_idiom_dataset.apy_stand_in import ApyStandIn
+from create_idiom_dataset.http_client import HttpClient
+from create_idiom_dataset.translation import (
+    ApertiumBackend,
+    QueuedTranslationBackend,
+    TranslationBackend,
+    UntranslatedIdiom,
+    translate_idiom_df,
+)
+from create_idiom_dataset.work_queue import WorkQueue
+import pandas as pd
+import pytest
+import requests
+
+
+def tag_segment(segment, langpair):
+    return f"{langpair}:{segment}"
+
+
+@pytest.fixture
+def apy():
+    with ApyStandIn(translate_segment=tag_segment) as server:
+        yield server
+
+
+def pair(source_idiom, source_lang, target_lang):
+    return UntranslatedIdiom(
+        source_idiom=source_idiom, source_lang=source_lang, target_lang=target_lang
+    )
+
+
+@pytest.mark.parametrize("batch_size", [1, 2, 10])
+def test_apertium_backend_keeps_order_across_language_pairs(apy, batch_size):
+    pairs = [
+        pair("hei på deg", "nob", "nno"),
+        pair("ha det bra", "nno", "nob"),
+        pair("takk for maten", "nob", "nno"),
+        pair("god natt", "nob", "nno"),
+    ]
+    backend = ApertiumBackend(url=apy.url, batch_size=batch_size)
+    try:
+        translations = backend.translate(pairs)
+    finally:
+        backend.close()
+
+    assert translations == [
+        "nob|nno:hei på deg",
+        "nno|nob:ha det bra",
+        "nob|nno:takk for maten",
+        "nob|nno:god natt",
+    ]
+    # Each language pair is sent in batches of batch_size idioms
+    assert len(apy.queries) == 1 + -(-3 // batch_size)
+
+
+def test_apertium_backend_returns_none_for_unreachable_idioms(apy):
+    apy.num_failures = 1
+    with HttpClient(max_retries=0, failure_threshold=100) as client:
+        backend = ApertiumBackend(url=apy.url, client=client, batch_size=2)
+        translations = backend.translate(
+            [pair("hei på deg", "nob", "nno"), pair("ha det bra", "nob", "nno")]
+        )
+    assert translations == [None, None]
+
+
+class ReverseBackend(TranslationBackend):
+    name = "reverse"
+    batch_size = 2
+
+    def __init__(self):
+        self.batches = []
+
+    def translate(self, pairs):
+        self.batches.append(len(pairs))
+        return [pair["source_idiom"][::-1] for pair in pairs]
+
+
+def test_backend_without_translate_can_not_be_created():
+    class IncompleteBackend(TranslationBackend):
+        name = "incomplete"
+
+    with pytest.raises(TypeError, match="translate"):
+        IncompleteBackend()
+
+
+def test_translate_idiom_df_uses_given_backend(tmp_path):
+    idioms = ["hei på deg", "ha det bra", "takk for maten"]
+    backend = ReverseBackend()
+    idiom_df = translate_idiom_df(
+        pd.DataFrame(
+            {
+                "source_idiom": idioms,
+                "source_language": "nob",
+                "language": "nno",
+                "idiom": None,
+            }
+        ),
+        save_every=10,
+        translated_idioms_file=tmp_path / "translated.csv",
+        backend=backend,
+    )
+    assert idiom_df.idiom.tolist() == [e[::-1] for e in idioms]
+    assert backend.batches == [2, 1]
+
+
+def test_queued_backend_translates_through_work_queue(apy, tmp_path):
+    queue = WorkQueue(tmp_path / "queue.sqlite")
+    # Translated by another worker
+    queue.add("translation", [("ha det bra", "nno", "nob")])
+    queue.complete("translation", [(("ha det bra", "nno", "nob"), "ha det godt")])
+    backend = QueuedTranslationBackend(
+        queue, ApertiumBackend(url=apy.url, batch_size=2)
+    )
+
+    idiom_df = translate_idiom_df(
+        pd.DataFrame(
+            {
+                "source_idiom": ["hei på deg", "ha det bra", "takk for maten"],
+                "source_language": ["nob", "nno", "nob"],
+                "language": ["nno", "nob", "nno"],
+                "idiom": None,
+            }
+        ),
+        save_every=10,
+        translated_idioms_file=tmp_path / "translated.csv",
+        backend=backend,
+    )
+    backend.close()
+
+    assert idiom_df.idiom.tolist() == [
+        "nob|nno:hei på deg",
+        "ha det godt",
+        "nob|nno:takk for maten",
+    ]
+    assert apy.queries == ["hei på deg\ntakk for maten"]
+    queue.close()
+
+
+def test_queued_backend_passes_bounded_batches(tmp_path):
+    queue = WorkQueue(tmp_path / "queue.sqlite")
+    reverse_backend = ReverseBackend()
+    backend = QueuedTranslationBackend(queue, reverse_backend, batch_size=3)
+    idioms = [f"idiom nummer {i}" for i in range(7)]
+
+    idiom_df = translate_idiom_df(
+        pd.DataFrame(
+            {
+                "source_idiom": idioms,
+                "source_language": "nob",
+                "language": "nno",
+                "idiom": None,
+            }
+        ),
+        save_every=10,
+        translated_idioms_file=tmp_path / "translated.csv",
+        backend=backend,
+    )
+    queue.close()
+
+    assert idiom_df.idiom.tolist() == [e[::-1] for e in idioms]
+    # Rows are queued 3 at a time, and claimed 2 at a time
+    assert reverse_backend.batches == [2, 1, 2, 1, 1]
+
+
+def test_stand_in_lists_language_pairs(apy):
+    response = requests.get(apy.url.replace("/translate", "/listPairs"), timeout=10)
+    assert response.json()["responseData"] == [
+        {"sourceLanguage": "nob", "targetLanguage": "nno"},
+        {"sourceLanguage": "nno", "targetLanguage": "nob"},
+    ]
@@ -0,0 +1,60 @@
+from create_idiom_dataset.utils import comma_normalize, normalize_and_filter_idiom_df
+from pathlib import Path
+import pandas as pd
+import pytest
+
+IDIOM_DATASET_DIR = Path(__file__).parents[3] / "idiom_dataset"
+
+
+def rowwise_normalize_and_filter_idiom_df(
+    idiom_df: pd.DataFrame, special_chars: list[str], min_num_words: int
+) -> pd.DataFrame:
+    """The original row by row implementation of normalize_and_filter_idiom_df"""
+    idiom_df["idiom"] = idiom_df.idiom.apply(lambda x: x.strip())
+    idiom_df["idiom"] = idiom_df.idiom.apply(lambda idiom: idiom[0].lower() + idiom[1:])
+    idiom_df["idiom"] = idiom_df.idiom.apply(comma_normalize)
+    idiom_df = idiom_df.drop_duplicates()
+    idiom_df = idiom_df[
+        idiom_df.idiom.apply(lambda x: all([char not in x for char in special_chars]))
+    ]
+    idiom_df = idiom_df[
+        idiom_df.idiom.apply(lambda x: len(x.split(" ")) >= min_num_words)
+    ]
+    return idiom_df.drop_duplicates()
+
+
+def perturbed_shipped_idioms() -> pd.DataFrame:
+    """Idioms from the shipped dataset, in the shape of raw idiom collection lines"""
+    idioms = pd.concat(
+        [
+            pd.read_csv(IDIOM_DATASET_DIR / "idiom_freqs" / "idiom_frequencies.csv"),
+            pd.read_csv(
+                IDIOM_DATASET_DIR / "idiom_freqs" / "translated_idiom_frequencies.csv"
+            ),
+        ]
+    )[["idiom", "language"]]
+    idioms = idioms.idiom.tolist() + idioms.idiom.str.capitalize().tolist()
+    raw_idioms = [
+        f"  {idiom}\t" if i % 3 == 0 else idiom.replace(",", " ,")
+        for i, idiom in enumerate(idioms)
+    ]
+    raw_idioms += ["Barnet (også) kastes ut", "Se * på *", "to ord", "ett"]
+    return pd.DataFrame({"idiom": raw_idioms})
+
+
+@pytest.mark.parametrize(
+    "special_chars, min_num_words", [(["(", "/", "*"], 3), ([], 1), ([","], 5)]
+)
+def test_normalize_and_filter_matches_rowwise_implementation(
+    special_chars, min_num_words
+):
+    idiom_df = perturbed_shipped_idioms()
+
+    expected = rowwise_normalize_and_filter_idiom_df(
+        idiom_df.copy(), special_chars=special_chars, min_num_words=min_num_words
+    )
+    result = normalize_and_filter_idiom_df(
+        idiom_df.copy(), special_chars=special_chars, min_num_words=min_num_words
+    )
+
+    pd.testing.assert_frame_equal(result.drop(columns="tokens"), expected)
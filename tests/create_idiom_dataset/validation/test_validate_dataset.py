@@ -0,0 +1,81 @@
+from create_idiom_dataset.dataset_export import (
+    datasets_readme_info,
+    write_completion_task,
+)
+from create_idiom_dataset.validation import read_readme_configs, validate_dataset
+import pandas as pd
+import pytest
+
+COMPLETION_TASK_DF = pd.DataFrame(
+    {
+        "idiom_start": ["hei på", "kaste inn"],
+        "accepted_completions": [["deg", "meg"], ["håndkleet"]],
+        "language": ["nob", "nno"],
+    }
+)
+
+
+def write_dataset(dataset_dir, formats, completion_task_df=COMPLETION_TASK_DF):
+    write_completion_task(completion_task_df, dataset_dir, "data", formats)
+    write_completion_task(
+        pd.concat([completion_task_df, completion_task_df]),
+        dataset_dir,
+        "original_and_translated_data",
+        formats,
+    )
+    (dataset_dir / "README.md").write_text(datasets_readme_info(formats))
+
+
+@pytest.mark.parametrize("formats", [["jsonl"], ["parquet"], ["jsonl", "parquet"]])
+def test_valid_dataset_row_counts(tmp_path, formats):
+    write_dataset(tmp_path, formats)
+    assert validate_dataset(tmp_path, formats) == {
+        "default": 2,
+        "include_translated_idioms": 4,
+    }
+
+
+def test_readme_configs(tmp_path):
+    (tmp_path / "README.md").write_text(datasets_readme_info(["parquet"]))
+    assert read_readme_configs(tmp_path / "README.md") == {
+        "default": "data.parquet",
+        "include_translated_idioms": "original_and_translated_data.parquet",
+    }
+
+
+def test_readme_paths_must_match_formats(tmp_path):
+    write_dataset(tmp_path, ["jsonl", "parquet"])
+    (tmp_path / "README.md").write_text(datasets_readme_info(["jsonl"]))
+    with pytest.raises(ValueError, match="README configs"):
+        validate_dataset(tmp_path, ["jsonl", "parquet"])
+
+
+def test_missing_file(tmp_path):
+    write_dataset(tmp_path, ["jsonl"])
+    (tmp_path / "original_and_translated_data.jsonl").unlink()
+    with pytest.raises(ValueError, match="does not exist"):
+        validate_dataset(tmp_path, ["jsonl"])
+
+
+def test_empty_accepted_completions(tmp_path):
+    write_dataset(
+        tmp_path, ["jsonl"], COMPLETION_TASK_DF.assign(accepted_completions=[[], ["x"]])
+    )
+    with pytest.raises(ValueError, match="data.jsonl:1 has accepted_completions"):
+        validate_dataset(tmp_path, ["jsonl"])
+
+
+def test_formats_with_different_row_counts(tmp_path):
+    write_dataset(tmp_path, ["jsonl", "parquet"])
+    write_completion_task(COMPLETION_TASK_DF.iloc[:1], tmp_path, "data", ["parquet"])
+    with pytest.raises(ValueError, match="different numbers of rows"):
+        validate_dataset(tmp_path, ["jsonl", "parquet"])
+
+
+def test_parquet_schema(tmp_path):
+    write_dataset(tmp_path, ["parquet"])
+    COMPLETION_TASK_DF.assign(accepted_completions="deg").to_parquet(
+        tmp_path / "data.parquet"
+    )
+    with pytest.raises(ValueError, match="has schema"):
+        validate_dataset(tmp_path, ["parquet"])
@@ -0,0 +1,138 @@
+from create_idiom_dataset.work_queue import QueuedLookup, WorkQueue, run_worker
+from multiprocessing import get_context
+import time
+import pytest
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = WorkQueue(tmp_path / "queue.sqlite", lease_seconds=60)
+    yield queue
+    queue.close()
+
+
+def test_claimed_tasks_are_leased_to_one_worker(queue):
+    keys = [(f"idiom {i}",) for i in range(5)]
+    queue.add("frequency", keys)
+
+    first = queue.claim("frequency", "a", 3)
+    second = queue.claim("frequency", "b", 3)
+    assert len(first) == 3 and len(second) == 2
+    assert sorted(first + second) == keys
+    assert queue.claim("frequency", "c", 3) == []
+
+    queue.complete("frequency", [(key, 1) for key in first])
+    assert queue.num_unsettled("frequency") == 2
+    assert queue.results("frequency") == {key: 1 for key in first}
+
+
+def test_expired_leases_are_claimed_again(tmp_path):
+    queue = WorkQueue(tmp_path / "queue.sqlite", lease_seconds=0.05)
+    queue.add("frequency", [("idiom",)])
+    assert queue.claim("frequency", "a", 1) == [("idiom",)]
+    assert queue.claim("frequency", "b", 1) == []
+
+    time.sleep(0.1)
+    assert queue.claim("frequency", "b", 1) == [("idiom",)]
+    # A stale worker can not release a task it lost the lease of
+    queue.release("frequency", "a", [("idiom",)])
+    assert queue.claim("frequency", "c", 1) == []
+    queue.close()
+
+
+def test_leases_are_renewed_while_lookup_runs(tmp_path):
+    queue = WorkQueue(tmp_path / "queue.sqlite", lease_seconds=0.3)
+    other_queue = WorkQueue(tmp_path / "queue.sqlite")
+    claimed_by_other = []
+
+    def slow_lookup(keys):
+        # Several lease times pass, as with retries and backoff within a lookup
+        for _ in range(4):
+            time.sleep(0.2)
+            claimed_by_other.extend(other_queue.claim("frequency", "b", 1))
+        return word_lengths(keys)
+
+    results = QueuedLookup(queue, "frequency", slow_lookup, worker_id="a").run(
+        [("idiom",)]
+    )
+    assert results == {("idiom",): 5}
+    assert claimed_by_other == []
+    other_queue.close()
+    queue.close()
+
+
+def test_released_tasks_are_retried_until_max_failures(queue):
+    queue.add("translation", [("hei på deg", "nob", "nno")])
+    for _ in range(queue.max_failures):
+        keys = queue.claim("translation", "a", 1)
+        assert keys == [("hei på deg", "nob", "nno")]
+        queue.release("translation", "a", keys)
+    assert queue.claim("translation", "a", 1) == []
+    assert queue.num_unsettled("translation") == 0
+
+    # Adding the task again resets its failures
+    queue.add("translation", [("hei på deg", "nob", "nno")])
+    assert queue.num_unsettled("translation") == 1
+
+
+def test_tasks_are_kept_for_a_run_with_the_same_settings(queue):
+    queue.start_run({"nb_catalog_url": "a"})
+    queue.add("frequency", [("idiom",)])
+    queue.complete("frequency", [(("idiom",), 7)])
+    queue.finish()
+    assert queue.is_finished()
+
+    queue.start_run({"nb_catalog_url": "a"})
+    assert not queue.is_finished()
+    assert queue.results("frequency") == {("idiom",): 7}
+
+    queue.start_run({"nb_catalog_url": "b"})
+    assert queue.settings() == {"nb_catalog_url": "b", "finished": False}
+    assert queue.results("frequency") == {}
+
+
+def word_lengths(keys):
+    return [(key, len(key[0])) for key in keys]
+
+
+def fail_every_other(keys):
+    return [(key, len(key[0])) for key in keys if len(key[0]) % 2]
+
+
+def start_worker(path):
+    queue = WorkQueue(path)
+    run_worker(
+        queue,
+        [QueuedLookup(queue, "frequency", word_lengths, claim_size=3)],
+        poll_interval=0.01,
+    )
+    queue.close()
+
+
+def test_workers_in_other_processes_share_the_tasks(tmp_path):
+    path = tmp_path / "queue.sqlite"
+    queue = WorkQueue(path)
+    queue.start_run({})
+    keys = [("x" * i,) for i in range(1, 200)]
+
+    context = get_context("spawn")
+    workers = [context.Process(target=start_worker, args=(path,)) for _ in range(3)]
+    for worker in workers:
+        worker.start()
+    try:
+        results = QueuedLookup(
+            queue, "frequency", word_lengths, claim_size=3, poll_interval=0.01
+        ).run(keys)
+    finally:
+        queue.finish()
+        for worker in workers:
+            worker.join(timeout=30)
+    assert results == {key: len(key[0]) for key in keys}
+    assert all(worker.exitcode == 0 for worker in workers)
+    queue.close()
+
+
+def test_keys_failing_max_failures_times_are_left_out(queue):
+    keys = [("x" * i,) for i in range(1, 7)]
+    results = QueuedLookup(queue, "frequency", fail_every_other).run(keys)
+    assert results == {key: len(key[0]) for key in keys if len(key[0]) % 2}